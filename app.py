@@ -1,16 +1,67 @@
-from flask import Flask, jsonify, request, send_file
+from flask import Flask, Request, Response, current_app, g, has_request_context, jsonify, request, send_file, stream_with_context
 from flask_cors import CORS
-import pandas as pd
-import numpy as np
-import joblib
 import os
 import io
-import base64
 from werkzeug.utils import secure_filename
 import json
-from PIL import Image
+import time
+import gzip
+import hashlib
+import importlib
+import threading
+import uuid
+import multiprocessing
+import random
+import shutil
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from model_registry import REGISTRY_DIR, active_version, resolve_artifacts
+from instrumentation import (
+    MetricsRegistry, SamplingProfiler, load_snapshots, merge_snapshots, profile_filename, render_prometheus
+)
+
+try:
+    import zstandard
+except ImportError:  # Optional: zstd responses are only offered when installed
+    zstandard = None
+
+class LazyModule:
+    """Stand-in for a heavy module that is only imported on first attribute access"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            # import_module holds the import lock, so concurrent first uses are safe
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+# pandas, NumPy and joblib (which pulls in scikit-learn when unpickling) take most
+# of the startup time, so they are only imported once something needs them
+pd = LazyModule('pandas')
+np = LazyModule('numpy')
+joblib = LazyModule('joblib')
+# Upload validation and raw-export preprocessing (imports pandas)
+scoring = LazyModule('scoring')
+
+# Routes that read uploads in chunks and are allowed past MAX_CONTENT_LENGTH
+STREAMING_ENDPOINTS = {'predict_turnover_stream', 'submit_prediction_job'}
+
+class UploadRequest(Request):
+    """Request class that applies the larger upload limit to streaming routes"""
+
+    @property
+    def max_content_length(self):
+        if self.endpoint in STREAMING_ENDPOINTS:
+            return current_app.config['STREAM_MAX_CONTENT_LENGTH']
+        return super().max_content_length
 
 app = Flask(__name__)
+app.request_class = UploadRequest
 CORS(app)  # Enable CORS for all routes
 
 # Configure upload folder
@@ -20,65 +71,770 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['STREAM_MAX_CONTENT_LENGTH'] = 2 * 1024 * 1024 * 1024  # 2GB max streamed file size
+app.config['STREAM_CHUNK_SIZE'] = 50000  # Rows scored per chunk when streaming
+
+# Response formats of /api/predict, selected with ?format= or the Accept header
+PREDICTION_FORMATS = {
+    'records': 'application/json',
+    'columns': 'application/vnd.hr-attrition.columns+json',
+    'csv': 'text/csv',
+    'npz': 'application/x-npz'
+}
+app.config['COMPRESSION_MIN_SIZE'] = 1024  # Smaller response bodies are sent uncompressed
+
+# Batch prediction jobs keep their input, status and result under uploads/jobs/<job id>/
+app.config['JOBS_FOLDER'] = os.path.join(UPLOAD_FOLDER, 'jobs')
+app.config['JOB_WORKERS'] = 2  # Scoring processes per app worker
+# Seconds a completed or failed job is kept before its directory is deleted
+app.config['JOB_TTL'] = float(os.environ.get('JOB_TTL', 24 * 3600))
+app.config['JOB_SWEEP_INTERVAL'] = 300.0  # Seconds between sweeps of the jobs folder
+
+# Every worker dumps its metrics here so /api/metrics can report all of them
+# (set METRICS_DIR to an empty string to report only the answering process)
+app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR', os.path.join(UPLOAD_FOLDER, 'metrics'))
+app.config['METRICS_DUMP_INTERVAL'] = 1.0  # Seconds between metric dumps of a worker
+
+# Sampling profiler, off unless PROFILE_DIR is set. Requests slower than
+# PROFILE_MIN_SECONDS are written there as folded stacks (flamegraph.pl, speedscope).
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR')
+app.config['PROFILE_MIN_SECONDS'] = float(os.environ.get('PROFILE_MIN_SECONDS', '0.1'))
+app.config['PROFILE_INTERVAL'] = 0.005  # Seconds between stack samples
+
+# Load models and datasets in a background thread so /api/health and the image
+# routes answer immediately. Ignored when gunicorn preloads the app: the master
+# then loads everything before forking, and workers start ready.
+app.config['FAST_START'] = (
+    os.environ.get('FAST_START', 'false').lower() == 'true'
+    and os.environ.get('GUNICORN_PRELOAD_APP', 'false') != 'true'
+)
+# What each route needs before it can be served while loading ('models', 'schema'
+# or a dataset name); routes not listed, like health and images, answer right away
+ENDPOINT_REQUIREMENTS = {
+    'get_dataset_overview': ('original',),
+    'get_model_metrics': ('model_metrics', 'classification_report'),
+    'get_cluster_profiles': ('cluster_profiles',),
+    'get_models': ('models',),
+    'predict_turnover': ('schema', 'models'),
+    'predict_turnover_stream': ('schema', 'models'),
+    'assign_clusters': ('schema', 'models'),
+    'submit_prediction_job': ('schema', 'models')
+}
+
+# Models are served from the active version of the registry (or models/*.pkl if
+# nothing was published) and every worker polls the manifest for new versions
+app.config['MODEL_REGISTRY_DIR'] = REGISTRY_DIR
+app.config['MODEL_POLL_INTERVAL'] = 5.0  # Seconds between manifest checks
 
-# Global variables to cache models and data
+# Challenger models loaded next to the decision tree when a version includes
+# them. /api/predict scores any of them with models=..., and SHADOW_MODEL names
+# one that scores a SHADOW_SAMPLE_RATE share of prediction batches in the
+# background, so it can be compared on live traffic without changing responses.
+CHALLENGER_MODELS = ('random_forest', 'gradient_boosting')
+app.config['ENSEMBLE_THREADS'] = min(4, os.cpu_count() or 1)  # Models scored concurrently per request
+app.config['SHADOW_MODEL'] = os.environ.get('SHADOW_MODEL') or None
+app.config['SHADOW_SAMPLE_RATE'] = float(os.environ.get('SHADOW_SAMPLE_RATE', '1.0'))
+app.config['SHADOW_MAX_PENDING'] = 8  # Batches waiting for the shadow model before new ones are skipped
+
+# CSV sources of the datasets served by the API
+DATASET_SOURCES = {
+    'original': 'data/WA_Fn-UseC_-HR-Employee-Attrition.csv',
+    'preprocessed': 'data/preprocessed_hr_data.csv',
+    'model_metrics': 'models/model_metrics.csv',
+    'cluster_profiles': 'data/cluster_profiles.csv',
+    'classification_report': 'models/classification_report.csv'
+}
+# Datasets kept in compact dtypes: small integer types for counts and flags and
+# float32 for continuous values (text columns are categoricals in every mode).
+# The others are small tables served as-is.
+DATASET_DTYPES = {'original': 'compact', 'preprocessed': 'compact'}
+
+# Optional LRU cache of the challenger models' probabilities keyed by feature-row
+# hash and model version (rows per model; 0 disables it). PREDICTION_CACHE_PATH
+# adds an sqlite store shared by all workers on the host.
+app.config['PREDICTION_CACHE_SIZE'] = int(os.environ.get('PREDICTION_CACHE_SIZE', '0'))
+app.config['PREDICTION_CACHE_PATH'] = os.environ.get('PREDICTION_CACHE_PATH')
+app.config['PREDICTION_CACHE_DISK_SIZE'] = 10_000_000  # Rows kept in the sqlite store
+
+# Global variables to cache models and data. A new model version is loaded into
+# a fresh dict that replaces this one, so requests never see a mix of versions.
 models = {}
 datasets = {}
 
+# Prediction cache shared by the threads of this worker, created on first use
+prediction_cache = None
+prediction_cache_lock = threading.Lock()
+
+# Version served by this process; failed_version stops a broken version from
+# being retried on every poll
+model_state = {'version': None, 'loaded_at': None, 'last_error': None, 'failed_version': None}
+model_load_lock = threading.Lock()
+# pid the manifest watcher thread was started in (threads don't survive a fork)
+model_watcher = {'pid': None}
+model_watcher_lock = threading.Lock()
+
+# Process pool for batch prediction jobs, created on first use so it is never
+# started in the gunicorn master before the workers are forked
+job_executor = None
+job_executor_lock = threading.Lock()
+last_job_sweep = {'time': 0.0}
+
+# Thread pools for model scoring, keyed by name and pid (threads don't survive a fork)
+thread_pools = {}
+thread_pools_lock = threading.Lock()
+# Shadow batches submitted but not scored yet
+shadow_state = {'pending': 0}
+shadow_lock = threading.Lock()
+
+# Column order, dtypes and positions of the model features, compiled from the
+# preprocessed dataset when it is loaded and used to validate uploads
+input_schema = {}
+
+# Source file stamps of the loaded datasets, used to detect pipeline reruns
+dataset_versions = {}
+
+# Serialized payloads of the read-only analytics endpoints, one entry per endpoint
+response_cache = {}
+response_cache_lock = threading.Lock()
+
+# Request, stage, row and error metrics of this process, served by /api/metrics
+metrics = MetricsRegistry()
+metrics.histogram('hr_request_duration_seconds', 'Request latency including streamed bodies, by endpoint, method and status')
+metrics.histogram('hr_stage_duration_seconds', 'Time spent in each stage of a request, by endpoint and stage')
+metrics.counter('hr_rows_total', 'Rows scored or assigned, by endpoint')
+metrics.counter('hr_request_errors_total', 'Unhandled exceptions, by endpoint and exception type')
+metrics.counter('hr_prediction_cache_rows_total', 'Rows looked up in the prediction cache, by model and result (hit or miss)')
+metrics.histogram('hr_model_latency_seconds', 'Scoring time of one batch, by model and mode (served or shadow)')
+metrics.counter('hr_shadow_rows_total', 'Rows scored by the shadow model, by model')
+metrics.counter('hr_shadow_disagreements_total', 'Rows where the shadow model predicts a different label, by model')
+metrics.counter('hr_shadow_probability_diff_total', 'Sum of absolute turnover probability differences, by model')
+metrics.counter('hr_shadow_skipped_total', 'Batches not shadow-scored because too many were pending, by model')
+last_metrics_dump = {'time': 0.0, 'timer': None}
+metrics_dump_lock = threading.Lock()
+
+# Where and how long models/datasets took to load, reported by /api/health.
+# With gunicorn's preload_app the loading pid is the master, not the worker.
+# loading stays True until the first load attempt has finished.
+startup_info = {'loading': True, 'loaded_by_pid': None, 'load_time_seconds': {}, 'dataset_memory_mb': {}}
+
+def build_models(paths):
+    """Load one version's artifacts into a new models dict"""
+    from inference import CompiledClusterModel, CompiledTree, ModelEnsemble
+    loaded = {}
+    pipeline = None
+    if os.path.exists(paths['preprocessing']):
+        # Fitted transform written by preprocess.py for scoring raw HR exports
+        pipeline = joblib.load(paths['preprocessing'])
+        loaded['preprocessing'] = scoring.compile_preprocessing_pipeline(pipeline)
+    loaded['decision_tree'] = joblib.load(paths['decision_tree'])
+    # Flat node table used by the prediction routes (one traversal per batch), with
+    # explanations precomputed per leaf; the pipeline puts their thresholds in original units
+    loaded['compiled_tree'] = CompiledTree(loaded['decision_tree'], preprocessing=pipeline)
+    # The tree and every challenger in this version, scored over the same feature matrix
+    ensemble_models = {'decision_tree': loaded['compiled_tree']}
+    for name in CHALLENGER_MODELS:
+        if os.path.exists(paths[name]):
+            ensemble_models[name] = joblib.load(paths[name])
+    tree = loaded['compiled_tree']
+    loaded['ensemble'] = ModelEnsemble(ensemble_models, tree.feature_names or [f'feature_{j}' for j in range(tree.n_features)])
+    if os.path.exists(paths['comparison']):
+        loaded['model_comparison'] = pd.read_csv(paths['comparison']).to_dict('records')
+    loaded['kmeans'] = joblib.load(paths['kmeans'])
+    loaded['pca'] = joblib.load(paths['pca'])
+    # Contiguous centroid and PCA arrays used by /api/cluster-assign
+    loaded['cluster_engine'] = CompiledClusterModel(loaded['kmeans'], loaded['pca'])
+    return loaded
+
+def warm_up_models(loaded):
+    """Check a loaded version against the input schema and run every model once before serving it"""
+    tree = loaded['compiled_tree']
+    if input_schema and tree.feature_names and tree.feature_names != input_schema['columns']:
+        raise ValueError(f"Model features {tree.feature_names} don't match the input schema {input_schema['columns']}")
+    
+    rows = np.zeros((8, tree.n_features), dtype=np.float32)
+    tree.explain(rows)
+    loaded['ensemble'].score(rows)
+    loaded['cluster_engine'].assign(rows)
+    loaded['cluster_engine'].project(rows)
+    if 'preprocessing' in loaded and 'original' in datasets:
+        scoring.transform_raw_data(datasets['original'].head(8), loaded['preprocessing'])
+
 def load_models():
-    """Load all ML models"""
+    """
+    Load, warm up and swap in the active model version.
+    
+    Request threads keep using the current models while this runs; if anything
+    fails the current models stay in place. Returns True if a version was swapped in.
+    """
     global models
-    try:
-        models['decision_tree'] = joblib.load('models/decision_tree_model.pkl')
-        models['kmeans'] = joblib.load('models/kmeans_model.pkl')
-        models['pca'] = joblib.load('models/pca_model.pkl')
-        print("Models loaded successfully")
-    except Exception as e:
-        print(f"Error loading models: {e}")
-        models = {}
+    with model_load_lock:
+        start = time.perf_counter()
+        version = active_version(app.config['MODEL_REGISTRY_DIR']) or 'unversioned'
+        try:
+            version, paths = resolve_artifacts(app.config['MODEL_REGISTRY_DIR'])
+            loaded = build_models(paths)
+            warm_up_models(loaded)
+        except Exception as e:
+            model_state.update(last_error=str(e), failed_version=version)
+            print(f"Error loading models (version {version}): {e}")
+            return False
+        
+        # A single reference assignment: in-flight requests finish on the old dict
+        loaded['version'] = version
+        models = loaded
+        model_state.update(
+            version=version, loaded_at=datetime.now(timezone.utc).isoformat(), last_error=None, failed_version=None
+        )
+        startup_info['load_time_seconds']['models'] = round(time.perf_counter() - start, 4)
+        print(f"Models loaded successfully (version {version})")
+        return True
+
+def reload_models_if_changed():
+    """Load the active version if the manifest points at a new one"""
+    version = active_version(app.config['MODEL_REGISTRY_DIR'])
+    if version is not None and version == model_state['version'] and model_state['failed_version']:
+        # Rolled back to the version already being served
+        model_state.update(last_error=None, failed_version=None)
+    if version is None or version in (model_state['version'], model_state['failed_version']):
+        return False
+    return load_models()
+
+def watch_model_registry():
+    """Poll the registry manifest and load new versions in the background"""
+    while True:
+        time.sleep(app.config['MODEL_POLL_INTERVAL'])
+        try:
+            reload_models_if_changed()
+        except Exception as e:
+            print(f"Error checking the model registry: {e}")
+
+@app.before_request
+def start_model_watcher():
+    # Started on the first request of each worker, so it also runs after
+    # gunicorn forks workers from a preloaded master
+    if model_watcher['pid'] == os.getpid():
+        return
+    with model_watcher_lock:
+        if model_watcher['pid'] != os.getpid():
+            threading.Thread(target=watch_model_registry, name='model-registry-watcher', daemon=True).start()
+            model_watcher['pid'] = os.getpid()
 
 def load_datasets():
-    """Load all datasets"""
+    """Load all datasets (memory-mapped from their columnar caches)"""
     global datasets
+    from data_store import frame_memory_mb, load_table
+    start = time.perf_counter()
     try:
-        datasets['original'] = pd.read_csv('data/WA_Fn-UseC_-HR-Employee-Attrition.csv')
-        datasets['preprocessed'] = pd.read_csv('data/preprocessed_hr_data.csv')
-        datasets['model_metrics'] = pd.read_csv('models/model_metrics.csv')
-        datasets['cluster_profiles'] = pd.read_csv('data/cluster_profiles.csv')
-        datasets['classification_report'] = pd.read_csv('models/classification_report.csv')
+        for name, path in DATASET_SOURCES.items():
+            dataset_versions[name] = file_version(path)
+            datasets[name] = load_table(path, dtypes=DATASET_DTYPES.get(name, 'stored'))
+            startup_info['dataset_memory_mb'][name] = round(frame_memory_mb(datasets[name]), 3)
+        input_schema.update(scoring.compile_input_schema(datasets['preprocessed']))
+        startup_info['load_time_seconds']['datasets'] = round(time.perf_counter() - start, 4)
         print("Datasets loaded successfully")
     except Exception as e:
         print(f"Error loading datasets: {e}")
 
-def preprocess_user_data(df, sample_data):
-    """Preprocess user uploaded data to match training data format"""
-    # Ensure uploaded data has the same columns as trained data
-    missing_cols = set(sample_data.columns) - set(df.columns)
-    if missing_cols:
-        raise ValueError(f"Missing columns in uploaded data: {missing_cols}")
+def file_version(path):
+    """Size and modification time of a file, or None if it doesn't exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+def refresh_datasets(names):
+    """Reload the given datasets if their files changed on disk; return the current versions"""
+    from data_store import frame_memory_mb, load_table
+    versions = {}
+    for name in names:
+        path = DATASET_SOURCES[name]
+        version = file_version(path)
+        if version != dataset_versions.get(name):
+            datasets[name] = load_table(path, dtypes=DATASET_DTYPES.get(name, 'stored'))
+            startup_info['dataset_memory_mb'][name] = round(frame_memory_mb(datasets[name]), 3)
+            dataset_versions[name] = version
+            if name == 'preprocessed':
+                input_schema.update(scoring.compile_input_schema(datasets[name]))
+        versions[name] = version
+    return versions
+
+def cached_json_response(key, dataset_names, build_payload):
+    """
+    Serve a JSON payload that is built and serialized once per data version.
     
-    # Remove extra columns
-    extra_cols = set(df.columns) - set(sample_data.columns)
-    if extra_cols:
-        df = df.drop(columns=extra_cols)
+    The cache entry is rebuilt when any of the underlying files changes, and the
+    response carries an ETag and Last-Modified so clients can revalidate with 304s.
+    """
+    versions = tuple(file_version(DATASET_SOURCES[name]) for name in dataset_names)
+    entry = response_cache.get(key)
     
-    # Reorder columns to match training data
-    df = df[sample_data.columns]
+    if entry is None or entry['versions'] != versions:
+        with response_cache_lock:
+            entry = response_cache.get(key)
+            if entry is None or entry['versions'] != versions:
+                current = refresh_datasets(dataset_names)
+                body = app.json.dumps(build_payload()).encode('utf-8')
+                mtimes = [version[1] for version in current.values() if version is not None]
+                entry = {
+                    'versions': tuple(current[name] for name in dataset_names),
+                    'body': body,
+                    'etag': hashlib.sha1(body).hexdigest(),
+                    'last_modified': datetime.fromtimestamp(max(mtimes) / 1e9, tz=timezone.utc) if mtimes else None
+                }
+                response_cache[key] = entry
+    
+    response = app.response_class(entry['body'], mimetype='application/json')
+    response.set_etag(entry['etag'])
+    response.last_modified = entry['last_modified']
+    # Let clients keep the payload but revalidate it on every request
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def get_prediction_cache():
+    """Return this worker's prediction cache, or None when caching is disabled"""
+    global prediction_cache
+    if not app.config['PREDICTION_CACHE_SIZE']:
+        return None
+    if prediction_cache is None:
+        from prediction_cache import PredictionCache
+        with prediction_cache_lock:
+            if prediction_cache is None:
+                prediction_cache = PredictionCache(
+                    app.config['PREDICTION_CACHE_SIZE'],
+                    disk_path=app.config['PREDICTION_CACHE_PATH'],
+                    disk_max_entries=app.config['PREDICTION_CACHE_DISK_SIZE']
+                )
+    return prediction_cache
+
+def cached_probabilities(cache, features, version, names, n_classes, score):
+    """
+    Class probabilities of the named models, scoring only the rows the cache doesn't have
+
+    score(rows, names) scores float32 rows with the named models and returns
+    their probabilities and scoring seconds, like ModelEnsemble.score. The rows
+    any of the models missed are scored in one call, so the models still run
+    side by side.
+    """
+    from prediction_cache import feature_row_hashes
+    # Hash the float32 rows the models compare, so equal keys mean equal predictions
+    features = np.asarray(features, dtype=np.float32)
+    keys = feature_row_hashes(features)
+    probabilities = {}
+    hits = {}
+    for name in names:
+        hits[name], probabilities[name] = cache.lookup(version, name, keys, n_classes)
+        n_hits = int(hits[name].sum())
+        metrics.inc('hr_prediction_cache_rows_total', {'model': name, 'result': 'hit'}, n_hits)
+        metrics.inc('hr_prediction_cache_rows_total', {'model': name, 'result': 'miss'}, len(keys) - n_hits)
     
-    # Convert float64 to float32
-    float_cols = df.select_dtypes(include=['float64']).columns
-    df[float_cols] = df[float_cols].astype('float32')
+    seconds = dict.fromkeys(names, 0.0)
+    missed = [name for name in names if not hits[name].all()]
+    if missed:
+        rows = np.flatnonzero(np.logical_or.reduce([~hits[name] for name in missed]))
+        scored, scored_seconds = score(features[rows], missed)
+        for name in missed:
+            probabilities[name][rows] = scored[name]
+            cache.store(version, name, keys[rows], scored[name])
+        seconds.update(scored_seconds)
+    return probabilities, seconds
+
+def explain_predictions(tree, features, class_index=1):
+    """
+    Score rows and return labels, probabilities and explanation columns for one class
+
+    Baseline_Probability plus the Contribution_<feature> columns of a row add up
+    to its probability; Decision_Path lists the splits that led to its leaf.
+    """
+    labels, probabilities, contributions, paths = tree.explain(features)
+    columns = {'Baseline_Probability': np.full(len(labels), tree.bias[class_index])}
+    for j, name in enumerate(tree.feature_names or input_schema['columns']):
+        columns[f'Contribution_{name}'] = contributions[:, j, class_index]
+    columns['Decision_Path'] = paths
+    return labels, probabilities, columns
+
+def get_thread_pool(name, max_workers):
+    """Return this process's thread pool of the given name, starting it if needed"""
+    key = (name, os.getpid())
+    with thread_pools_lock:
+        if key not in thread_pools:
+            thread_pools[key] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        return thread_pools[key]
+
+def parse_model_names(value, ensemble):
+    """Model names from a comma-separated form value ('all' for every loaded model)"""
+    if value.strip().lower() == 'all':
+        return ensemble.names
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in ensemble.models]
+    if unknown:
+        raise ValueError(f"Unknown models: {unknown}. Available: {ensemble.names}")
+    return names
+
+def score_models(ensemble, features, names, version=None, class_index=1):
+    """
+    Score rows with several models over one feature matrix
+
+    Returns a probability column per model and a per-model summary with its
+    scoring latency, which is also recorded in hr_model_latency_seconds. With
+    the prediction cache on, each model only scores the rows it hasn't seen in
+    this version, and the latency covers just those.
+    """
+    executor = get_thread_pool('ensemble', app.config['ENSEMBLE_THREADS']) if app.config['ENSEMBLE_THREADS'] > 1 else None
+    def score(rows, names):
+        return ensemble.score(rows, names, executor=executor)
     
-    return df
+    # The compiled tree scores a batch faster than the cache can look it up, so only the others are cached
+    cache = get_prediction_cache()
+    cached_names = [name for name in names if name != 'decision_tree'] if cache is not None else []
+    probabilities, seconds = {}, {}
+    if cached_names:
+        probabilities, seconds = cached_probabilities(
+            cache, features, version, cached_names, len(ensemble.classes), score
+        )
+    uncached_names = [name for name in names if name not in cached_names]
+    if uncached_names:
+        uncached_probabilities, uncached_seconds = score(features, uncached_names)
+        probabilities.update(uncached_probabilities)
+        seconds.update(uncached_seconds)
+    columns = {}
+    summary = {}
+    for name in names:
+        predicted = int((np.argmax(probabilities[name], axis=1) == class_index).sum())
+        columns[f'Probability_{name}'] = probabilities[name][:, class_index]
+        summary[name] = {
+            'predicted_to_leave': predicted,
+            'turnover_rate': round(predicted / len(probabilities[name]) * 100, 2) if len(probabilities[name]) else 0,
+            'latency_ms': round(seconds[name] * 1000, 3)
+        }
+        metrics.observe('hr_model_latency_seconds', {'model': name, 'mode': 'served'}, seconds[name])
+    return columns, summary
+
+def submit_shadow_scoring(ensemble, features, served_probabilities):
+    """Queue a batch for the shadow model, unless shadowing is off, not sampled or backed up"""
+    name = app.config['SHADOW_MODEL']
+    if ensemble is None or name not in ensemble.models or random.random() >= app.config['SHADOW_SAMPLE_RATE']:
+        return False
+    with shadow_lock:
+        if shadow_state['pending'] >= app.config['SHADOW_MAX_PENDING']:
+            metrics.inc('hr_shadow_skipped_total', {'model': name})
+            return False
+        shadow_state['pending'] += 1
+    # Scored after the response is on its way, by one background thread per process
+    get_thread_pool('shadow', 1).submit(run_shadow_scoring, ensemble, name, features, served_probabilities)
+    return True
+
+def run_shadow_scoring(ensemble, name, features, served_probabilities, class_index=1):
+    """Score a batch with the shadow model and record how it compares with the served predictions"""
+    try:
+        probabilities, seconds = ensemble.score(features, [name])
+        shadow = probabilities[name]
+        disagreements = int((np.argmax(shadow, axis=1) != np.argmax(served_probabilities, axis=1)).sum())
+        difference = float(np.abs(shadow[:, class_index] - served_probabilities[:, class_index]).sum())
+        metrics.observe('hr_model_latency_seconds', {'model': name, 'mode': 'shadow'}, seconds[name])
+        metrics.inc('hr_shadow_rows_total', {'model': name}, len(shadow))
+        metrics.inc('hr_shadow_disagreements_total', {'model': name}, disagreements)
+        metrics.inc('hr_shadow_probability_diff_total', {'model': name}, difference)
+    except Exception:
+        app.logger.exception("Shadow scoring with %s failed", name)
+    finally:
+        with shadow_lock:
+            shadow_state['pending'] -= 1
+
+def prepare_features(data, schema, pipeline=None):
+    """
+    Encode raw rows with the pipeline, or check preprocessed ones against the schema
+
+    Raises a ValueError for uploads the client has to fix (missing columns,
+    non-numeric values, unknown categories).
+    """
+    with stage_timer('preprocess'):
+        if pipeline is not None:
+            return scoring.transform_raw_data(data, pipeline)
+        return scoring.preprocess_user_data(data, schema)
+
+def score_chunk(chunk, schema, tree, pipeline=None, ensemble=None):
+    """Preprocess one chunk of uploaded rows and append the prediction columns (shadow-scored with an ensemble)"""
+    processed_data = prepare_features(chunk, schema, pipeline)
+    with stage_timer('predict'):
+        predictions, probabilities = tree.predict_with_proba(processed_data)
+    submit_shadow_scoring(ensemble, processed_data, probabilities)
 
-# Initialize models and datasets on startup
-load_models()
-load_datasets()
+    # Chunks are owned by the reader, so the result columns are added in place
+    chunk['Predicted_Turnover'] = predictions.astype(int)
+    chunk['Turnover_Probability'] = probabilities[:, 1].astype(float)
+    return chunk
+
+def request_endpoint():
+    """Endpoint label for metrics (None outside of a request, e.g. in job processes)"""
+    if not has_request_context():
+        return None
+    return request.endpoint or 'unmatched'
+
+@contextmanager
+def stage_timer(stage):
+    """Record how long a block of the current request takes"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        endpoint = request_endpoint()
+        if endpoint is not None:
+            metrics.observe(
+                'hr_stage_duration_seconds', {'endpoint': endpoint, 'stage': stage}, time.perf_counter() - start
+            )
+
+def count_rows(n_rows):
+    """Add to the row counter of the current request's endpoint"""
+    endpoint = request_endpoint()
+    if endpoint is not None:
+        metrics.inc('hr_rows_total', {'endpoint': endpoint}, n_rows)
+
+def error_response(e):
+    """Log an unhandled exception with its traceback, count it and return a 500"""
+    endpoint = request_endpoint()
+    app.logger.exception("Unhandled error in %s", endpoint)
+    metrics.inc('hr_request_errors_total', {'endpoint': endpoint, 'exception': type(e).__name__})
+    return jsonify({'error': str(e)}), 500
+
+def dump_metrics(force=False):
+    """
+    Write this process's metrics to METRICS_DIR, at most once per METRICS_DUMP_INTERVAL
+
+    A throttled dump is deferred to a timer instead of dropped, so the last
+    requests before a worker goes idle still reach /api/metrics.
+    """
+    metrics_dir = app.config['METRICS_DIR']
+    if not metrics_dir:
+        return
+    with metrics_dump_lock:
+        now = time.monotonic()
+        wait = last_metrics_dump['time'] + app.config['METRICS_DUMP_INTERVAL'] - now
+        if not force and wait > 0:
+            if last_metrics_dump['timer'] is None:
+                timer = threading.Timer(wait, flush_metrics)
+                timer.daemon = True
+                last_metrics_dump['timer'] = timer
+                timer.start()
+            return
+        last_metrics_dump['time'] = now
+    os.makedirs(metrics_dir, exist_ok=True)
+    metrics.dump(os.path.join(metrics_dir, f"{os.getpid()}.json"))
+
+def flush_metrics():
+    """Write the snapshot a throttled dump_metrics call deferred"""
+    with metrics_dump_lock:
+        last_metrics_dump['timer'] = None
+    try:
+        dump_metrics(force=True)
+    except OSError as e:
+        app.logger.warning("Could not write metrics snapshot: %s", e)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    if app.config['PROFILE_DIR']:
+        g.profiler = SamplingProfiler(threading.get_ident(), app.config['PROFILE_INTERVAL']).start()
+
+@app.after_request
+def record_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def record_request_metrics(exc):
+    # Streamed responses keep the request context until the body is sent, so
+    # this also covers the time spent generating it
+    if 'request_start' not in g:
+        return
+    elapsed = time.perf_counter() - g.request_start
+    endpoint = request_endpoint()
+    metrics.observe('hr_request_duration_seconds', {
+        'endpoint': endpoint,
+        'method': request.method,
+        'status': g.get('response_status', 500)
+    }, elapsed)
+
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+        if elapsed >= app.config['PROFILE_MIN_SECONDS'] and profiler.stacks:
+            os.makedirs(app.config['PROFILE_DIR'], exist_ok=True)
+            profiler.write(profile_filename(app.config['PROFILE_DIR'], endpoint))
+
+    try:
+        dump_metrics()
+    except OSError as e:
+        app.logger.warning("Could not write metrics snapshot: %s", e)
+
+def process_memory():
+    """Memory of the current process in MB, split into shared and private pages when /proc is available"""
+    try:
+        fields = {}
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if value.strip().endswith('kB'):
+                    fields[key] = int(value.split()[0])
+        return {
+            'rss_mb': round(fields['Rss'] / 1024, 1),
+            'pss_mb': round(fields['Pss'] / 1024, 1),
+            'shared_mb': round((fields['Shared_Clean'] + fields['Shared_Dirty']) / 1024, 1),
+            'private_mb': round((fields['Private_Clean'] + fields['Private_Dirty']) / 1024, 1)
+        }
+    except (OSError, KeyError):
+        import resource
+        import sys
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+        divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+        return {'max_rss_mb': round(max_rss / divisor, 1)}
+
+def is_ready():
+    """Whether the models and every dataset are loaded"""
+    return 'compiled_tree' in models and all(name in datasets for name in DATASET_SOURCES)
+
+def startup_state():
+    """'loading' until the first load attempt finishes, then 'ready' or 'failed' from what is loaded now"""
+    if startup_info['loading']:
+        return 'loading'
+    # A model version loaded later by the registry watcher makes a failed worker ready
+    return 'ready' if is_ready() else 'failed'
+
+def is_loaded(requirement):
+    """Whether one of the ENDPOINT_REQUIREMENTS is loaded"""
+    if requirement == 'models':
+        return 'compiled_tree' in models
+    if requirement == 'schema':
+        return bool(input_schema)
+    return requirement in datasets
+
+def load_everything():
+    """Load datasets and models and record the startup state"""
+    start = time.perf_counter()
+    # Datasets come first so new models can be checked against the input schema
+    load_datasets()
+    load_models()
+    startup_info['loaded_by_pid'] = os.getpid()
+    startup_info['load_time_seconds']['total'] = round(time.perf_counter() - start, 4)
+    startup_info['loading'] = False
+
+@app.before_request
+def reject_until_ready():
+    # While fast start is loading, a route is served as soon as what it needs is
+    # loaded; afterwards the routes report anything missing themselves
+    if not startup_info['loading']:
+        return None
+    missing = [name for name in ENDPOINT_REQUIREMENTS.get(request.endpoint, ()) if not is_loaded(name)]
+    if missing:
+        response = jsonify({'error': 'Service is starting up', 'state': 'loading', 'waiting_for': missing})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    return None
+
+# Initialize datasets and models on startup: once in the gunicorn master when
+# preloading, in the background with FAST_START, otherwise before serving
+startup_loader = None
+if app.config['FAST_START']:
+    startup_loader = threading.Thread(target=load_everything, name='startup-loader', daemon=True)
+    startup_loader.start()
+else:
+    load_everything()
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'models_loaded': len(models) > 0})
+    """Health check and readiness endpoint"""
+    models_loaded = 'compiled_tree' in models
+    datasets_loaded = all(name in datasets for name in DATASET_SOURCES)
+    ready = models_loaded and datasets_loaded
+    
+    status = {
+        'status': 'healthy' if ready else 'unavailable',
+        'ready': ready,
+        'startup_state': startup_state(),
+        'models_loaded': models_loaded,
+        'datasets_loaded': datasets_loaded,
+        'pid': os.getpid(),
+        'loaded_by_pid': startup_info['loaded_by_pid'],
+        'preloaded': startup_info['loaded_by_pid'] not in (None, os.getpid()),
+        'load_time_seconds': startup_info['load_time_seconds'],
+        'dataset_memory_mb': startup_info['dataset_memory_mb'],
+        'model_version': model_state['version'],
+        'model_loaded_at': model_state['loaded_at'],
+        'model_load_error': model_state['last_error'],
+        'prediction_cache': prediction_cache.stats() if prediction_cache is not None else None,
+        'memory': process_memory()
+    }
+    # Load balancers should only route traffic to workers that are ready
+    return jsonify(status), 200 if ready else 503
+
+def stored_table(name):
+    """
+    A dataset in the dtypes parsed from its CSV
+
+    The served frames may hold compact dtypes (float32 values, int8 flags), so
+    sample rows and column types come from the stored columns, which are
+    memory-mapped from the same cache and cost nothing to open.
+    """
+    from data_store import load_table
+    return load_table(DATASET_SOURCES[name])
+
+def csv_dtype(series):
+    """Name of a column's dtype as pandas parses it from CSV (text columns are object, not category)"""
+    return 'object' if isinstance(series.dtype, pd.CategoricalDtype) else str(series.dtype)
+
+def build_dataset_overview():
+    """Build the dataset overview payload"""
+    df = datasets['original']
+    stored = stored_table('original')
+    
+    # Calculate basic statistics
+    overview = {
+        'total_employees': int(df.shape[0]),
+        'total_features': int(df.shape[1]),
+        'sample_data': stored.head().to_dict('records')
+    }
+    
+    # Calculate turnover rate if available
+    if 'left' in df.columns:
+        turnover_yes = int(df[df['left'] == 1].shape[0])
+        turnover_rate = (turnover_yes / df.shape[0]) * 100
+        overview['turnover_rate'] = round(turnover_rate, 2)
+    
+    # Get department count if available
+    if 'Department' in df.columns:
+        overview['departments'] = int(df['Department'].nunique())
+    
+    # Get column information
+    col_info = []
+    for col in df.columns:
+        col_info.append({
+            'column': col,
+            'type': csv_dtype(stored[col]),
+            'non_null_count': int(df[col].count()),
+            'null_count': int(df[col].isnull().sum())
+        })
+    overview['columns'] = col_info
+    
+    return overview
+
+def build_model_metrics():
+    """Build the model metrics payload"""
+    metrics = datasets['model_metrics'].to_dict('records')[0]
+    
+    # Also include classification report if available
+    classification_data = None
+    if 'classification_report' in datasets:
+        classification_data = datasets['classification_report'].to_dict('records')
+    
+    return {
+        'metrics': metrics,
+        'classification_report': classification_data
+    }
+
+def build_cluster_profiles():
+    """Build the cluster profiles payload"""
+    return datasets['cluster_profiles'].to_dict('records')
 
 @app.route('/api/dataset-overview', methods=['GET'])
 def get_dataset_overview():
@@ -87,39 +843,9 @@ def get_dataset_overview():
         if 'original' not in datasets:
             return jsonify({'error': 'Dataset not loaded'}), 500
         
-        df = datasets['original']
-        
-        # Calculate basic statistics
-        overview = {
-            'total_employees': int(df.shape[0]),
-            'total_features': int(df.shape[1]),
-            'sample_data': df.head().to_dict('records')
-        }
-        
-        # Calculate turnover rate if available
-        if 'left' in df.columns:
-            turnover_yes = int(df[df['left'] == 1].shape[0])
-            turnover_rate = (turnover_yes / df.shape[0]) * 100
-            overview['turnover_rate'] = round(turnover_rate, 2)
-        
-        # Get department count if available
-        if 'Department' in df.columns:
-            overview['departments'] = int(df['Department'].nunique())
-        
-        # Get column information
-        col_info = []
-        for col in df.columns:
-            col_info.append({
-                'column': col,
-                'type': str(df[col].dtype),
-                'non_null_count': int(df[col].count()),
-                'null_count': int(df[col].isnull().sum())
-            })
-        overview['columns'] = col_info
-        
-        return jsonify(overview)
+        return cached_json_response('dataset-overview', ['original'], build_dataset_overview)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 @app.route('/api/model-metrics', methods=['GET'])
 def get_model_metrics():
@@ -128,19 +854,34 @@ def get_model_metrics():
         if 'model_metrics' not in datasets:
             return jsonify({'error': 'Model metrics not loaded'}), 500
         
-        metrics = datasets['model_metrics'].to_dict('records')[0]
-        
-        # Also include classification report if available
-        classification_data = None
-        if 'classification_report' in datasets:
-            classification_data = datasets['classification_report'].to_dict('records')
-        
+        return cached_json_response(
+            'model-metrics', ['model_metrics', 'classification_report'], build_model_metrics
+        )
+    except Exception as e:
+        return error_response(e)
+
+@app.route('/api/models', methods=['GET'])
+def get_models():
+    """List the models /api/predict can score with, the shadow model and their test-set comparison"""
+    active_models = models
+    try:
+        if 'ensemble' not in active_models:
+            return jsonify({'error': 'Models not loaded'}), 500
+
+        ensemble = active_models['ensemble']
+        shadow_model = app.config['SHADOW_MODEL']
         return jsonify({
-            'metrics': metrics,
-            'classification_report': classification_data
+            'version': active_models.get('version'),
+            'served': 'decision_tree',
+            'models': ensemble.names,
+            'shadow': {
+                'model': shadow_model if shadow_model in ensemble.models else None,
+                'sample_rate': app.config['SHADOW_SAMPLE_RATE']
+            },
+            'comparison': active_models.get('model_comparison', [])
         })
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 @app.route('/api/cluster-profiles', methods=['GET'])
 def get_cluster_profiles():
@@ -149,10 +890,9 @@ def get_cluster_profiles():
         if 'cluster_profiles' not in datasets:
             return jsonify({'error': 'Cluster profiles not loaded'}), 500
         
-        profiles = datasets['cluster_profiles'].to_dict('records')
-        return jsonify(profiles)
+        return cached_json_response('cluster-profiles', ['cluster_profiles'], build_cluster_profiles)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 @app.route('/api/images/<path:filename>', methods=['GET'])
 def serve_image(filename):
@@ -164,25 +904,124 @@ def serve_image(filename):
         else:
             return jsonify({'error': 'Image not found'}), 404
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
+
+def negotiate_prediction_format():
+    """Pick the prediction response format from ?format=, a form field or the Accept header"""
+    requested = request.args.get('format', request.form.get('format'))
+    if requested:
+        return requested.lower() if requested.lower() in PREDICTION_FORMATS else None
+    
+    # Plain JSON records stay the default for browsers and axios (*/*)
+    mimetype = request.accept_mimetypes.best_match(
+        list(PREDICTION_FORMATS.values()), default=PREDICTION_FORMATS['records']
+    )
+    return next(name for name, value in PREDICTION_FORMATS.items() if value == mimetype)
+
+def encode_predictions(results, summary, output_format):
+    """Serialize prediction results in the negotiated format"""
+    if output_format == 'columns':
+        # One JSON array per column instead of one object per row
+        columns = ','.join(
+            f"{json.dumps(str(col))}:{json.dumps(results[col].tolist())}"
+            for col in results.columns
+        )
+        return f'{{"columns":{{{columns}}},"summary":{json.dumps(summary)}}}'.encode('utf-8')
+    
+    if output_format == 'csv':
+        return results.to_csv(index=False).encode('utf-8')
+    
+    if output_format == 'npz':
+        # Strings are stored as fixed-width unicode so clients can load without pickle
+        arrays = {}
+        for col in results.columns:
+            values = results[col].to_numpy()
+            arrays[str(col)] = values.astype(str) if values.dtype == object else values
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        return buffer.getvalue()
+    
+    return app.json.dumps({
+        'predictions': results.to_dict('records'),
+        'summary': summary
+    }).encode('utf-8')
+
+def compress_body(body):
+    """Compress a response body with zstd or gzip if the client accepts it"""
+    if len(body) < app.config['COMPRESSION_MIN_SIZE']:
+        return body, None
+    if zstandard is not None and request.accept_encodings['zstd']:
+        return zstandard.ZstdCompressor(level=3).compress(body), 'zstd'
+    if request.accept_encodings['gzip']:
+        return gzip.compress(body, compresslevel=5), 'gzip'
+    return body, None
+
+def prediction_response(results, summary, output_format):
+    """Build the /api/predict response, with the summary also exposed as headers"""
+    body, encoding = compress_body(encode_predictions(results, summary, output_format))
+    response = app.response_class(body, mimetype=PREDICTION_FORMATS[output_format])
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.update(['Accept', 'Accept-Encoding'])
+    response.headers['X-Total-Employees'] = str(summary['total_employees'])
+    response.headers['X-Predicted-To-Leave'] = str(summary['predicted_to_leave'])
+    response.headers['X-Turnover-Rate'] = str(summary['turnover_rate'])
+    if output_format in ('csv', 'npz'):
+        response.headers['Content-Disposition'] = f'attachment; filename=predictions.{output_format}'
+    return response
 
 @app.route('/api/predict', methods=['POST'])
 def predict_turnover():
     """Predict turnover for uploaded data or sample data"""
+    # Use one model version for the whole request, even if a new one is swapped in
+    active_models = models
     try:
-        if 'decision_tree' not in models:
+        if 'compiled_tree' not in active_models:
             return jsonify({'error': 'Decision tree model not loaded'}), 500
         
+        output_format = negotiate_prediction_format()
+        if output_format is None:
+            return jsonify({'error': f"Invalid format. Use one of: {', '.join(PREDICTION_FORMATS)}"}), 400
+        
         use_sample = request.form.get('use_sample', 'false').lower() == 'true'
+        raw_input = request.form.get('raw', 'false').lower() == 'true'
+        explain = request.form.get('explain', 'false').lower() == 'true'
+        if raw_input and not use_sample and 'preprocessing' not in active_models:
+            return jsonify({'error': 'Preprocessing pipeline not loaded'}), 500
+        
+        # Extra models scored over the same feature matrix as the served tree
+        model_names = []
+        if request.form.get('models'):
+            try:
+                model_names = parse_model_names(request.form['models'], active_models['ensemble'])
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        model_summary = {}
+        
+        def predict(features):
+            if explain:
+                labels, probabilities, columns = explain_predictions(active_models['compiled_tree'], features)
+            else:
+                labels, probabilities = active_models['compiled_tree'].predict_with_proba(features)
+                columns = {}
+            if model_names:
+                model_columns, summary = score_models(
+                    active_models['ensemble'], features, model_names, active_models['version']
+                )
+                columns.update(model_columns)
+                model_summary.update(summary)
+            submit_shadow_scoring(active_models.get('ensemble'), features, probabilities)
+            return labels, probabilities, columns
         
         if use_sample:
             # Use sample data
             if 'preprocessed' not in datasets:
                 return jsonify({'error': 'Preprocessed data not loaded'}), 500
             
-            sample_data = datasets['preprocessed'].drop('left', axis=1).head(5) if 'left' in datasets['preprocessed'].columns else datasets['preprocessed'].head(5)
-            predictions = models['decision_tree'].predict(sample_data)
-            probabilities = models['decision_tree'].predict_proba(sample_data)[:, 1]
+            sample_data = stored_table('preprocessed').head(5).drop(columns=['left'], errors='ignore')
+            with stage_timer('predict'):
+                predictions, probabilities, explanation = predict(sample_data)
+            probabilities = probabilities[:, 1]
             
             # Prepare results
             results = sample_data.copy()
@@ -199,45 +1038,491 @@ def predict_turnover():
                 return jsonify({'error': 'No file selected'}), 400
             
             if file and file.filename.lower().endswith('.csv'):
-                # Read uploaded CSV
-                user_data = pd.read_csv(file.stream)
-                
-                # Get sample data for preprocessing
-                if 'preprocessed' not in datasets:
+                if not raw_input and not input_schema:
                     return jsonify({'error': 'Preprocessed data not loaded'}), 500
                 
-                sample_data = datasets['preprocessed'].drop('left', axis=1) if 'left' in datasets['preprocessed'].columns else datasets['preprocessed']
-                
-                # Preprocess user data
-                processed_data = preprocess_user_data(user_data, sample_data)
+                try:
+                    # Read uploaded CSV
+                    with stage_timer('parse'):
+                        user_data = pd.read_csv(file.stream)
+                    
+                    # Raw HR exports are encoded and scaled with the persisted pipeline
+                    processed_data = prepare_features(
+                        user_data, input_schema, active_models['preprocessing'] if raw_input else None
+                    )
+                except ValueError as e:
+                    # Unparseable files, missing columns and unknown categories are client errors
+                    return jsonify({'error': str(e)}), 400
                 
                 # Make predictions
-                predictions = models['decision_tree'].predict(processed_data)
-                probabilities = models['decision_tree'].predict_proba(processed_data)[:, 1]
+                with stage_timer('predict'):
+                    predictions, probabilities, explanation = predict(processed_data)
+                probabilities = probabilities[:, 1]
                 
-                # Prepare results
-                results = user_data.copy()
+                # The parsed upload belongs to this request, so add the results in place
+                results = user_data
                 results['Predicted_Turnover'] = predictions.astype(int)
                 results['Turnover_Probability'] = probabilities.astype(float)
             else:
                 return jsonify({'error': 'Invalid file format. Please upload a CSV file'}), 400
         
+        for col, values in explanation.items():
+            results[col] = values
+        
         # Calculate summary statistics
         total_count = len(predictions)
-        turnover_count = int(sum(predictions))
+        turnover_count = int(predictions.sum())
         turnover_rate = (turnover_count / total_count) * 100 if total_count > 0 else 0
         
-        return jsonify({
-            'predictions': results.to_dict('records'),
-            'summary': {
-                'total_employees': total_count,
-                'predicted_to_leave': turnover_count,
-                'turnover_rate': round(turnover_rate, 2)
-            }
+        summary = {
+            'total_employees': total_count,
+            'predicted_to_leave': turnover_count,
+            'turnover_rate': round(turnover_rate, 2)
+        }
+        if model_summary:
+            summary['models'] = model_summary
+        count_rows(total_count)
+        with stage_timer('serialize'):
+            return prediction_response(results, summary, output_format)
+        
+    except Exception as e:
+        return error_response(e)
+
+@app.route('/api/predict/stream', methods=['POST'])
+def predict_turnover_stream():
+    """Score a large CSV chunk by chunk and stream the rows back as NDJSON or CSV"""
+    # Use one model version for the whole stream, even if a new one is swapped in
+    active_models = models
+    try:
+        if 'compiled_tree' not in active_models:
+            return jsonify({'error': 'Decision tree model not loaded'}), 500
+        if not input_schema:
+            return jsonify({'error': 'Preprocessed data not loaded'}), 500
+
+        output_format = request.args.get('format', request.form.get('format', 'ndjson')).lower()
+        if output_format not in ('ndjson', 'csv'):
+            return jsonify({'error': 'Invalid format. Use ndjson or csv'}), 400
+
+        pipeline = None
+        if request.args.get('raw', request.form.get('raw', 'false')).lower() == 'true':
+            if 'preprocessing' not in active_models:
+                return jsonify({'error': 'Preprocessing pipeline not loaded'}), 500
+            pipeline = active_models['preprocessing']
+
+        # Accept either a multipart upload (spooled to disk by Werkzeug) or a raw text/csv body
+        if request.mimetype == 'text/csv':
+            stream = request.stream
+        else:
+            if 'file' not in request.files:
+                return jsonify({'error': 'No file uploaded'}), 400
+
+            file = request.files['file']
+            if file.filename == '':
+                return jsonify({'error': 'No file selected'}), 400
+            if not file.filename.lower().endswith('.csv'):
+                return jsonify({'error': 'Invalid file format. Please upload a CSV file'}), 400
+            stream = file.stream
+
+        tree = active_models['compiled_tree']
+        ensemble = active_models.get('ensemble')
+        reader = pd.read_csv(stream, chunksize=app.config['STREAM_CHUNK_SIZE'])
+
+        # Score the first chunk up front so bad uploads still get a proper error status
+        try:
+            with stage_timer('parse'):
+                first_chunk = next(reader)
+        except StopIteration:
+            return jsonify({'error': 'Uploaded file is empty'}), 400
+        try:
+            first_results = score_chunk(first_chunk, input_schema, tree, pipeline, ensemble)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        def generate():
+            total_count = 0
+            turnover_count = 0
+            results = first_results
+            header = True
+            try:
+                while results is not None:
+                    total_count += len(results)
+                    turnover_count += int(results['Predicted_Turnover'].sum())
+                    count_rows(len(results))
+                    with stage_timer('serialize'):
+                        if output_format == 'csv':
+                            body = results.to_csv(index=False, header=header)
+                            header = False
+                        else:
+                            body = results.to_json(orient='records', lines=True, double_precision=15)
+                    yield body
+
+                    with stage_timer('parse'):
+                        chunk = next(reader, None)
+                    results = score_chunk(chunk, input_schema, tree, pipeline, ensemble) if chunk is not None else None
+            except Exception as e:
+                # Headers are already sent, so report the failure in-band
+                app.logger.exception("Error while streaming predictions")
+                metrics.inc('hr_request_errors_total', {'endpoint': request_endpoint(), 'exception': type(e).__name__})
+                if output_format == 'ndjson':
+                    yield json.dumps({'error': str(e)}) + '\n'
+                return
+
+            if output_format == 'ndjson':
+                turnover_rate = (turnover_count / total_count) * 100 if total_count > 0 else 0
+                yield json.dumps({'summary': {
+                    'total_employees': total_count,
+                    'predicted_to_leave': turnover_count,
+                    'turnover_rate': round(turnover_rate, 2)
+                }}) + '\n'
+
+        if output_format == 'csv':
+            return Response(
+                stream_with_context(generate()),
+                mimetype='text/csv',
+                headers={'Content-Disposition': 'attachment; filename=predictions.csv'}
+            )
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    except Exception as e:
+        return error_response(e)
+
+@app.route('/api/cluster-assign', methods=['POST'])
+def assign_clusters():
+    """Assign uploaded employees to clusters and project them onto the PCA plane"""
+    # Use one model version for the whole request, even if a new one is swapped in
+    active_models = models
+    try:
+        if 'cluster_engine' not in active_models:
+            return jsonify({'error': 'Clustering models not loaded'}), 500
+        
+        use_sample = request.form.get('use_sample', 'false').lower() == 'true'
+        raw_input = request.form.get('raw', 'false').lower() == 'true'
+        if raw_input and not use_sample and 'preprocessing' not in active_models:
+            return jsonify({'error': 'Preprocessing pipeline not loaded'}), 500
+        
+        if use_sample:
+            if 'preprocessed' not in datasets:
+                return jsonify({'error': 'Preprocessed data not loaded'}), 500
+            
+            user_data = stored_table('preprocessed').head(5).drop(columns=['left'], errors='ignore')
+            processed_data = user_data
+        else:
+            if 'file' not in request.files:
+                return jsonify({'error': 'No file uploaded'}), 400
+            
+            file = request.files['file']
+            if file.filename == '':
+                return jsonify({'error': 'No file selected'}), 400
+            if not file.filename.lower().endswith('.csv'):
+                return jsonify({'error': 'Invalid file format. Please upload a CSV file'}), 400
+            
+            if not raw_input and not input_schema:
+                return jsonify({'error': 'Preprocessed data not loaded'}), 500
+            try:
+                with stage_timer('parse'):
+                    user_data = pd.read_csv(file.stream)
+                processed_data = prepare_features(
+                    user_data, input_schema, active_models['preprocessing'] if raw_input else None
+                )
+            except ValueError as e:
+                # Unparseable files, missing columns and unknown categories are client errors
+                return jsonify({'error': str(e)}), 400
+        
+        engine = active_models['cluster_engine']
+        with stage_timer('assign'):
+            clusters, distances = engine.assign(processed_data)
+            coordinates = engine.project(processed_data)
+        
+        # Sample rows are a slice of the shared dataset; uploads belong to this request
+        results = user_data.copy() if use_sample else user_data
+        results['Cluster'] = clusters.astype(int)
+        results['Distance_To_Center'] = distances
+        results['PC1'] = coordinates[:, 0]
+        results['PC2'] = coordinates[:, 1]
+        
+        cluster_sizes = np.bincount(clusters, minlength=engine.n_clusters)
+        count_rows(len(results))
+        
+        with stage_timer('serialize'):
+            return jsonify({
+                'assignments': results.to_dict('records'),
+                'centers': [
+                    {'Cluster': cluster_id, 'PC1': float(pc1), 'PC2': float(pc2)}
+                    for cluster_id, (pc1, pc2) in enumerate(engine.centers_projected[:, :2])
+                ],
+                'summary': {
+                    'total_employees': int(len(results)),
+                    'cluster_sizes': {str(cluster_id): int(size) for cluster_id, size in enumerate(cluster_sizes)}
+                }
+            })
+    
+    except Exception as e:
+        return error_response(e)
+
+def init_job_process():
+    """Wait in a new job process until importing this module has loaded the datasets and models"""
+    if startup_loader is not None:
+        startup_loader.join()
+
+def get_job_executor():
+    """Return the process pool that runs batch prediction jobs, starting it if needed"""
+    global job_executor
+    with job_executor_lock:
+        if job_executor is None:
+            # Job processes are spawned, not forked: by now this worker runs request,
+            # registry watcher and shadow scoring threads, and a forked child could
+            # inherit a lock one of them holds. Each job process imports this module,
+            # which loads the active model version, once for all the jobs it runs.
+            job_executor = ProcessPoolExecutor(
+                max_workers=app.config['JOB_WORKERS'],
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_job_process
+            )
+        return job_executor
+
+def job_directory(job_id):
+    """Return the directory of a job, or None for ids that aren't ours"""
+    try:
+        job_id = uuid.UUID(hex=job_id).hex
+    except ValueError:
+        return None
+    return os.path.join(app.config['JOBS_FOLDER'], job_id)
+
+def read_job_status(job_dir):
+    """Read a job's status file"""
+    with open(os.path.join(job_dir, 'status.json')) as f:
+        return json.load(f)
+
+def write_job_status(job_dir, **updates):
+    """Update a job's status file atomically so pollers never see a partial write"""
+    status_path = os.path.join(job_dir, 'status.json')
+    status = read_job_status(job_dir) if os.path.exists(status_path) else {}
+    status.update(updates, updated_at=datetime.now(timezone.utc).isoformat())
+    
+    tmp_path = f"{status_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(status, f)
+    os.replace(tmp_path, status_path)
+
+def process_identity(pid=None):
+    """pid and start time of a process, so a later process reusing the pid isn't mistaken for it"""
+    pid = pid or os.getpid()
+    return {'pid': pid, 'started': process_start_time(pid)}
+
+def process_start_time(pid):
+    """Start time of a process in clock ticks since boot, or None without /proc"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # Fields after the parenthesized command name; starttime is the 22nd field overall
+            return int(f.read().rsplit(')', 1)[1].split()[19])
+    except (OSError, IndexError, ValueError):
+        return None
+
+def process_alive(identity):
+    """Whether the process recorded by process_identity is still running"""
+    try:
+        os.kill(identity['pid'], 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return identity.get('started') is None or process_start_time(identity['pid']) == identity['started']
+
+def fail_orphaned_job(job_dir, status):
+    """
+    Mark a queued or running job failed when the process that owns it is gone
+
+    A queued job belongs to the app worker whose pool it was submitted to, a
+    running one to the job process scoring it; either dying leaves the job
+    unfinished for good. Returns the (possibly updated) status.
+    """
+    owner = {'queued': status.get('owner'), 'running': status.get('runner')}.get(status.get('status'))
+    if owner is None or process_alive(owner):
+        return status
+    write_job_status(job_dir, status='failed', error='The process running this job exited before it finished')
+    return read_job_status(job_dir)
+
+def sweep_jobs(force=False):
+    """Fail orphaned jobs and delete finished ones older than JOB_TTL, at most once per JOB_SWEEP_INTERVAL"""
+    now = time.monotonic()
+    if not force and now - last_job_sweep['time'] < app.config['JOB_SWEEP_INTERVAL']:
+        return
+    last_job_sweep['time'] = now
+    jobs_folder = app.config['JOBS_FOLDER']
+    if not os.path.isdir(jobs_folder):
+        return
+    
+    expired_before = time.time() - app.config['JOB_TTL']
+    for name in os.listdir(jobs_folder):
+        job_dir = os.path.join(jobs_folder, name)
+        status_path = os.path.join(job_dir, 'status.json')
+        try:
+            if not os.path.exists(status_path):
+                # A submission that never got its status written
+                if os.path.getmtime(job_dir) < expired_before:
+                    shutil.rmtree(job_dir, ignore_errors=True)
+                continue
+            status = fail_orphaned_job(job_dir, read_job_status(job_dir))
+            if status['status'] in ('completed', 'failed') and os.path.getmtime(status_path) < expired_before:
+                shutil.rmtree(job_dir, ignore_errors=True)
+        except (OSError, ValueError) as e:
+            # Another process may be deleting or updating the same job
+            app.logger.warning("Could not sweep job %s: %s", name, e)
+
+def job_finished(job_dir, executor, future):
+    """Fail a job whose process died; that breaks the pool, so it is replaced on the next submission"""
+    global job_executor
+    error = future.exception()
+    if error is None:
+        # run_prediction_job records its own errors
+        return
+    if isinstance(error, BrokenProcessPool):
+        with job_executor_lock:
+            if job_executor is executor:
+                job_executor = None
+    try:
+        if read_job_status(job_dir)['status'] in ('queued', 'running'):
+            write_job_status(job_dir, status='failed', error=f'The job process failed: {error}')
+    except (OSError, ValueError):
+        app.logger.exception("Could not record the failure of job %s", job_dir)
+
+def run_prediction_job(job_dir, raw_input, chunk_size):
+    """Score a job's input CSV chunk by chunk (runs in a job process)"""
+    input_path = os.path.join(job_dir, 'input.csv')
+    partial_path = os.path.join(job_dir, 'result.csv.partial')
+    try:
+        # Job processes outlive model swaps in the app worker, so pick up the active version here
+        reload_models_if_changed()
+        active_models = models
+        pipeline = active_models['preprocessing'] if raw_input else None
+        tree = active_models['compiled_tree']
+        total_bytes = os.path.getsize(input_path)
+        write_job_status(job_dir, status='running', model_version=model_state['version'], runner=process_identity())
+        
+        total_count = 0
+        turnover_count = 0
+        with open(input_path, 'rb') as source, open(partial_path, 'w', newline='') as output:
+            for i, chunk in enumerate(pd.read_csv(source, chunksize=chunk_size)):
+                results = score_chunk(chunk, input_schema, tree, pipeline)
+                results.to_csv(output, index=False, header=(i == 0))
+                
+                total_count += len(results)
+                turnover_count += int(results['Predicted_Turnover'].sum())
+                # The parser reads ahead, so the byte position is an estimate
+                progress = min(source.tell() / total_bytes, 1.0) if total_bytes else 1.0
+                write_job_status(job_dir, rows_processed=total_count, progress=round(progress, 4))
+        
+        os.replace(partial_path, os.path.join(job_dir, 'result.csv'))
+        turnover_rate = (turnover_count / total_count) * 100 if total_count > 0 else 0
+        write_job_status(job_dir, status='completed', progress=1.0, summary={
+            'total_employees': total_count,
+            'predicted_to_leave': turnover_count,
+            'turnover_rate': round(turnover_rate, 2)
         })
+    except Exception as e:
+        app.logger.exception("Prediction job %s failed", job_dir)
+        write_job_status(job_dir, status='failed', error=str(e))
+
+# Fail the jobs left unfinished by processes of a previous run and drop expired
+# ones (job processes import this module too, but leave that to the app processes)
+if multiprocessing.parent_process() is None:
+    sweep_jobs(force=True)
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_prediction_job():
+    """Queue an uploaded CSV for background scoring and return its job id"""
+    try:
+        if 'compiled_tree' not in models:
+            return jsonify({'error': 'Decision tree model not loaded'}), 500
+        if not input_schema:
+            return jsonify({'error': 'Preprocessed data not loaded'}), 500
+        
+        raw_input = request.form.get('raw', 'false').lower() == 'true'
+        if raw_input and 'preprocessing' not in models:
+            return jsonify({'error': 'Preprocessing pipeline not loaded'}), 500
+        
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file uploaded'}), 400
+        
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+        if not file.filename.lower().endswith('.csv'):
+            return jsonify({'error': 'Invalid file format. Please upload a CSV file'}), 400
+        
+        sweep_jobs()
+        job_id = uuid.uuid4().hex
+        job_dir = job_directory(job_id)
+        os.makedirs(job_dir)
+        file.save(os.path.join(job_dir, 'input.csv'))
+        # The job waits in this worker's pool, so it is orphaned if this process exits
+        write_job_status(
+            job_dir, id=job_id, status='queued', filename=secure_filename(file.filename),
+            rows_processed=0, progress=0.0, created_at=datetime.now(timezone.utc).isoformat(),
+            owner=process_identity()
+        )
+        
+        executor = get_job_executor()
+        future = executor.submit(run_prediction_job, job_dir, raw_input, app.config['STREAM_CHUNK_SIZE'])
+        future.add_done_callback(lambda future: job_finished(job_dir, executor, future))
+        
+        return jsonify({
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': f'/api/jobs/{job_id}',
+            'result_url': f'/api/jobs/{job_id}/result'
+        }), 202
+    
+    except Exception as e:
+        return error_response(e)
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_prediction_job(job_id):
+    """Get the status and progress of a batch prediction job"""
+    try:
+        job_dir = job_directory(job_id)
+        if job_dir is None or not os.path.exists(os.path.join(job_dir, 'status.json')):
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return jsonify(fail_orphaned_job(job_dir, read_job_status(job_dir)))
+    except Exception as e:
+        return error_response(e)
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def download_prediction_job(job_id):
+    """Download the scored CSV of a completed job"""
+    try:
+        job_dir = job_directory(job_id)
+        if job_dir is None or not os.path.exists(os.path.join(job_dir, 'status.json')):
+            return jsonify({'error': 'Job not found'}), 404
         
+        status = fail_orphaned_job(job_dir, read_job_status(job_dir))
+        if status['status'] != 'completed':
+            return jsonify({'error': f"Job is {status['status']}", 'status': status['status']}), 409
+        
+        return send_file(
+            os.path.abspath(os.path.join(job_dir, 'result.csv')),
+            mimetype='text/csv',
+            as_attachment=True,
+            download_name=f"predictions_{status['filename']}"
+        )
+    except Exception as e:
+        return error_response(e)
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Request latency, stage timing, row and error metrics in Prometheus text format"""
+    try:
+        if app.config['METRICS_DIR']:
+            # Include this worker's latest numbers, then merge every worker's snapshot
+            dump_metrics(force=True)
+            snapshots = load_snapshots(app.config['METRICS_DIR'])
+        else:
+            snapshots = [metrics.snapshot()]
+        body = render_prometheus(*merge_snapshots(snapshots))
+        return Response(body, content_type='text/plain; version=0.0.4; charset=utf-8')
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 @app.route('/api/available-images', methods=['GET'])
 def get_available_images():
@@ -250,7 +1535,7 @@ def get_available_images():
         else:
             return jsonify([])
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
@@ -0,0 +1,212 @@
+"""
+Score many CSV files from the command line, without going through the API.
+
+Inputs can be files, directories (every *.csv in them) or glob patterns. Files
+are spread over a pool of forked processes that share the model loaded once by
+the parent, and each input gets a <name>.predictions.csv next to it:
+
+    python batch-score.py exports/                      # preprocessed files
+    python batch-score.py 'exports/dept_*.csv' --raw    # raw HR exports
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import joblib
+import pandas as pd
+
+import scoring
+from data_store import load_table
+from inference import CompiledTree
+from model_registry import REGISTRY_DIR, resolve_artifacts
+
+PREPROCESSED_PATH = 'data/preprocessed_hr_data.csv'
+RESULT_SUFFIX = '.predictions.csv'
+# Rows read and scored at a time, so large exports are never held in memory whole
+CHUNK_SIZE = 50000
+
+# Model, input schema and pipeline used by this process; set once in the parent
+# before the pool forks, so the workers share its pages instead of loading their own
+scorer = None
+
+
+def load_scorer(raw_input, registry_dir=REGISTRY_DIR):
+    """Load the active model version and what is needed to turn input files into its features"""
+    version, paths = resolve_artifacts(registry_dir)
+    pipeline = None
+    if raw_input:
+        if not os.path.exists(paths['preprocessing']):
+            raise FileNotFoundError(f"Preprocessing pipeline not found: {paths['preprocessing']}")
+        pipeline = joblib.load(paths['preprocessing'])
+    tree = CompiledTree(joblib.load(paths['decision_tree']), preprocessing=pipeline)
+
+    schema = scoring.compile_input_schema(load_table(PREPROCESSED_PATH))
+    if tree.feature_names and tree.feature_names != schema['columns']:
+        raise ValueError(f"Model features {tree.feature_names} don't match the input schema {schema['columns']}")
+    return {
+        'version': version,
+        'tree': tree,
+        'schema': schema,
+        'pipeline': scoring.compile_preprocessing_pipeline(pipeline) if pipeline is not None else None
+    }
+
+
+def init_worker(raw_input, registry_dir):
+    """Load the scorer in a worker that wasn't forked from the parent"""
+    global scorer
+    scorer = load_scorer(raw_input, registry_dir)
+
+
+def expand_inputs(patterns):
+    """Resolve files, directories and glob patterns to a sorted list of CSV files (results excluded)"""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, '*.csv'))
+        else:
+            matches = glob.glob(pattern)
+            if not matches:
+                raise FileNotFoundError(f"No files match {pattern}")
+        paths.extend(path for path in matches if not path.endswith(RESULT_SUFFIX))
+    return sorted(set(paths))
+
+
+def result_path(input_path):
+    """Where the predictions for an input file are written"""
+    return os.path.splitext(input_path)[0] + RESULT_SUFFIX
+
+
+def score_file(input_path, chunk_size=CHUNK_SIZE):
+    """Score one CSV chunk by chunk and write its predictions next to it (runs in a worker)"""
+    start = time.perf_counter()
+    output_path = result_path(input_path)
+    partial_path = f"{output_path}.{os.getpid()}.partial"
+    tree, schema, pipeline = scorer['tree'], scorer['schema'], scorer['pipeline']
+    total_count = 0
+    turnover_count = 0
+    try:
+        with open(partial_path, 'w', newline='') as output:
+            for i, chunk in enumerate(pd.read_csv(input_path, chunksize=chunk_size)):
+                if pipeline is not None:
+                    features = scoring.transform_raw_data(chunk, pipeline)
+                else:
+                    features = scoring.preprocess_user_data(chunk, schema)
+                predictions, probabilities = tree.predict_with_proba(features)
+                chunk['Predicted_Turnover'] = predictions.astype(int)
+                chunk['Turnover_Probability'] = probabilities[:, 1].astype(float)
+                chunk.to_csv(output, index=False, header=(i == 0))
+
+                total_count += len(chunk)
+                turnover_count += int(predictions.sum())
+        # Results only appear once complete
+        os.replace(partial_path, output_path)
+    except Exception as e:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        return {'file': input_path, 'status': 'failed', 'error': str(e)}
+
+    seconds = max(time.perf_counter() - start, 1e-9)
+    return {
+        'file': input_path,
+        'status': 'completed',
+        'output': output_path,
+        'rows': total_count,
+        'predicted_to_leave': turnover_count,
+        'seconds': round(seconds, 4),
+        'rows_per_second': round(total_count / seconds, 1)
+    }
+
+
+def score_files(paths, raw_input=False, workers=None, registry_dir=REGISTRY_DIR):
+    """Score every file with up to ``workers`` processes and return the per-file results"""
+    global scorer
+    scorer = load_scorer(raw_input, registry_dir)
+    print(f"Scoring {len(paths)} file(s) with model version {scorer['version']}")
+
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    if workers <= 1:
+        results = []
+        for path in paths:
+            results.append(score_file(path))
+            print_result(results[-1])
+        return results
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        pool_options = {'mp_context': multiprocessing.get_context('fork')}
+    else:
+        pool_options = {'initializer': init_worker, 'initargs': (raw_input, registry_dir)}
+    # Largest files first, so one big export doesn't start last and leave the other workers idle
+    paths = sorted(paths, key=os.path.getsize, reverse=True)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, **pool_options) as pool:
+        futures = [pool.submit(score_file, path) for path in paths]
+        for future in as_completed(futures):
+            results.append(future.result())
+            print_result(results[-1])
+    return sorted(results, key=lambda result: result['file'])
+
+
+def print_result(result):
+    """One progress line per scored file"""
+    if result['status'] == 'failed':
+        print(f"FAILED {result['file']}: {result['error']}")
+    else:
+        print(f"{result['file']}: {result['rows']} rows in {result['seconds']:.2f}s "
+              f"({result['rows_per_second']:,.0f} rows/s) -> {result['output']}")
+
+
+def summarize(results, seconds):
+    """Totals and throughput of a whole run"""
+    completed = [result for result in results if result['status'] == 'completed']
+    rows = sum(result['rows'] for result in completed)
+    seconds = max(seconds, 1e-9)
+    turnover = sum(result['predicted_to_leave'] for result in completed)
+    return {
+        'files': len(results),
+        'failed': len(results) - len(completed),
+        'rows': rows,
+        'predicted_to_leave': turnover,
+        'turnover_rate': round(turnover / rows * 100, 2) if rows else 0,
+        'seconds': round(seconds, 4),
+        'rows_per_second': round(rows / seconds, 1),
+        'files_per_second': round(len(results) / seconds, 2)
+    }
+
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Score CSV files with the served decision tree')
+    parser.add_argument('inputs', nargs='+', help='CSV files, directories or glob patterns')
+    parser.add_argument('--raw', action='store_true', help='Inputs are raw HR exports (encoded with the saved pipeline)')
+    parser.add_argument('--workers', type=int, default=None, help='Scoring processes (default: one per CPU)')
+    parser.add_argument('--registry', default=REGISTRY_DIR, help='Model registry directory')
+    parser.add_argument('--summary', help='Write the per-file results and totals to this JSON file')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = expand_inputs(args.inputs)
+    if not paths:
+        print("No CSV files to score")
+        return 0
+
+    start = time.perf_counter()
+    results = score_files(paths, raw_input=args.raw, workers=args.workers, registry_dir=args.registry)
+    summary = summarize(results, time.perf_counter() - start)
+    print(f"Scored {summary['rows']} rows from {summary['files'] - summary['failed']}/{summary['files']} file(s) "
+          f"in {summary['seconds']:.2f}s ({summary['rows_per_second']:,.0f} rows/s); "
+          f"predicted turnover rate {summary['turnover_rate']}%")
+
+    if args.summary:
+        with open(args.summary, 'w') as f:
+            json.dump({'model_version': scorer['version'], 'summary': summary, 'files': results}, f, indent=2)
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,238 @@
+"""
+Benchmark suite for the serving and training paths.
+
+Generates synthetic employee data shaped like WA_Fn-UseC_-HR-Employee-Attrition.csv
+at several scales and times /api/predict (through the Flask test client),
+preprocess_data, train_decision_tree and the KMeans/PCA stages. Results are
+written as JSON so runs from different commits can be compared:
+
+    python benchmark.py --scales 10000 100000 --output before.json
+    python benchmark.py --scales 10000 100000 --output after.json --compare before.json
+"""
+import argparse
+import importlib.util
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import matplotlib
+matplotlib.use('Agg')
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+RAW_DATA_PATH = os.path.join(REPO_DIR, 'data', 'WA_Fn-UseC_-HR-Employee-Attrition.csv')
+DEFAULT_SCALES = [10000, 100000, 1000000]
+BENCHMARKS = ['api_predict', 'api_predict_stream', 'preprocess', 'train', 'kmeans', 'pca']
+
+
+def load_script(name, filename):
+    """Import one of the pipeline scripts (their file names aren't valid module names)"""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(REPO_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def generate_employees(n_rows, seed=42):
+    """
+    Generate synthetic employees by resampling rows of the real dataset.
+
+    Whole rows are drawn so the relationships between features (and so the
+    shape of the fitted trees and clusters) stay realistic at any scale.
+    """
+    source = pd.read_csv(RAW_DATA_PATH)
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(source), size=n_rows)
+    return source.iloc[rows].reset_index(drop=True)
+
+
+def time_call(func, repeat):
+    """Run func repeat times and return the wall times in seconds"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def summarize(benchmark, n_rows, times, **extra):
+    """Build one result record"""
+    best = min(times)
+    return {
+        'benchmark': benchmark,
+        'rows': n_rows,
+        'times': [round(t, 6) for t in times],
+        'min': round(best, 6),
+        'median': round(float(np.median(times)), 6),
+        'rows_per_second': round(n_rows / best, 1) if best > 0 else None,
+        **extra
+    }
+
+
+def bench_api(app_module, raw_df, repeat):
+    """Time /api/predict and /api/predict/stream with a raw CSV upload"""
+    client = app_module.app.test_client()
+    body = raw_df.to_csv(index=False).encode('utf-8')
+    results = []
+
+    def post_predict():
+        response = client.post('/api/predict', data={
+            'raw': 'true', 'file': (io.BytesIO(body), 'employees.csv')
+        })
+        assert response.status_code == 200, response.get_data(as_text=True)[:200]
+
+    def post_stream():
+        response = client.post('/api/predict/stream?raw=true&format=csv', data=body, content_type='text/csv')
+        assert response.status_code == 200, response.get_data(as_text=True)[:200]
+        response.get_data()
+
+    upload_limit = app_module.app.config['MAX_CONTENT_LENGTH']
+    if upload_limit is None or len(body) <= upload_limit:
+        results.append(summarize('api_predict', len(raw_df), time_call(post_predict, repeat), upload_bytes=len(body)))
+    else:
+        print(f"  api_predict: skipped, {len(body)} byte upload exceeds MAX_CONTENT_LENGTH")
+    results.append(summarize('api_predict_stream', len(raw_df), time_call(post_stream, repeat), upload_bytes=len(body)))
+    return results
+
+
+def run_scale(n_rows, args, app_module, preprocess, train_model, cluster_analysis):
+    """Run every selected benchmark at one scale"""
+    print(f"Generating {n_rows} synthetic employees")
+    raw_df = generate_employees(n_rows, seed=args.seed)
+    results = []
+
+    if {'api_predict', 'api_predict_stream'} & set(args.benchmarks):
+        results += [r for r in bench_api(app_module, raw_df, args.repeat) if r['benchmark'] in args.benchmarks]
+
+    processed_df = preprocess.preprocess_data(raw_df)[0]
+    if 'preprocess' in args.benchmarks:
+        results.append(summarize('preprocess', n_rows, time_call(lambda: preprocess.preprocess_data(raw_df), args.repeat)))
+
+    if 'train' in args.benchmarks:
+        X_train, _, y_train, _ = train_model.split_data(processed_df)
+        times = time_call(
+            lambda: train_model.train_decision_tree(X_train, y_train, search=args.search, n_jobs=args.n_jobs),
+            args.repeat
+        )
+        results.append(summarize('train', len(X_train), times, search=args.search, n_jobs=args.n_jobs))
+
+    X = cluster_analysis.prepare_data_for_clustering(processed_df)
+    if 'kmeans' in args.benchmarks:
+        times = time_call(lambda: cluster_analysis.perform_kmeans_clustering(X, args.n_clusters), args.repeat)
+        results.append(summarize('kmeans', n_rows, times, n_clusters=args.n_clusters))
+
+    if 'pca' in args.benchmarks:
+        kmeans_model, data_with_clusters = cluster_analysis.perform_kmeans_clustering(X, args.n_clusters)
+        # Queue the scatter plot instead of rendering it, so every repeat times only the PCA
+        # (rendering is skipped after the first run anyway, once the figure's inputs are unchanged)
+        times = time_call(
+            lambda: cluster_analysis.visualize_clusters(
+                data_with_clusters, data_with_clusters, kmeans_model, figures=[]
+            ),
+            args.repeat
+        )
+        results.append(summarize('pca', n_rows, times))
+
+    for result in results:
+        print(f"  {result['benchmark']:<20} {result['min']:>10.4f}s  {result['rows_per_second'] or 0:>14,.0f} rows/s")
+    return results
+
+
+def environment_info():
+    """Describe the code version and machine the benchmark ran on"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'scikit-learn': sklearn.__version__
+    }
+
+
+def compare_results(results, baseline_path):
+    """Print the speedup of each benchmark against a previous results file"""
+    with open(baseline_path) as f:
+        baseline = {(r['benchmark'], r['rows']): r for r in json.load(f)['results']}
+
+    print(f"\nComparison against {baseline_path} (ratio > 1 means faster now)")
+    for result in results:
+        previous = baseline.get((result['benchmark'], result['rows']))
+        if previous is None:
+            continue
+        ratio = previous['min'] / result['min'] if result['min'] > 0 else float('inf')
+        print(f"  {result['benchmark']:<20} {result['rows']:>10}  {previous['min']:.4f}s -> {result['min']:.4f}s  x{ratio:.2f}")
+
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Benchmark the serving and training paths')
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES,
+                        help='Numbers of synthetic employees to benchmark with (e.g. 10000 ... 10000000)')
+    parser.add_argument('--benchmarks', nargs='+', choices=BENCHMARKS, default=BENCHMARKS,
+                        help='Benchmarks to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per benchmark')
+    parser.add_argument('--seed', type=int, default=42, help='Seed for the synthetic data')
+    parser.add_argument('--search', choices=['grid', 'halving'], default='halving',
+                        help='Hyperparameter search used by the train benchmark')
+    parser.add_argument('--n-jobs', type=int, default=-1, help='Worker processes for the train benchmark')
+    parser.add_argument('--n-clusters', type=int, default=2, help='Clusters fitted by the kmeans/pca benchmarks')
+    parser.add_argument('--output', default='benchmark_results.json', help='Where to write the JSON results')
+    parser.add_argument('--compare', help='Previous results file to compare against')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    output_path = os.path.abspath(args.output)
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+
+    # The app loads its models and datasets relative to the repository
+    os.chdir(REPO_DIR)
+    sys.path.insert(0, REPO_DIR)
+    import app as app_module
+    import preprocess
+    train_model = load_script('train_model', 'train-model.py')
+    cluster_analysis = load_script('cluster_analysis', 'cluster-analysis.py')
+
+    results = []
+    # The pipeline stages write models, plots and CSVs, so run them in a scratch directory
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        for name in ('models', 'images', 'data'):
+            os.makedirs(os.path.join(scratch_dir, name))
+        os.chdir(scratch_dir)
+        try:
+            for n_rows in args.scales:
+                results += run_scale(n_rows, args, app_module, preprocess, train_model, cluster_analysis)
+        finally:
+            os.chdir(REPO_DIR)
+
+    report = {'environment': environment_info(), 'config': vars(args), 'results': results}
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark results saved to {output_path}")
+
+    if compare_path:
+        compare_results(results, compare_path)
+
+
+if __name__ == '__main__':
+    main()
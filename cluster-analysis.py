@@ -1,15 +1,17 @@
+import argparse
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from sklearn.cluster import KMeans
-from sklearn.decomposition import PCA
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.decomposition import PCA, IncrementalPCA
 from sklearn.preprocessing import StandardScaler
 import os
 import joblib
+from data_store import load_table, save_table
+import report
 
 def load_preprocessed_data(filepath='data/preprocessed_hr_data.csv'):
-    """Load preprocessed data from CSV file"""
-    return pd.read_csv(filepath)
+    """Load preprocessed data from CSV file (through its columnar cache, in the smallest exact dtypes)"""
+    return load_table(filepath, dtypes='lossless')
 
 def prepare_data_for_clustering(df):
     """Prepare data for clustering by dropping the target variable"""
@@ -25,7 +27,16 @@ def prepare_data_for_clustering(df):
     
     return X
 
-def find_optimal_clusters(data, max_k=15):
+def elbow_point(inertia, max_k):
+    """Pick the k where the rate of decrease in inertia changes most sharply"""
+    inertia_diff = np.diff(inertia)
+    inertia_diff2 = np.diff(inertia_diff)
+    optimal_k = np.argmax(inertia_diff2) + 2  # +2 due to two diff operations
+    
+    # Ensure optimal_k is within range
+    return int(min(max(optimal_k, 2), max_k))
+
+def find_optimal_clusters(data, max_k=15, figures=None):
     """Find the optimal number of clusters using the Elbow method"""
     inertia = []
     k_range = range(1, max_k + 1)
@@ -36,29 +47,96 @@ def find_optimal_clusters(data, max_k=15):
         inertia.append(kmeans.inertia_)
     
     # Plot Elbow curve
-    plt.figure(figsize=(12, 8))
-    plt.plot(k_range, inertia, marker='o', linestyle='-')
-    plt.xlabel('Number of Clusters')
-    plt.ylabel('Inertia')
-    plt.title('Elbow Method for Optimal k')
-    plt.xticks(k_range)
-    plt.grid(True)
-    plt.tight_layout()
-    plt.savefig('images/kmeans_elbow.png')
-    plt.close()
+    report.add_figures(figures, [report.elbow_figure(k_range, inertia)])
     
     # Return the optimal k (this is a simple heuristic)
-    # Look for the point where the rate of decrease sharply changes
-    inertia_diff = np.diff(inertia)
-    inertia_diff2 = np.diff(inertia_diff)
-    optimal_k = np.argmax(inertia_diff2) + 2  # +2 due to two diff operations
-    
-    # Ensure optimal_k is within range
-    optimal_k = min(max(optimal_k, 2), max_k)
+    optimal_k = elbow_point(inertia, max_k)
     
     print(f"Optimal number of clusters detected: {optimal_k}")
     return optimal_k
 
+def iter_feature_batches(df, feature_cols, batch_size, rng=None):
+    """
+    Yield float64 feature batches from a (memory-mapped) DataFrame.
+
+    Only the rows of the current batch are materialized, so memory stays
+    bounded by the batch size. Batch order is shuffled when an rng is given.
+    """
+    starts = np.arange(0, len(df), batch_size)
+    if rng is not None:
+        starts = rng.permutation(starts)
+    for start in starts:
+        yield df.iloc[start:start + batch_size][feature_cols].to_numpy(dtype=np.float64)
+
+def sample_rows(n_rows, sample_size, random_state=42):
+    """Sorted indices of a random sample of rows"""
+    rng = np.random.default_rng(random_state)
+    return np.sort(rng.choice(n_rows, size=min(sample_size, n_rows), replace=False))
+
+def write_csv_chunk(df, path, first):
+    """Write the first chunk of a CSV with its header, or append a later one"""
+    df.to_csv(path, mode='w' if first else 'a', header=first, index=False)
+
+def fit_minibatch_kmeans(df, feature_cols, n_clusters, init='k-means++', batch_size=4096, n_epochs=1, random_state=42):
+    """Fit MiniBatchKMeans with partial_fit over streamed batches, optionally warm-started from given centers"""
+    kmeans = MiniBatchKMeans(
+        n_clusters=n_clusters, init=init, n_init=1,
+        batch_size=batch_size, random_state=random_state
+    )
+    rng = np.random.default_rng(random_state)
+    for _ in range(n_epochs):
+        for batch in iter_feature_batches(df, feature_cols, batch_size, rng):
+            kmeans.partial_fit(batch)
+    return kmeans
+
+def add_farthest_center(centers, sample):
+    """Warm start for k+1 clusters: keep the k centers and add the sample point farthest from all of them"""
+    distances = ((sample[:, np.newaxis, :] - centers[np.newaxis, :, :]) ** 2).sum(axis=2).min(axis=1)
+    return np.vstack([centers, sample[np.argmax(distances)]])
+
+def find_optimal_clusters_minibatch(df, feature_cols, max_k=15, sample_size=10000, batch_size=4096,
+                                    n_bootstrap=200, random_state=42, figures=None):
+    """
+    Find the optimal number of clusters with streamed mini-batch fits.
+
+    Each k is warm-started from the k-1 centers plus one new center, and its
+    inertia is estimated on a random sample of rows with a 95% confidence
+    interval. Bootstrap resamples of that sample give the share of resamples
+    that agree on the chosen k.
+    """
+    rng = np.random.default_rng(random_state)
+    sample_idx = np.sort(rng.choice(len(df), size=min(sample_size, len(df)), replace=False))
+    sample = df.iloc[sample_idx][feature_cols].to_numpy(dtype=np.float64)
+    
+    k_range = range(1, max_k + 1)
+    centers_by_k = {}
+    # Squared distance of every sample row to its nearest center, one column per k
+    sample_distances = np.empty((len(sample), max_k))
+    init = 'k-means++'
+    
+    for k in k_range:
+        kmeans = fit_minibatch_kmeans(df, feature_cols, k, init=init, batch_size=batch_size, random_state=random_state)
+        centers_by_k[k] = kmeans.cluster_centers_
+        sample_distances[:, k - 1] = kmeans.transform(sample).min(axis=1) ** 2
+        init = add_farthest_center(kmeans.cluster_centers_, sample)
+    
+    # Scale the per-row sample mean up to the inertia of the full dataset
+    n_rows = len(df)
+    inertia = sample_distances.mean(axis=0) * n_rows
+    errors = 1.96 * sample_distances.std(axis=0, ddof=1) / np.sqrt(len(sample)) * n_rows
+    
+    optimal_k = elbow_point(inertia, max_k)
+    
+    resamples = rng.integers(0, len(sample), size=(n_bootstrap, len(sample)))
+    bootstrap_k = [elbow_point(sample_distances[rows].mean(axis=0), max_k) for rows in resamples]
+    confidence = np.mean(np.asarray(bootstrap_k) == optimal_k)
+    
+    report.add_figures(figures, [report.elbow_figure(k_range, inertia, errors)])
+    
+    print(f"Optimal number of clusters detected: {optimal_k} "
+          f"({confidence:.0%} of {n_bootstrap} bootstrap resamples agree)")
+    return optimal_k, centers_by_k
+
 def perform_kmeans_clustering(data, n_clusters):
     """Perform K-Means clustering"""
     kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
@@ -76,7 +154,26 @@ def perform_kmeans_clustering(data, n_clusters):
     
     return kmeans, data_with_clusters
 
-def visualize_clusters(data, clusters, kmeans_model):
+def perform_minibatch_clustering(df, feature_cols, n_clusters, init='k-means++', batch_size=4096, n_epochs=3,
+                                 output_path='data/clustered_hr_data.csv'):
+    """Perform mini-batch K-Means clustering over streamed batches and return the model and each row's cluster"""
+    kmeans = fit_minibatch_kmeans(df, feature_cols, n_clusters, init=init, batch_size=batch_size, n_epochs=n_epochs)
+    
+    # Assign clusters and write the labeled rows batch by batch, in row order
+    clusters = []
+    for i, batch in enumerate(iter_feature_batches(df, feature_cols, batch_size)):
+        batch_clusters = kmeans.predict(batch)
+        rows = df.iloc[i * batch_size:i * batch_size + len(batch)][feature_cols].copy()
+        rows['Cluster'] = batch_clusters
+        write_csv_chunk(rows, output_path, first=(i == 0))
+        clusters.append(batch_clusters)
+    
+    # Save the KMeans model
+    joblib.dump(kmeans, 'models/kmeans_model.pkl')
+    
+    return kmeans, np.concatenate(clusters)
+
+def visualize_clusters(data, clusters, kmeans_model, figures=None):
     """Visualize clusters using PCA for dimensionality reduction"""
     # Apply PCA to reduce dimensions to 2 for visualization
     pca = PCA(n_components=2)
@@ -92,151 +189,200 @@ def visualize_clusters(data, clusters, kmeans_model):
     # Save PCA results
     pca_df.to_csv('data/pca_hr_results.csv', index=False)
     
-    # Plot the clusters
-    plt.figure(figsize=(12, 8))
-    
-    # Plot each cluster with a different color
-    for cluster_id in range(kmeans_model.n_clusters):
-        cluster_data = pca_df[pca_df['Cluster'] == cluster_id]
-        plt.scatter(
-            cluster_data['PC1'], 
-            cluster_data['PC2'], 
-            s=50, alpha=0.7,
-            label=f'Cluster {cluster_id}'
-        )
-    
-    # Plot cluster centers
+    # Plot the clusters with their centers
     centers_pca = pca.transform(kmeans_model.cluster_centers_)
-    plt.scatter(
-        centers_pca[:, 0], centers_pca[:, 1],
-        s=200, marker='X', c='red', 
-        label='Cluster Centers'
-    )
+    report.add_figures(figures, [
+        report.cluster_scatter_figure(pca_result, pca_df['Cluster'].to_numpy(), centers_pca)
+    ])
+
+def fit_incremental_pca(df, feature_cols, batch_size, n_components=2):
+    """Fit IncrementalPCA with partial_fit over streamed batches"""
+    pca = IncrementalPCA(n_components=n_components, batch_size=batch_size)
+    previous = None
+    for batch in iter_feature_batches(df, feature_cols, batch_size):
+        if previous is not None:
+            if len(batch) < n_components:
+                # partial_fit needs at least n_components rows, so a short last batch joins the one before
+                batch = np.vstack([previous, batch])
+            else:
+                pca.partial_fit(previous)
+        previous = batch
+    if previous is not None:
+        pca.partial_fit(previous)
+    return pca
+
+def visualize_clusters_minibatch(df, feature_cols, clusters, kmeans_model, sample_idx, batch_size=4096,
+                                 output_path='data/pca_hr_results.csv', figures=None):
+    """
+    Streamed counterpart of visualize_clusters
+
+    The PCA is fitted incrementally and every batch is projected and written
+    on its own; only the rows in sample_idx are kept for the scatter plot.
+    """
+    pca = fit_incremental_pca(df, feature_cols, batch_size)
+    joblib.dump(pca, 'models/pca_model.pkl')
+    
+    sample_coordinates = []
+    for i, batch in enumerate(iter_feature_batches(df, feature_cols, batch_size)):
+        start = i * batch_size
+        coordinates = pca.transform(batch)
+        pca_df = pd.DataFrame(data=coordinates, columns=['PC1', 'PC2'])
+        pca_df['Cluster'] = clusters[start:start + len(batch)]
+        write_csv_chunk(pca_df, output_path, first=(i == 0))
+        
+        in_batch = sample_idx[(sample_idx >= start) & (sample_idx < start + len(batch))]
+        sample_coordinates.append(coordinates[in_batch - start])
     
-    plt.title('K-Means Clusters Visualization (PCA)')
-    plt.xlabel('Principal Component 1')
-    plt.ylabel('Principal Component 2')
-    plt.legend()
-    plt.grid(True, alpha=0.3)
-    plt.tight_layout()
-    plt.savefig('images/kmeans_clusters.png')
-    plt.close()
+    centers_pca = pca.transform(kmeans_model.cluster_centers_)
+    report.add_figures(figures, [
+        report.cluster_scatter_figure(np.concatenate(sample_coordinates), clusters[sample_idx], centers_pca)
+    ])
+
+# Features summarized in the cluster profiles
+KEY_FEATURES = [
+    'satisfaction_level', 'last_evaluation', 'number_project',
+    'average_montly_hours', 'time_spend_company', 'Work_accident',
+    'promotion_last_5years'
+]
+
+def compute_cluster_statistics(data, clusters, key_features, target_col='left'):
+    """
+    Compute additive per-cluster statistics in one grouped aggregation
+
+    Sizes, feature sums and turnover counts can simply be added together when
+    new rows arrive, so profiles can be updated without revisiting old rows.
+    """
+    frame = data[key_features].copy()
+    frame['Size'] = 1
+    aggregations = {'Size': ('Size', 'sum')}
+    for feature in key_features:
+        aggregations[f'Sum_{feature}'] = (feature, 'sum')
+    
+    if target_col in data.columns:
+        frame['Turnover_Count'] = (data[target_col] == 1).to_numpy()
+        aggregations['Turnover_Count'] = ('Turnover_Count', 'sum')
+    
+    statistics = frame.groupby(np.asarray(clusters)).agg(**aggregations)
+    statistics.index.name = 'Cluster'
+    return statistics
 
-def analyze_clusters(data_with_clusters, original_data):
+def update_cluster_statistics(statistics, new_data, new_clusters, key_features, target_col='left'):
+    """Fold newly labeled rows into existing cluster statistics"""
+    new_statistics = compute_cluster_statistics(new_data, new_clusters, key_features, target_col)
+    return statistics.add(new_statistics, fill_value=0)
+
+def profiles_from_statistics(statistics, key_features):
+    """Derive size share, feature means and turnover rate from cluster statistics"""
+    profiles_df = pd.DataFrame({
+        'Cluster': statistics.index.to_numpy(),
+        'Size': statistics['Size'].to_numpy().astype(int),
+        'Percentage': (statistics['Size'] / statistics['Size'].sum() * 100).to_numpy()
+    })
+    for feature in key_features:
+        profiles_df[f'Mean_{feature}'] = (statistics[f'Sum_{feature}'] / statistics['Size']).to_numpy()
+    if 'Turnover_Count' in statistics.columns:
+        profiles_df['Turnover_Rate'] = (statistics['Turnover_Count'] / statistics['Size'] * 100).to_numpy()
+    return profiles_df
+
+def cluster_quantiles(data, clusters, key_features, quantiles, cluster_ids=None):
+    """
+    Per-cluster quantiles of the key features (needs the full rows, so not incremental)
+
+    With cluster_ids the rows follow those clusters, so clusters missing from a
+    sample of the rows still line up with the profiles.
+    """
+    quantile_df = data[key_features].groupby(np.asarray(clusters)).quantile(quantiles).unstack()
+    if cluster_ids is not None:
+        quantile_df = quantile_df.reindex(cluster_ids)
+    quantile_df.columns = [f'Q{int(q * 100)}_{feature}' for feature, q in quantile_df.columns]
+    return quantile_df.reset_index(drop=True)
+
+def save_cluster_profiles(statistics, key_features, quantile_df=None,
+                          profiles_path='data/cluster_profiles.csv',
+                          statistics_path='data/cluster_statistics.csv'):
+    """Save the cluster profiles and the statistics needed to update them later"""
+    profiles_df = profiles_from_statistics(statistics, key_features)
+    if quantile_df is not None:
+        profiles_df = pd.concat([profiles_df, quantile_df], axis=1)
+    
+    save_table(profiles_df, profiles_path)
+    statistics.to_csv(statistics_path)
+    return profiles_df
+
+def analyze_clusters(data_with_clusters, original_data, quantiles=None, figures=None):
     """Analyze the characteristics of each cluster"""
-    # Get the number of clusters
-    n_clusters = data_with_clusters['Cluster'].nunique()
-    
-    # Create a DataFrame to store cluster profiles
     profiles = []
     
     # If we have the original data with non-scaled values, we can use it for more interpretable analysis
     if original_data is not None:
-        # Add cluster labels to original data
-        original_data_with_clusters = original_data.copy()
-        original_data_with_clusters['Cluster'] = data_with_clusters['Cluster'].values
+        clusters = data_with_clusters['Cluster'].to_numpy()
         
-        # For each cluster, compute mean values of important features
-        for cluster_id in range(n_clusters):
-            cluster_data = original_data_with_clusters[original_data_with_clusters['Cluster'] == cluster_id]
-            
-            # Select key features for profiling
-            key_features = [
-                'satisfaction_level', 'last_evaluation', 'number_project',
-                'average_montly_hours', 'time_spend_company', 'Work_accident',
-                'promotion_last_5years'
-            ]
-            
-            # Ensure all key features exist in the data
-            key_features = [f for f in key_features if f in cluster_data.columns]
-            
-            # Compute profile
-            profile = {
-                'Cluster': cluster_id,
-                'Size': len(cluster_data),
-                'Percentage': len(cluster_data) / len(original_data_with_clusters) * 100
-            }
-            
-            # Add mean values for key features
-            for feature in key_features:
-                profile[f'Mean_{feature}'] = cluster_data[feature].mean()
-            
-            # Add turnover rate if available
-            if 'left' in cluster_data.columns:
-                turnover_values = cluster_data['left'].value_counts(normalize=True)
-                profile['Turnover_Rate'] = turnover_values.get(1, 0) * 100  # Percentage
-            
-            profiles.append(profile)
+        # Ensure all key features exist in the data
+        key_features = [f for f in KEY_FEATURES if f in original_data.columns]
         
-        # Create profiles DataFrame and save it
-        profiles_df = pd.DataFrame(profiles)
-        profiles_df.to_csv('data/cluster_profiles.csv', index=False)
+        # Size, means and turnover rate of every cluster in one grouped pass
+        statistics = compute_cluster_statistics(original_data, clusters, key_features)
+        quantile_df = cluster_quantiles(original_data, clusters, key_features, quantiles) if quantiles else None
+        profiles_df = save_cluster_profiles(statistics, key_features, quantile_df)
+        profiles = profiles_df.to_dict('records')
         
         # Visualize key features for each cluster
-        plot_cluster_profiles(profiles_df, key_features)
+        report.add_figures(figures, report.cluster_profile_figures(profiles_df, key_features))
     
     return profiles
 
-def plot_cluster_profiles(profiles_df, key_features):
-    """Plot the profiles of each cluster based on key features"""
-    # Prepare feature names for plotting
-    features_to_plot = [f'Mean_{feature}' for feature in key_features if f'Mean_{feature}' in profiles_df.columns]
-    
-    if not features_to_plot:
-        print("No key features found for plotting cluster profiles")
-        return
-    
-    # Create subplots for each feature
-    n_features = len(features_to_plot)
-    fig, axes = plt.subplots(n_features, 1, figsize=(12, n_features * 4))
-    
-    # Handle case where there's only one feature
-    if n_features == 1:
-        axes = [axes]
+def analyze_clusters_minibatch(original_data, clusters, sample_idx, batch_size=4096, quantiles=None, figures=None):
+    """
+    Streamed counterpart of analyze_clusters
+
+    The additive statistics are folded in one batch of rows at a time, and
+    quantiles, which need whole columns, are estimated from the rows in sample_idx.
+    """
+    if original_data is None:
+        return []
+    key_features = [f for f in KEY_FEATURES if f in original_data.columns]
+    
+    statistics = None
+    for start in range(0, len(original_data), batch_size):
+        rows = original_data.iloc[start:start + batch_size]
+        batch_clusters = clusters[start:start + batch_size]
+        if statistics is None:
+            statistics = compute_cluster_statistics(rows, batch_clusters, key_features)
+        else:
+            statistics = update_cluster_statistics(statistics, rows, batch_clusters, key_features)
+    
+    quantile_df = None
+    if quantiles:
+        quantile_df = cluster_quantiles(
+            original_data.iloc[sample_idx], clusters[sample_idx], key_features, quantiles, cluster_ids=statistics.index
+        )
+    profiles_df = save_cluster_profiles(statistics, key_features, quantile_df)
+    report.add_figures(figures, report.cluster_profile_figures(profiles_df, key_features))
+    return profiles_df.to_dict('records')
+
+def update_cluster_profiles(new_original_data, new_clusters, statistics_path='data/cluster_statistics.csv'):
+    """Append newly labeled rows to the saved cluster statistics and rewrite the profiles"""
+    statistics = pd.read_csv(statistics_path, index_col='Cluster')
+    key_features = [f for f in KEY_FEATURES if f'Sum_{f}' in statistics.columns]
+    statistics = update_cluster_statistics(statistics, new_original_data, new_clusters, key_features)
+    return save_cluster_profiles(statistics, key_features, statistics_path=statistics_path)
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Cluster employees with K-Means and profile the clusters')
+    parser.add_argument('--mode', choices=['full', 'minibatch'], default='full',
+                        help='full: KMeans on the whole dataset; minibatch: streamed MiniBatchKMeans (default: full)')
+    parser.add_argument('--max-k', type=int, default=15, help='Largest number of clusters tried for the elbow')
+    parser.add_argument('--batch-size', type=int, default=4096, help='Rows per mini-batch')
+    parser.add_argument('--sample-size', type=int, default=10000,
+                        help='Rows used to estimate the elbow curve in minibatch mode')
+    parser.add_argument('--quantiles', type=float, nargs='*', default=None,
+                        help='Also profile these quantiles of the key features, e.g. 0.25 0.5 0.75')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
     
-    for i, feature in enumerate(features_to_plot):
-        # Plot the feature for each cluster
-        clean_feature_name = feature.replace('Mean_', '')
-        cluster_ids = profiles_df['Cluster'].tolist()
-        feature_values = profiles_df[feature].tolist()
-        
-        axes[i].bar(cluster_ids, feature_values)
-        axes[i].set_title(f'Average {clean_feature_name} by Cluster')
-        axes[i].set_xlabel('Cluster')
-        axes[i].set_ylabel(clean_feature_name)
-        axes[i].set_xticks(cluster_ids)
-        axes[i].grid(True, alpha=0.3)
-    
-    plt.tight_layout()
-    plt.savefig('images/cluster_profiles.png')
-    plt.close()
-    
-    # Plot cluster sizes
-    plt.figure(figsize=(10, 6))
-    plt.bar(profiles_df['Cluster'], profiles_df['Size'])
-    plt.title('Cluster Sizes')
-    plt.xlabel('Cluster')
-    plt.ylabel('Number of Employees')
-    plt.xticks(profiles_df['Cluster'])
-    plt.grid(True, alpha=0.3)
-    plt.tight_layout()
-    plt.savefig('images/cluster_sizes.png')
-    plt.close()
-    
-    # Plot turnover rate by cluster if available
-    if 'Turnover_Rate' in profiles_df.columns:
-        plt.figure(figsize=(10, 6))
-        plt.bar(profiles_df['Cluster'], profiles_df['Turnover_Rate'])
-        plt.title('Turnover Rate by Cluster')
-        plt.xlabel('Cluster')
-        plt.ylabel('Turnover Rate (%)')
-        plt.xticks(profiles_df['Cluster'])
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
-        plt.savefig('images/cluster_turnover_rates.png')
-        plt.close()
-
-def main():
     # Ensure directories exist
     os.makedirs('models', exist_ok=True)
     os.makedirs('images', exist_ok=True)
@@ -247,22 +393,49 @@ def main():
     
     # Keep a copy of original data for interpretable analysis
     original_data_path = 'data/WA_Fn-UseC_-HR-Employee-Attrition.csv'
-    original_data = pd.read_csv(original_data_path) if os.path.exists(original_data_path) else None
-    
-    # Prepare data for clustering
-    X = prepare_data_for_clustering(df)
+    original_data = load_table(original_data_path, dtypes='lossless') if os.path.exists(original_data_path) else None
     
-    # Find optimal number of clusters
-    optimal_k = find_optimal_clusters(X)
+    # Figures are collected along the way and rendered in parallel at the end
+    figures = []
     
-    # Perform K-Means clustering
-    kmeans_model, data_with_clusters = perform_kmeans_clustering(X, optimal_k)
-    
-    # Visualize clusters
-    visualize_clusters(data_with_clusters, data_with_clusters, kmeans_model)
+    if args.mode == 'minibatch':
+        # Stream batches straight from the memory-mapped data instead of copying it
+        feature_cols = [col for col in df.columns if col != 'left']
+        optimal_k, centers_by_k = find_optimal_clusters_minibatch(
+            df, feature_cols, max_k=args.max_k, sample_size=args.sample_size, batch_size=args.batch_size,
+            figures=figures
+        )
+        kmeans_model, clusters = perform_minibatch_clustering(
+            df, feature_cols, optimal_k, init=centers_by_k[optimal_k], batch_size=args.batch_size
+        )
+        
+        # The projection and the profiles are streamed too, so no step holds the full matrix;
+        # the scatter plot and the quantiles use a sample of the rows
+        sample_idx = sample_rows(len(df), args.sample_size)
+        visualize_clusters_minibatch(
+            df, feature_cols, clusters, kmeans_model, sample_idx, batch_size=args.batch_size, figures=figures
+        )
+        cluster_profiles = analyze_clusters_minibatch(
+            original_data, clusters, sample_idx, batch_size=args.batch_size, quantiles=args.quantiles, figures=figures
+        )
+    else:
+        # Prepare data for clustering
+        X = prepare_data_for_clustering(df)
+        
+        # Find optimal number of clusters
+        optimal_k = find_optimal_clusters(X, max_k=args.max_k, figures=figures)
+        
+        # Perform K-Means clustering
+        kmeans_model, data_with_clusters = perform_kmeans_clustering(X, optimal_k)
+        
+        # Visualize clusters
+        visualize_clusters(data_with_clusters, data_with_clusters, kmeans_model, figures=figures)
+        
+        # Analyze clusters
+        cluster_profiles = analyze_clusters(data_with_clusters, original_data, quantiles=args.quantiles, figures=figures)
     
-    # Analyze clusters
-    cluster_profiles = analyze_clusters(data_with_clusters, original_data)
+    # Render the elbow, cluster and profile figures together
+    report.render_figures(figures)
     
     print("Clustering analysis completed successfully!")
 
@@ -0,0 +1,437 @@
+import glob
+import io
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+# Each CSV gets a sibling directory of per-column .npy files plus a schema
+CACHE_SUFFIX = '.cols'
+SCHEMA_FILE = 'schema.json'
+# How load_table types numeric columns: as stored (what pandas parses), as the
+# smallest dtypes that hold every value exactly, or with floats also in float32
+DTYPE_MODES = ('stored', 'lossless', 'compact')
+# Bumped when the cache layout changes, so older caches are rebuilt
+CACHE_FORMAT = 2
+# Rows cast at a time when writing a column's lossless and compact copies
+CAST_BLOCK_ROWS = 65536
+# Versions the cache link no longer points to are deleted once they are this
+# old, in case the writer that replaced them died before cleaning up
+STALE_VERSION_SECONDS = 600
+
+
+def cache_dir_for(csv_path):
+    """Return the columnar cache directory that belongs to a CSV file"""
+    return os.path.splitext(csv_path)[0] + CACHE_SUFFIX
+
+
+def _tmp_dir_for(cache_dir):
+    """Build directory private to the calling thread, reused (and so cleared) if a writer died"""
+    return f"{cache_dir}.tmp-{os.getpid()}-{threading.get_native_id()}"
+
+
+def _source_stamp(csv_path):
+    """Size and modification time used to detect a stale cache"""
+    stat = os.stat(csv_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _smallest_code_dtype(n_categories):
+    """Smallest signed integer type that can hold the category codes (and -1 for NaN)"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _compact_dtypes(values):
+    """
+    Lossless and compact dtypes of a numeric column
+
+    Integers (0/1 flags included) get the smallest signed type that fits their
+    range in both. Floats are always float32 when compact, but only stay float32
+    when lossless if every value survives the round trip.
+    """
+    dtype = values.dtype
+    if dtype.kind in 'iu' and len(values):
+        low, high = values.min(), values.max()
+        for candidate in (np.int8, np.int16, np.int32, np.int64):
+            info = np.iinfo(candidate)
+            if info.min <= low and high <= info.max:
+                return np.dtype(candidate).name, np.dtype(candidate).name
+    if dtype.kind == 'f' and dtype.itemsize > 4:
+        exact = np.array_equal(values.astype(np.float32).astype(dtype), values, equal_nan=True)
+        return 'float32' if exact else dtype.name, 'float32'
+    return dtype.name, dtype.name
+
+
+def _save_cast_columns(directory, column, values):
+    """
+    Save a numeric column cast to its lossless and compact dtypes next to it
+
+    The copies are cast block by block (so memory-mapped columns are never read
+    whole) and recorded in the schema under cast_files, so read_columnar can
+    map them like the stored column instead of casting into private memory.
+    """
+    column['cast_files'] = {}
+    for target in sorted({column['lossless_dtype'], column['compact_dtype']} - {column['dtype']}):
+        file_name = f"{os.path.splitext(column['file'])[0]}.{target}.npy"
+        path = os.path.join(directory, file_name)
+        if len(values):
+            cast = np.lib.format.open_memmap(path, mode='w+', dtype=target, shape=values.shape)
+            for start in range(0, len(values), CAST_BLOCK_ROWS):
+                cast[start:start + CAST_BLOCK_ROWS] = values[start:start + CAST_BLOCK_ROWS]
+            cast.flush()
+            del cast
+        else:
+            np.save(path, values.astype(target))
+        column['cast_files'][target] = file_name
+
+
+def write_columnar(df, cache_dir, source=None):
+    """
+    Write a DataFrame as one .npy file per column.
+
+    Numeric and boolean columns are stored as-is, with their lossless and compact
+    dtypes recorded in the schema and copies in those dtypes written next to
+    them; everything else is stored as categorical
+    codes with the categories kept in the schema. The directory is
+    built under a temporary name and published with _publish_cache so readers
+    never see a half-written cache.
+    """
+    tmp_dir = _tmp_dir_for(cache_dir)
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    columns = []
+    for i, name in enumerate(df.columns):
+        series = df[name]
+        file_name = f"{i:04d}.npy"
+        column = {'name': str(name), 'file': file_name}
+
+        if pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+            values = series.to_numpy()
+            column['kind'] = 'numeric'
+        else:
+            categorical = pd.Categorical(series)
+            values = categorical.codes.astype(_smallest_code_dtype(len(categorical.categories)))
+            column['kind'] = 'category'
+            column['categories'] = [str(c) for c in categorical.categories]
+
+        np.save(os.path.join(tmp_dir, file_name), np.ascontiguousarray(values))
+        column['dtype'] = str(values.dtype)
+        if column['kind'] == 'numeric':
+            column['lossless_dtype'], column['compact_dtype'] = _compact_dtypes(values)
+            _save_cast_columns(tmp_dir, column, values)
+        columns.append(column)
+
+    schema = {
+        'format': CACHE_FORMAT,
+        'n_rows': int(len(df)),
+        'columns': columns,
+        'source': _source_stamp(source) if source is not None else None
+    }
+    with open(os.path.join(tmp_dir, SCHEMA_FILE), 'w') as f:
+        json.dump(schema, f)
+    _publish_cache(tmp_dir, cache_dir)
+
+
+def _publish_cache(tmp_dir, cache_dir):
+    """
+    Move a finished cache directory into place
+
+    Directories can't be replaced atomically, so the cache path is a symlink to
+    a uniquely named version directory and only the link is swapped (with
+    os.replace). Readers see the old version or the new one, never neither, and
+    concurrent writers can't delete each other's caches. The replaced version is
+    deleted afterwards; columns already mapped from it stay readable, and a
+    reader that was still opening it gets FileNotFoundError and falls back to
+    the CSV.
+    """
+    version_dir = f"{cache_dir}.v-{uuid.uuid4().hex}"
+    os.rename(tmp_dir, version_dir)
+    link = f"{cache_dir}.link-{uuid.uuid4().hex}"
+    os.symlink(os.path.basename(version_dir), link)
+
+    replaced = None
+    if os.path.islink(cache_dir):
+        try:
+            replaced = os.path.join(os.path.dirname(cache_dir), os.readlink(cache_dir))
+        except FileNotFoundError:
+            pass
+    elif os.path.isdir(cache_dir):
+        # Caches from before versioning are plain directories, which os.replace can't overwrite
+        replaced = f"{cache_dir}.old-{uuid.uuid4().hex}"
+        try:
+            os.rename(cache_dir, replaced)
+        except FileNotFoundError:
+            replaced = None
+    os.replace(link, cache_dir)
+
+    if replaced is not None:
+        shutil.rmtree(replaced, ignore_errors=True)
+    current = os.path.realpath(cache_dir)
+    for stale in glob.glob(glob.escape(cache_dir) + '.v-*'):
+        try:
+            expired = time.time() - os.path.getmtime(stale) > STALE_VERSION_SECONDS
+        except FileNotFoundError:
+            continue
+        if expired and os.path.realpath(stale) != current:
+            shutil.rmtree(stale, ignore_errors=True)
+
+
+def read_columnar(cache_dir, mmap=True, dtypes='stored'):
+    """
+    Load a columnar cache as a DataFrame.
+
+    With ``mmap`` the column arrays are memory-mapped read-only, so pages are only
+    read when touched and every process mapping the same files shares them
+    through the OS page cache. With ``dtypes`` set to 'lossless' or 'compact'
+    numeric columns come in the dtypes recorded in the schema, mapped from the
+    copies written with the cache; only caches without those copies are cast
+    into private memory.
+    """
+    # Resolve the link once so every file comes from the same version
+    cache_dir = os.path.realpath(cache_dir)
+    with open(os.path.join(cache_dir, SCHEMA_FILE)) as f:
+        schema = json.load(f)
+
+    mmap_mode = 'r' if mmap else None
+    data = {}
+    for column in schema['columns']:
+        file_name = column['file']
+        target = None
+        if column['kind'] == 'numeric' and dtypes != 'stored':
+            target = column.get(f'{dtypes}_dtype')
+            file_name = column.get('cast_files', {}).get(target, file_name)
+        values = np.load(os.path.join(cache_dir, file_name), mmap_mode=mmap_mode)
+        if column['kind'] == 'category':
+            values = pd.Categorical.from_codes(values, categories=column['categories'])
+        elif dtypes != 'stored':
+            # Caches written before the dtypes were recorded get them computed here
+            target = target or _compact_dtypes(values)[DTYPE_MODES.index(dtypes) - 1]
+            if target != values.dtype.name:
+                values = values.astype(target)
+        data[column['name']] = values
+
+    # copy=False keeps each column backed by its own mapped file
+    return pd.DataFrame(data, copy=False)
+
+
+def compact_frame(df, dtypes='compact'):
+    """
+    Cast a parsed DataFrame to lossless or compact dtypes
+
+    Numeric columns follow the same rules as the cache schema, and text columns
+    with at most one distinct value per two rows become categoricals.
+    """
+    data = {}
+    for name in df.columns:
+        series = df[name]
+        if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+            target = _compact_dtypes(series.to_numpy())[DTYPE_MODES.index(dtypes) - 1]
+            if target != series.dtype.name:
+                series = series.astype(target)
+        elif pd.api.types.is_object_dtype(series.dtype) and series.nunique() <= len(series) // 2:
+            series = series.astype('category')
+        data[name] = series
+    return pd.DataFrame(data, index=df.index, copy=False)
+
+
+def frame_memory_mb(df):
+    """Memory held by a DataFrame's columns in MB, including the strings of object columns"""
+    return df.memory_usage(index=False, deep=True).sum() / (1024 * 1024)
+
+
+def is_cache_fresh(csv_path, cache_dir=None):
+    """Check that a cache exists and was built from the current version of the CSV"""
+    cache_dir = cache_dir or cache_dir_for(csv_path)
+    schema_path = os.path.join(cache_dir, SCHEMA_FILE)
+    if not os.path.exists(schema_path):
+        return False
+    if not os.path.exists(csv_path):
+        # The cache is all we have, so treat it as authoritative
+        return True
+
+    try:
+        with open(schema_path) as f:
+            schema = json.load(f)
+    except FileNotFoundError:
+        # Replaced by another writer since the check above
+        return False
+    return schema.get('format') == CACHE_FORMAT and schema.get('source') == _source_stamp(csv_path)
+
+
+def build_cache(csv_path, **read_csv_kwargs):
+    """Parse a CSV once and write its columnar cache"""
+    df = pd.read_csv(csv_path, **read_csv_kwargs)
+    write_columnar(df, cache_dir_for(csv_path), source=csv_path)
+    return df
+
+
+def load_table(csv_path, mmap=True, dtypes='stored'):
+    """
+    Load a CSV through its columnar cache.
+
+    The cache is (re)built from the CSV when it is missing or stale. If it can't
+    be written (read-only filesystem, file locked by another process) the parsed
+    CSV is returned instead, as it is when another process replaces the cache
+    while it is being read. ``dtypes`` is one of DTYPE_MODES; with anything but
+    'stored' the memory before and after the cast is printed.
+    """
+    if dtypes not in DTYPE_MODES:
+        raise ValueError(f"Unknown dtypes mode '{dtypes}', expected one of {DTYPE_MODES}")
+    cache_dir = cache_dir_for(csv_path)
+    if not is_cache_fresh(csv_path, cache_dir):
+        df = pd.read_csv(csv_path)
+        try:
+            write_columnar(df, cache_dir, source=csv_path)
+        except OSError as e:
+            print(f"Could not write columnar cache for {csv_path}: {e}")
+            return _parsed_table(csv_path, dtypes, df)
+
+    try:
+        df = read_columnar(cache_dir, mmap=mmap, dtypes=dtypes)
+        if dtypes == 'stored':
+            return df
+        # Mapping the cache again is free; it is only read to size the stored columns
+        return _report_compaction(csv_path, dtypes, read_columnar(cache_dir, mmap=True), df)
+    except FileNotFoundError as e:
+        if not os.path.exists(csv_path):
+            raise
+        print(f"Columnar cache for {csv_path} went away while loading ({e}), reading the CSV")
+        return _parsed_table(csv_path, dtypes, pd.read_csv(csv_path))
+
+
+def _parsed_table(csv_path, dtypes, df):
+    """Return a DataFrame parsed from the CSV, cast like the cache would be"""
+    return df if dtypes == 'stored' else _report_compaction(csv_path, dtypes, df, compact_frame(df, dtypes))
+
+
+def _report_compaction(csv_path, dtypes, before, after):
+    """Print how much memory the cast saved and return the cast frame"""
+    print(f"Loaded {csv_path} with {dtypes} dtypes: {frame_memory_mb(before):.2f}MB -> {frame_memory_mb(after):.2f}MB")
+    return after
+
+
+def save_table(df, csv_path, index=False):
+    """Write a DataFrame to CSV and refresh its columnar cache"""
+    os.makedirs(os.path.dirname(csv_path) or '.', exist_ok=True)
+    df.to_csv(csv_path, index=index)
+    # Re-reading the CSV keeps the cache identical to what a CSV load would return
+    build_cache(csv_path)
+
+
+def append_table(df, csv_path):
+    """Append rows to a CSV (in its existing column order) and refresh its columnar cache"""
+    if not os.path.exists(csv_path):
+        save_table(df, csv_path)
+        return
+    columns = pd.read_csv(csv_path, nrows=0).columns
+    df[columns].to_csv(csv_path, mode='a', header=False, index=False)
+    build_cache(csv_path)
+
+
+class ChunkedTableWriter:
+    """
+    Write a numeric table to CSV and its columnar cache chunk by chunk, in constant memory.
+
+    The CSV is byte-identical to save_table's, and the cache holds exactly what
+    a full parse of that CSV returns: each chunk's CSV text is parsed back (the
+    parser reads every value independently) into preallocated column files. The
+    row count and column dtypes have to be known up front.
+    """
+
+    def __init__(self, csv_path, n_rows, dtypes):
+        self.csv_path = csv_path
+        self.cache_dir = cache_dir_for(csv_path)
+        self.n_rows = n_rows
+        self.dtypes = {name: np.dtype(dtype) for name, dtype in dtypes.items()}
+        self.columns = list(self.dtypes)
+        self.rows_written = 0
+        # Lossless and compact dtypes of each column, widened chunk by chunk
+        self.compact_dtypes = {name: None for name in self.columns}
+
+        os.makedirs(os.path.dirname(csv_path) or '.', exist_ok=True)
+        self.tmp_dir = _tmp_dir_for(self.cache_dir)
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        os.makedirs(self.tmp_dir)
+        self.files = [f"{i:04d}.npy" for i in range(len(self.columns))]
+        self.arrays = [
+            np.lib.format.open_memmap(os.path.join(self.tmp_dir, file_name), mode='w+', dtype=dtype, shape=(n_rows,))
+            if n_rows else np.empty(0, dtype=dtype)
+            for file_name, dtype in zip(self.files, self.dtypes.values())
+        ]
+        # Same line endings as DataFrame.to_csv writing to a path
+        self.csv_file = open(csv_path, 'w', newline='')
+
+    def write(self, df):
+        """Append a chunk (with the columns in the order given to the constructor)"""
+        if list(df.columns) != self.columns:
+            raise ValueError(f"Expected columns {self.columns}, got {list(df.columns)}")
+        first = self.rows_written == 0
+        text = df.to_csv(index=False, header=first)
+        self.csv_file.write(text)
+
+        parsed = pd.read_csv(io.StringIO(text), header=0 if first else None, names=self.columns, dtype=self.dtypes)
+        end = self.rows_written + len(parsed)
+        if end > self.n_rows:
+            raise ValueError(f"More than the expected {self.n_rows} rows were written")
+        for values, name in zip(self.arrays, self.columns):
+            chunk_values = parsed[name].to_numpy()
+            values[self.rows_written:end] = chunk_values
+            if len(chunk_values):
+                # The smallest dtype that fits every chunk is the widest of the per-chunk ones
+                chunk_dtypes = _compact_dtypes(chunk_values)
+                known = self.compact_dtypes[name] or chunk_dtypes
+                self.compact_dtypes[name] = tuple(np.promote_types(a, b).name for a, b in zip(known, chunk_dtypes))
+        self.rows_written = end
+
+    def close(self):
+        """Finish the CSV and move the completed cache into place"""
+        self.csv_file.close()
+        if self.rows_written != self.n_rows:
+            raise ValueError(f"Expected {self.n_rows} rows, {self.rows_written} were written")
+        columns = []
+        for values, name, file_name, dtype in zip(self.arrays, self.columns, self.files, self.dtypes.values()):
+            if isinstance(values, np.memmap):
+                values.flush()
+            else:
+                np.save(os.path.join(self.tmp_dir, file_name), values)
+            lossless, compact = self.compact_dtypes[name] or (dtype.name, dtype.name)
+            column = {
+                'name': name, 'file': file_name, 'kind': 'numeric', 'dtype': str(dtype),
+                'lossless_dtype': lossless, 'compact_dtype': compact
+            }
+            _save_cast_columns(self.tmp_dir, column, values)
+            columns.append(column)
+        self.arrays = []
+
+        schema = {
+            'format': CACHE_FORMAT,
+            'n_rows': int(self.n_rows),
+            'columns': columns,
+            'source': _source_stamp(self.csv_path)
+        }
+        with open(os.path.join(self.tmp_dir, SCHEMA_FILE), 'w') as f:
+            json.dump(schema, f)
+        _publish_cache(self.tmp_dir, self.cache_dir)
+
+
+def row_fingerprints(df, columns):
+    """
+    Vectorized 64-bit hash of each row's values in the given columns.
+
+    Numbers are hashed as float64 and everything else as strings, so the same
+    row hashes the same whether it was parsed from a CSV or read from a cache.
+    """
+    frame = pd.DataFrame({
+        col: df[col].astype(np.float64) if pd.api.types.is_numeric_dtype(df[col].dtype) else df[col].astype(str)
+        for col in columns
+    })
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy()
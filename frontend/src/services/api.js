@@ -19,6 +19,11 @@ export const apiService = {
 
   // Clustering operations
   getClusterProfiles: () => api.get('/cluster-profiles'),
+  assignClusters: (formData) => api.post('/cluster-assign', formData, {
+    headers: {
+      'Content-Type': 'multipart/form-data',
+    },
+  }),
 
   // Images
   getAvailableImages: () => api.get('/available-images'),
@@ -31,6 +36,15 @@ export const apiService = {
     },
   }),
 
+  // Background batch prediction jobs
+  submitPredictionJob: (formData) => api.post('/jobs', formData, {
+    headers: {
+      'Content-Type': 'multipart/form-data',
+    },
+  }),
+  getPredictionJob: (jobId) => api.get(`/jobs/${jobId}`),
+  getPredictionJobResultUrl: (jobId) => `${API_BASE_URL}/jobs/${jobId}/result`,
+
   predictSample: () => {
     const formData = new FormData();
     formData.append('use_sample', 'true');
@@ -1,6 +1,42 @@
+import gc
+import os
+import shutil
+
 # Gunicorn configuration
 workers = 4
 worker_class = 'gthread'
 threads = 2
 timeout = 120
 bind = '0.0.0.0:10000'  # Render's default port for Python apps
+
+# Import app.py (and so load the models and datasets) once in the master and
+# fork the workers from it; the loaded objects are then shared copy-on-write.
+# Set PRELOAD_APP=false to load them separately in every worker instead.
+preload_app = os.environ.get('PRELOAD_APP', 'true').lower() == 'true'
+# Tells app.py to load synchronously in the master (FAST_START only applies without preloading)
+os.environ['GUNICORN_PRELOAD_APP'] = 'true' if preload_app else 'false'
+
+# Workers dump their metrics here for /api/metrics to merge (same default as app.py)
+metrics_dir = os.environ.get('METRICS_DIR', os.path.join('uploads', 'metrics'))
+
+def on_starting(server):
+    # Start every run from zero instead of adding up previous runs' workers
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+
+def child_exit(server, worker):
+    # Fold an exited worker's snapshot into the dead-worker totals, so its
+    # counts are kept once and its replacement starts from zero
+    if metrics_dir:
+        from instrumentation import mark_process_dead
+        try:
+            mark_process_dead(metrics_dir, worker.pid)
+        except OSError as e:
+            server.log.warning("Could not fold the metrics of worker %s: %s", worker.pid, e)
+
+def when_ready(server):
+    # Move everything loaded so far out of the garbage collector's reach so
+    # collections in the workers don't write to (and un-share) those pages
+    if preload_app:
+        gc.freeze()
+        server.log.info("Froze %d preloaded objects before forking workers", gc.get_freeze_count())
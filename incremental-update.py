@@ -0,0 +1,286 @@
+"""
+Incremental refresh of the preprocessed data, clusters and profiles from a new HR snapshot.
+
+Rows are fingerprinted, so only rows that haven't been processed before are
+encoded and scaled with the fitted pipeline. Scaler statistics, KMeans
+centroids and cluster profiles are updated from those rows alone. The full
+pipeline (preprocess.py, train-model.py, cluster-analysis.py) only runs when
+the data has drifted past a threshold, new categories appear, or the tree's
+accuracy on the new rows drops:
+
+    python incremental-update.py --snapshot exports/hr_2025_w14.csv
+"""
+import argparse
+import importlib.util
+import json
+import os
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import preprocess
+import report
+import scoring
+from data_store import append_table, load_table, row_fingerprints
+from model_registry import publish_version
+
+RAW_DATA_PATH = 'data/WA_Fn-UseC_-HR-Employee-Attrition.csv'
+PREPROCESSED_PATH = 'data/preprocessed_hr_data.csv'
+CLUSTERED_PATH = 'data/clustered_hr_data.csv'
+PCA_RESULTS_PATH = 'data/pca_hr_results.csv'
+STATISTICS_PATH = 'data/cluster_statistics.csv'
+PIPELINE_PATH = 'models/preprocessing_pipeline.pkl'
+MODEL_PATH = 'models/decision_tree_model.pkl'
+KMEANS_PATH = 'models/kmeans_model.pkl'
+PCA_PATH = 'models/pca_model.pkl'
+METRICS_PATH = 'models/model_metrics.csv'
+# Sorted fingerprints of every processed raw row, and the running statistics next to them
+FINGERPRINTS_PATH = 'data/processed_fingerprints.npy'
+STATE_PATH = 'models/incremental_state.json'
+
+# Fewer new labeled rows than this are too noisy to judge the tree's accuracy on
+MIN_EVALUATION_ROWS = 100
+
+
+def load_script(name, filename):
+    """Import one of the pipeline scripts (their file names aren't valid module names)"""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(os.path.dirname(os.path.abspath(__file__)), filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_state():
+    """Load the incremental state, or None if the pipeline has never been run through this script"""
+    if not (os.path.exists(STATE_PATH) and os.path.exists(FINGERPRINTS_PATH)):
+        return None
+    with open(STATE_PATH) as f:
+        state = json.load(f)
+    statistics = state['scaler_statistics']
+    statistics['mean'] = np.asarray(statistics['mean'], dtype=np.float64)
+    statistics['comoment'] = np.asarray(statistics['comoment'], dtype=np.float64)
+    state['fingerprints'] = np.load(FINGERPRINTS_PATH)
+    return state
+
+
+def save_state(state):
+    """Write the fingerprints and the JSON state"""
+    np.save(FINGERPRINTS_PATH, state['fingerprints'])
+    serializable = {key: value for key, value in state.items() if key != 'fingerprints'}
+    statistics = dict(state['scaler_statistics'])
+    statistics['mean'] = statistics['mean'].tolist()
+    statistics['comoment'] = statistics['comoment'].tolist()
+    serializable['scaler_statistics'] = statistics
+    serializable['updated_at'] = datetime.now(timezone.utc).isoformat()
+    with open(STATE_PATH, 'w') as f:
+        json.dump(serializable, f, indent=2)
+
+
+def find_new_rows(snapshot, fingerprint_columns, seen):
+    """
+    Return the rows of a snapshot that haven't been processed, and their fingerprints
+
+    The dataset contains identical rows, so fingerprints are matched by count:
+    the third copy of a row is new if only two copies have been processed.
+    """
+    fingerprints = row_fingerprints(snapshot, fingerprint_columns)
+    seen_counts = np.searchsorted(seen, fingerprints, 'right') - np.searchsorted(seen, fingerprints, 'left')
+    occurrence = pd.Series(fingerprints).groupby(fingerprints).cumcount().to_numpy()
+    is_new = occurrence >= seen_counts
+    return snapshot[is_new], fingerprints[is_new]
+
+
+def scaled_statistics(rows, pipeline):
+    """Moment statistics of the raw values of the columns the pipeline scales"""
+    return report.moment_statistics(rows[pipeline['scaled_columns']].to_numpy(dtype=np.float64))
+
+
+def encode_rows(rows, pipeline, target_col='left'):
+    """
+    Encode and scale raw rows exactly as the API scores them, in the preprocessed data's column types
+
+    Raises a ValueError for missing columns or categories the encoders have never seen.
+    """
+    features = scoring.transform_raw_data(rows, scoring.compile_preprocessing_pipeline(pipeline))
+    # Label-encoded columns are integers in the preprocessed CSV
+    processed = features.astype({col: np.int64 for col in pipeline['categorical_columns']})
+    if target_col in rows.columns:
+        processed[target_col] = rows[target_col].to_numpy()
+    return processed
+
+
+def feature_drift(statistics, pipeline):
+    """
+    Largest shift of a scaled feature's mean or standard deviation since the scaler was fitted
+
+    Both are measured in units of the fitted standard deviation, so 0.1 means a
+    feature moved by a tenth of its spread.
+    """
+    std = np.sqrt(np.diag(statistics['comoment']) / statistics['count'])
+    mean_shift = np.abs(statistics['mean'] - pipeline['mean']) / pipeline['scale']
+    std_shift = np.abs(std / pipeline['scale'] - 1.0)
+    return float(max(mean_shift.max(), std_shift.max()))
+
+
+def baseline_accuracy():
+    """Test accuracy recorded by the last full training run"""
+    if not os.path.exists(METRICS_PATH):
+        return None
+    return float(pd.read_csv(METRICS_PATH)['accuracy'].iloc[0])
+
+
+def update_centroids(centers, counts, X, labels):
+    """Move each centroid to the mean of the rows it already had and the rows newly assigned to it"""
+    n_clusters = len(centers)
+    new_counts = np.bincount(labels, minlength=n_clusters).astype(np.float64)
+    sums = pd.DataFrame(X).groupby(labels).sum().reindex(range(n_clusters), fill_value=0.0).to_numpy()
+    total = counts + new_counts
+    updated = (centers * counts[:, np.newaxis] + sums) / np.maximum(total, 1.0)[:, np.newaxis]
+    return np.where(total[:, np.newaxis] > 0, updated, centers)
+
+
+def apply_incremental_update(new_rows, processed, cluster_analysis):
+    """Append the new rows and fold them into the clusters and profiles without refitting"""
+    append_table(processed, PREPROCESSED_PATH)
+    features = processed.drop(columns=['left'], errors='ignore')
+
+    kmeans = joblib.load(KMEANS_PATH)
+    clusters = kmeans.predict(features)
+    statistics = pd.read_csv(STATISTICS_PATH, index_col='Cluster')
+    counts = statistics['Size'].reindex(range(kmeans.n_clusters), fill_value=0).to_numpy(dtype=np.float64)
+    kmeans.cluster_centers_ = update_centroids(
+        kmeans.cluster_centers_, counts, features.to_numpy(dtype=np.float64), clusters
+    )
+    joblib.dump(kmeans, KMEANS_PATH)
+
+    clustered = features.copy()
+    clustered['Cluster'] = clusters
+    clustered.to_csv(CLUSTERED_PATH, mode='a', header=False, index=False)
+
+    pca_df = pd.DataFrame(joblib.load(PCA_PATH).transform(features), columns=['PC1', 'PC2'])
+    pca_df['Cluster'] = clusters
+    pca_df.to_csv(PCA_RESULTS_PATH, mode='a', header=False, index=False)
+
+    cluster_analysis.update_cluster_profiles(new_rows, clusters, statistics_path=STATISTICS_PATH)
+    print(f"Assigned {len(clusters)} new rows to clusters {np.bincount(clusters, minlength=kmeans.n_clusters).tolist()}")
+
+
+def run_full_refit(args, train_model, cluster_analysis):
+    """Rerun the whole pipeline on the raw data and rebuild the incremental state"""
+    preprocess.main([])
+    train_model.main(['--search', args.search])
+    cluster_analysis.main([])
+
+    raw_data = load_table(RAW_DATA_PATH)
+    pipeline = joblib.load(PIPELINE_PATH)
+    fingerprint_columns = list(raw_data.columns)
+    return {
+        'fingerprint_columns': fingerprint_columns,
+        'fingerprints': np.sort(row_fingerprints(raw_data, fingerprint_columns)),
+        'scaler_statistics': scaled_statistics(raw_data, pipeline),
+        'last_full_refit': datetime.now(timezone.utc).isoformat(),
+        'rows_since_refit': 0
+    }
+
+
+def refit_reason(state, new_rows, args):
+    """
+    Check whether the new rows can be folded in incrementally
+
+    Returns the reason a full refit is needed (or None), the processed rows and
+    the updated scaler statistics.
+    """
+    if args.full:
+        return 'full refit requested', None, None
+    if state is None:
+        return 'no incremental state yet', None, None
+
+    pipeline = joblib.load(PIPELINE_PATH)
+    try:
+        processed = encode_rows(new_rows, pipeline)
+    except ValueError as e:
+        return f'new rows cannot be encoded: {e}', None, None
+
+    statistics = report.merge_moment_statistics(state['scaler_statistics'], scaled_statistics(new_rows, pipeline))
+    drift = feature_drift(statistics, pipeline)
+    print(f"Feature drift since the last refit: {drift:.4f} (threshold {args.drift_threshold})")
+    if drift > args.drift_threshold:
+        return f'feature drift {drift:.4f} exceeds {args.drift_threshold}', None, None
+
+    baseline = baseline_accuracy()
+    if baseline is not None and 'left' in processed.columns and len(processed) >= MIN_EVALUATION_ROWS:
+        model = joblib.load(MODEL_PATH)
+        accuracy = float((model.predict(processed.drop(columns=['left'])) == processed['left'].to_numpy()).mean())
+        print(f"Tree accuracy on the new rows: {accuracy:.4f} (baseline {baseline:.4f})")
+        if baseline - accuracy > args.max_accuracy_drop:
+            return f'accuracy dropped from {baseline:.4f} to {accuracy:.4f}', None, None
+
+    return None, processed, statistics
+
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Fold a new HR snapshot into the pipeline, refitting only on drift')
+    parser.add_argument('--snapshot', default=RAW_DATA_PATH,
+                        help='Cumulative HR export to process (default: the raw dataset, e.g. after appending to it)')
+    parser.add_argument('--drift-threshold', type=float, default=0.1,
+                        help='Largest mean/std shift of a scaled feature, in fitted standard deviations, '
+                             'tolerated before refitting (default: 0.1)')
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.02,
+                        help='Largest drop of the tree accuracy on new labeled rows tolerated before refitting')
+    parser.add_argument('--full', action='store_true', help='Always run the full pipeline')
+    parser.add_argument('--search', choices=['grid', 'halving'], default='grid',
+                        help='Hyperparameter search used when the tree is refitted')
+    parser.add_argument('--no-publish', action='store_true',
+                        help="Don't publish the updated models to the registry the API serves from")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    train_model = load_script('train_model', 'train-model.py')
+    cluster_analysis = load_script('cluster_analysis', 'cluster-analysis.py')
+
+    state = load_state()
+    if os.path.abspath(args.snapshot) == os.path.abspath(RAW_DATA_PATH):
+        snapshot = load_table(RAW_DATA_PATH)
+    else:
+        snapshot = pd.read_csv(args.snapshot)
+
+    fingerprint_columns = state['fingerprint_columns'] if state else list(snapshot.columns)
+    seen = state['fingerprints'] if state else np.empty(0, dtype=np.uint64)
+    new_rows, new_fingerprints = find_new_rows(snapshot, fingerprint_columns, seen)
+    print(f"Snapshot has {len(snapshot)} rows, {len(new_rows)} of them new")
+    if len(new_rows) == 0 and not args.full:
+        print("Nothing to update")
+        return
+
+    if os.path.abspath(args.snapshot) != os.path.abspath(RAW_DATA_PATH) and len(new_rows):
+        # Keep the raw dataset complete so full refits and the API see every row
+        append_table(new_rows, RAW_DATA_PATH)
+
+    reason, processed, statistics = refit_reason(state, new_rows, args)
+    if reason is not None:
+        print(f"Running the full pipeline: {reason}")
+        state = run_full_refit(args, train_model, cluster_analysis)
+        note = f"full refit: {reason}"
+    else:
+        apply_incremental_update(new_rows, processed, cluster_analysis)
+        state['fingerprints'] = np.sort(np.concatenate([seen, new_fingerprints]))
+        state['scaler_statistics'] = statistics
+        state['rows_since_refit'] += len(new_rows)
+        note = f"incremental: {len(new_rows)} new rows"
+        print(f"Folded {len(new_rows)} rows in without refitting "
+              f"({state['rows_since_refit']} since the last full refit)")
+
+    save_state(state)
+    if not args.no_publish:
+        # Running API workers pick the new version up without a restart
+        publish_version(note=note)
+    print("Incremental update completed successfully!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+# sklearn marks leaves with -1 in children_left / children_right
+TREE_LEAF = -1
+
+
+class CompiledTree:
+    """
+    Flat NumPy node table compiled from a fitted DecisionTreeClassifier.
+
+    Labels and probabilities come out of a single vectorized traversal and
+    match ``predict`` / ``predict_proba`` of the source model exactly.
+
+    Explanations are precomputed per node: the change in class probability at
+    every split on the way to a node is credited to the split's feature
+    (Saabas' method), and each leaf's decision path is stored as text, so
+    explaining a batch is just the traversal plus two gathers. ``preprocessing``
+    (the fitted pipeline dict written by preprocess.py) lets the paths show
+    thresholds in the original units instead of scaled or label-encoded ones.
+    """
+
+    def __init__(self, model, preprocessing=None):
+        tree = model.tree_
+        node_ids = np.arange(tree.node_count, dtype=np.intp)
+        is_leaf = tree.children_left == TREE_LEAF
+
+        self.classes = np.asarray(model.classes_)
+        self.n_features = int(model.n_features_in_)
+        self.feature_names = list(getattr(model, 'feature_names_in_', []))
+        self.max_depth = int(tree.max_depth)
+        self.node_count = int(tree.node_count)
+
+        # Leaves point back at themselves so every row can be walked for a
+        # fixed number of steps without tracking which rows are finished
+        self.feature = np.where(is_leaf, 0, tree.feature).astype(np.intp)
+        self.threshold = np.ascontiguousarray(tree.threshold, dtype=np.float64)
+        left = np.where(is_leaf, node_ids, tree.children_left)
+        right = np.where(is_leaf, node_ids, tree.children_right)
+        # children[2 * node + goes_right] is the next node for a row
+        self.children = np.stack([left, right], axis=1).ravel().astype(np.intp)
+        missing_go_to_left = getattr(tree, 'missing_go_to_left', None)
+        if missing_go_to_left is None:
+            missing_go_to_left = np.zeros(tree.node_count, dtype=bool)
+        self.missing_go_to_left = np.asarray(missing_go_to_left, dtype=bool)
+
+        # Same label and normalisation rules as DecisionTreeClassifier
+        value = np.asarray(tree.value[:, 0, :len(self.classes)], dtype=np.float64)
+        self.label = self.classes.take(np.argmax(value, axis=1))
+        normalizer = value.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        self.proba = np.ascontiguousarray(value / normalizer)
+
+        self._compile_explanations(tree, preprocessing)
+
+    def _compile_explanations(self, tree, preprocessing):
+        """Per-node feature contributions and decision path text, filled in one tree level at a time"""
+        n_classes = self.proba.shape[1]
+        names = self.feature_names or [f'feature_{j}' for j in range(self.n_features)]
+        # Probability every prediction starts from (the class distribution at the root)
+        self.bias = self.proba[0].copy()
+        self.contributions = np.zeros((self.node_count, self.n_features, n_classes), dtype=np.float64)
+        conditions = np.empty(self.node_count, dtype=object)
+        # Node ids below the root on the way to each node
+        path_nodes = np.full((self.node_count, max(self.max_depth, 1)), -1, dtype=np.intp)
+        depth = np.zeros(self.node_count, dtype=np.intp)
+
+        parents = np.array([0] if tree.children_left[0] != TREE_LEAF else [], dtype=np.intp)
+        level = 0
+        while parents.size:
+            children = []
+            features = tree.feature[parents]
+            for goes_right, child_ids in ((False, tree.children_left[parents]), (True, tree.children_right[parents])):
+                self.contributions[child_ids] = self.contributions[parents]
+                self.contributions[child_ids, features] += self.proba[child_ids] - self.proba[parents]
+                path_nodes[child_ids] = path_nodes[parents]
+                path_nodes[child_ids, level] = child_ids
+                depth[child_ids] = level + 1
+                for child, feature, threshold in zip(child_ids, features, tree.threshold[parents]):
+                    conditions[child] = _describe_split(names[feature], threshold, goes_right, preprocessing)
+                children.append(child_ids)
+            frontier = np.concatenate(children)
+            parents = frontier[tree.children_left[frontier] != TREE_LEAF]
+            level += 1
+
+        # Only leaves are ever reached, so only their paths are joined into text
+        self.paths = np.empty(self.node_count, dtype=object)
+        for node in np.flatnonzero(tree.children_left == TREE_LEAF):
+            self.paths[node] = ' AND '.join(conditions[path_nodes[node, :depth[node]]])
+
+    def _validate(self, X):
+        """Convert input to the float32 matrix sklearn evaluates trees on"""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(
+                f"Expected {self.n_features} features, got array with shape {X.shape}"
+            )
+        if np.isinf(X).any():
+            raise ValueError("Input contains infinity or a value too large for dtype('float32')")
+        return X
+
+    def apply(self, X):
+        """Return the leaf index reached by each row"""
+        X = self._validate(X)
+        n_rows = X.shape[0]
+        # Feature-major copy so each step gathers from one contiguous column
+        columns = np.ascontiguousarray(X.T).ravel()
+        rows = np.arange(n_rows, dtype=np.intp)
+        nodes = np.zeros(n_rows, dtype=np.intp)
+        has_missing = np.isnan(columns).any()
+
+        for _ in range(self.max_depth):
+            values = columns.take(self.feature.take(nodes) * n_rows + rows)
+            goes_right = values > self.threshold.take(nodes)
+            if has_missing:
+                goes_right |= np.isnan(values) & ~self.missing_go_to_left.take(nodes)
+            nodes = self.children.take(2 * nodes + goes_right)
+
+        return nodes
+
+    def predict_with_proba(self, X):
+        """Return class labels and class probabilities from one traversal"""
+        leaves = self.apply(X)
+        return self.label[leaves], self.proba[leaves]
+
+    def predict(self, X):
+        """Return class labels"""
+        return self.label[self.apply(X)]
+
+    def predict_proba(self, X):
+        """Return class probabilities"""
+        return self.proba[self.apply(X)]
+
+    def explain(self, X):
+        """
+        Return labels, probabilities, contributions and decision paths from one traversal
+
+        contributions has shape (rows, features, classes); for every row and
+        class, ``bias`` plus the row's contributions sums to its probability.
+        """
+        leaves = self.apply(X)
+        return self.label[leaves], self.proba[leaves], self.contributions[leaves], self.paths[leaves]
+
+
+def _describe_split(name, threshold, goes_right, preprocessing=None):
+    """Readable condition for one branch of a split, in the original units when the pipeline is known"""
+    if preprocessing is not None and name in preprocessing['categorical_columns']:
+        # Label-encoded codes below the threshold go left
+        categories = np.asarray(preprocessing['categorical_columns'][name])
+        codes = np.arange(len(categories))
+        chosen = categories[codes > threshold] if goes_right else categories[codes <= threshold]
+        return f"{name} in {{{', '.join(map(str, chosen))}}}"
+    if preprocessing is not None and name in preprocessing['scaled_columns']:
+        position = list(preprocessing['scaled_columns']).index(name)
+        threshold = threshold * preprocessing['scale'][position] + preprocessing['mean'][position]
+    return f"{name} {'>' if goes_right else '<='} {threshold:.4g}"
+
+
+class CompiledClusterModel:
+    """
+    Nearest-centroid assignment and 2D PCA projection from a fitted KMeans and PCA.
+
+    Centroids, their squared norms and the PCA components are stored as
+    contiguous float64 arrays so a whole batch is handled by two matrix products.
+    """
+
+    def __init__(self, kmeans, pca):
+        self.centers = np.ascontiguousarray(kmeans.cluster_centers_, dtype=np.float64)
+        self.centers_t = np.ascontiguousarray(self.centers.T)
+        self.center_norms = np.einsum('ij,ij->i', self.centers, self.centers)
+        self.n_clusters = self.centers.shape[0]
+        self.n_features = self.centers.shape[1]
+
+        self.pca_mean = np.ascontiguousarray(pca.mean_, dtype=np.float64)
+        components = np.asarray(pca.components_, dtype=np.float64)
+        if getattr(pca, 'whiten', False):
+            components = components / np.sqrt(pca.explained_variance_)[:, np.newaxis]
+        self.components_t = np.ascontiguousarray(components.T)
+        # Centroids in PCA space, for plotting next to the projected rows
+        self.centers_projected = self.project(self.centers)
+
+    def _validate(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(
+                f"Expected {self.n_features} features, got array with shape {X.shape}"
+            )
+        return X
+
+    def assign(self, X):
+        """Return the nearest cluster of each row and the distance to its centroid"""
+        X = self._validate(X)
+        # ||x - c||^2 = ||x||^2 - 2 x.c + ||c||^2, and ||x||^2 doesn't change the argmin
+        partial = self.center_norms - 2.0 * (X @ self.centers_t)
+        labels = np.argmin(partial, axis=1)
+        row_norms = np.einsum('ij,ij->i', X, X)
+        squared = partial[np.arange(X.shape[0]), labels] + row_norms
+        return labels, np.sqrt(np.maximum(squared, 0.0))
+
+    def project(self, X):
+        """Return the PCA coordinates of each row"""
+        X = self._validate(X)
+        return (X - self.pca_mean) @ self.components_t
+
+
+class ModelEnsemble:
+    """
+    Several classifiers scored over one shared, aligned feature matrix.
+
+    Every model's feature order is checked once, when the ensemble is built, so
+    a batch is validated and converted to float32 a single time and each model
+    only runs its own predict_proba. Models fitted on named columns get that
+    matrix wrapped (without a copy) in one DataFrame shared by all of them. Given an executor the models run
+    concurrently (tree prediction releases the GIL), so a batch costs about as
+    much as its slowest model rather than the sum of all of them.
+    """
+
+    def __init__(self, models, feature_names):
+        self.feature_names = list(feature_names)
+        self.n_features = len(self.feature_names)
+        self.models = {}
+        self.classes = None
+        for name, model in models.items():
+            expected = list(getattr(model, 'feature_names', None) or getattr(model, 'feature_names_in_', []))
+            if expected and expected != self.feature_names:
+                raise ValueError(f"Model '{name}' expects features {expected}, not {self.feature_names}")
+            classes = np.asarray(model.classes if hasattr(model, 'classes') else model.classes_)
+            if self.classes is None:
+                self.classes = classes
+            elif not np.array_equal(classes, self.classes):
+                raise ValueError(f"Model '{name}' predicts classes {classes.tolist()}, not {self.classes.tolist()}")
+            self.models[name] = model
+        self.names = list(self.models)
+        self.named_input = {name for name, model in self.models.items() if hasattr(model, 'feature_names_in_')}
+
+    def _validate(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(
+                f"Expected {self.n_features} features, got array with shape {X.shape}"
+            )
+        return X
+
+    def _score_one(self, name, X):
+        start = time.perf_counter()
+        probabilities = self.models[name].predict_proba(X)
+        return probabilities, time.perf_counter() - start
+
+    def score(self, X, names=None, executor=None):
+        """Return each model's class probabilities and its scoring time in seconds"""
+        names = list(names or self.names)
+        unknown = set(names) - set(self.models)
+        if unknown:
+            raise ValueError(f"Unknown models: {sorted(unknown)}. Available: {self.names}")
+        X = self._validate(X)
+        inputs = [X] * len(names)
+        if self.named_input.intersection(names):
+            frame = pd.DataFrame(X, columns=self.feature_names, copy=False)
+            inputs = [frame if name in self.named_input else X for name in names]
+        if executor is not None and len(names) > 1:
+            results = list(executor.map(self._score_one, names, inputs))
+        else:
+            results = [self._score_one(name, X) for name, X in zip(names, inputs)]
+        probabilities = {name: result[0] for name, result in zip(names, results)}
+        seconds = {name: result[1] for name, result in zip(names, results)}
+        return probabilities, seconds
@@ -0,0 +1,210 @@
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Totals of exited processes, folded together by mark_process_dead
+DEAD_SNAPSHOT = 'dead.json'
+
+# Latency buckets in seconds, from sub-millisecond stages to multi-minute uploads
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class MetricsRegistry:
+    """
+    Thread-safe counters and histograms for one process.
+
+    Snapshots are plain JSON so every gunicorn worker can dump its own to a
+    shared directory and any worker can merge them when /api/metrics is scraped.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.definitions = {}
+        self.series = {}
+
+    def counter(self, name, description):
+        """Declare a counter"""
+        self.definitions[name] = {'type': 'counter', 'help': description}
+
+    def histogram(self, name, description, buckets=DEFAULT_BUCKETS):
+        """Declare a histogram"""
+        self.definitions[name] = {'type': 'histogram', 'help': description, 'buckets': list(buckets)}
+
+    @staticmethod
+    def _key(labels):
+        return tuple(sorted((str(k), str(v)) for k, v in labels.items()))
+
+    def inc(self, name, labels, amount=1):
+        """Add to a counter"""
+        key = (name, self._key(labels))
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        """Record one observation in a histogram"""
+        buckets = self.definitions[name]['buckets']
+        key = (name, self._key(labels))
+        with self.lock:
+            entry = self.series.get(key)
+            if entry is None:
+                entry = self.series[key] = {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    entry['buckets'][i] += 1
+            entry['sum'] += value
+            entry['count'] += 1
+
+    def snapshot(self):
+        """Return the current values as a JSON-serializable dict"""
+        with self.lock:
+            series = [
+                {'name': name, 'labels': dict(labels), 'value': json.loads(json.dumps(value))}
+                for (name, labels), value in self.series.items()
+            ]
+        return {'definitions': self.definitions, 'series': series}
+
+    def dump(self, path):
+        """Write a snapshot atomically"""
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+
+def merge_snapshots(snapshots):
+    """Sum counters and histogram buckets of several process snapshots"""
+    definitions = {}
+    merged = {}
+    for snapshot in snapshots:
+        definitions.update(snapshot['definitions'])
+        for item in snapshot['series']:
+            key = (item['name'], MetricsRegistry._key(item['labels']))
+            value = item['value']
+            if key not in merged:
+                merged[key] = json.loads(json.dumps(value))
+            elif isinstance(value, dict):
+                current = merged[key]
+                current['buckets'] = [a + b for a, b in zip(current['buckets'], value['buckets'])]
+                current['sum'] += value['sum']
+                current['count'] += value['count']
+            else:
+                merged[key] += value
+    return definitions, merged
+
+
+def mark_process_dead(directory, pid):
+    """
+    Fold an exited process's snapshot into the directory's dead-process totals
+
+    Counters keep everything the process recorded, and its own file is removed,
+    so a restarted worker (or a new one given the same pid) is not counted twice.
+    """
+    path = os.path.join(directory, f"{pid}.json")
+    dead_path = os.path.join(directory, DEAD_SNAPSHOT)
+    if not os.path.exists(path):
+        return
+    definitions, merged = merge_snapshots(load_snapshots_from([dead_path, path]))
+    series = [{'name': name, 'labels': dict(labels), 'value': value} for (name, labels), value in merged.items()]
+    tmp_path = f"{dead_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'definitions': definitions, 'series': series}, f)
+    os.replace(tmp_path, dead_path)
+    os.remove(path)
+
+
+def load_snapshots(directory):
+    """Read every process snapshot in a directory (and the dead-process totals), skipping unreadable ones"""
+    return load_snapshots_from(glob.glob(os.path.join(directory, '*.json')))
+
+
+def load_snapshots_from(paths):
+    """Read the given snapshot files, skipping missing or unreadable ones"""
+    snapshots = []
+    for path in paths:
+        try:
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + (list(extra.items()) if extra else [])
+    if not items:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in items)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + '}'
+
+
+def render_prometheus(definitions, series):
+    """Render merged metrics in the Prometheus text exposition format"""
+    lines = []
+    for name in sorted(definitions):
+        definition = definitions[name]
+        lines.append(f"# HELP {name} {definition['help']}")
+        lines.append(f"# TYPE {name} {definition['type']}")
+        for (series_name, labels), value in sorted(series.items()):
+            if series_name != name:
+                continue
+            if definition['type'] == 'histogram':
+                for bound, count in zip(definition['buckets'], value['buckets']):
+                    lines.append(f"{name}_bucket{_format_labels(labels, {'le': bound})} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels, {'le': '+Inf'})} {value['count']}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {value['sum']}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value['count']}")
+            else:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+    return '\n'.join(lines) + '\n'
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of one thread at a fixed interval from a background thread.
+
+    The aggregated stacks are written in the folded format understood by
+    flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                module = frame.f_globals.get('__name__') or os.path.basename(frame.f_code.co_filename)
+                stack.append(f"{module}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def write(self, path):
+        """Write the collected samples as folded stacks"""
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def profile_filename(directory, label):
+    """Unique profile file name for one request"""
+    timestamp = time.strftime('%Y%m%d-%H%M%S')
+    return os.path.join(directory, f"{label}-{timestamp}-{os.getpid()}-{threading.get_ident()}.folded")
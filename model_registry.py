@@ -0,0 +1,220 @@
+"""
+Versioned model registry.
+
+Every published version is a directory of model artifacts under models/registry/,
+and manifest.json names the version the API should serve:
+
+    python model_registry.py publish             # snapshot models/*.pkl as a new active version
+    python model_registry.py activate <version>  # roll forward or back
+    python model_registry.py list
+"""
+import argparse
+import errno
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime, timezone
+
+REGISTRY_DIR = os.path.join('models', 'registry')
+MANIFEST_FILE = 'manifest.json'
+# Artifacts that make up one version; preprocessing, the challenger models and
+# their comparison with the tree are optional
+MODEL_FILES = {
+    'decision_tree': 'decision_tree_model.pkl',
+    'kmeans': 'kmeans_model.pkl',
+    'pca': 'pca_model.pkl',
+    'preprocessing': 'preprocessing_pipeline.pkl',
+    'random_forest': 'random_forest_model.pkl',
+    'gradient_boosting': 'gradient_boosting_model.pkl',
+    'comparison': 'model_comparison.csv'
+}
+OPTIONAL_MODELS = {'preprocessing', 'random_forest', 'gradient_boosting', 'comparison'}
+METRICS_FILE = 'model_metrics.csv'
+
+
+def file_sha256(path):
+    """SHA-256 of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_manifest(registry_dir=REGISTRY_DIR):
+    """Return the registry manifest, or None if nothing has been published"""
+    try:
+        with open(os.path.join(registry_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_manifest(manifest, registry_dir=REGISTRY_DIR):
+    """Replace the manifest atomically, so readers see either the old or the new one"""
+    path = os.path.join(registry_dir, MANIFEST_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def active_version(registry_dir=REGISTRY_DIR):
+    """Name of the version the manifest marks active, or None"""
+    manifest = read_manifest(registry_dir)
+    return manifest.get('active') if manifest else None
+
+
+def resolve_artifacts(registry_dir=REGISTRY_DIR, fallback_dir='models', verify=True):
+    """
+    Return the active version and the paths of its artifacts
+
+    Without a manifest the unversioned files in fallback_dir are used, under a
+    version named after a hash of their contents (so retrained files never
+    share a version, or prediction cache entries, with the old ones). With
+    ``verify`` every registry artifact is checked against its recorded hash, so
+    a half-copied or overwritten file is never loaded.
+    """
+    manifest = read_manifest(registry_dir)
+    if manifest is None:
+        paths = {name: os.path.join(fallback_dir, file) for name, file in MODEL_FILES.items()}
+        digests = ''.join(file_sha256(path) for path in paths.values() if os.path.exists(path))
+        return f"unversioned-{hashlib.sha256(digests.encode()).hexdigest()[:8]}", paths
+
+    version = manifest['active']
+    entry = next((v for v in manifest['versions'] if v['version'] == version), None)
+    if entry is None:
+        raise ValueError(f"Active model version {version} is not in the manifest")
+
+    version_dir = os.path.join(registry_dir, version)
+    paths = {}
+    for name, info in entry['files'].items():
+        path = os.path.join(version_dir, info['file'])
+        if verify and file_sha256(path) != info['sha256']:
+            raise ValueError(f"Checksum mismatch for {path}")
+        paths[name] = path
+    for name, file in MODEL_FILES.items():
+        # Optional artifacts missing from a version resolve to a path that doesn't exist
+        paths.setdefault(name, os.path.join(version_dir, file))
+    return version, paths
+
+
+def publish_version(source_dir='models', registry_dir=REGISTRY_DIR, activate=True, note=None):
+    """
+    Copy the current model artifacts into a new registry version
+
+    The version directory is written under a temporary name and renamed into
+    place before the manifest is updated, so a watching API never sees a
+    partial version. Versions are named by publish time (to the second) and
+    content; a name that is already taken gets a -2, -3, ... suffix.
+    """
+    files = {}
+    for name, file in MODEL_FILES.items():
+        path = os.path.join(source_dir, file)
+        if not os.path.exists(path):
+            if name in OPTIONAL_MODELS:
+                continue
+            raise FileNotFoundError(f"Missing model artifact: {path}")
+        files[name] = {'file': file, 'sha256': file_sha256(path)}
+
+    content_hash = hashlib.sha256(''.join(info['sha256'] for info in files.values()).encode()).hexdigest()
+    base_version = f"{time.strftime('%Y%m%d-%H%M%S')}-{content_hash[:8]}"
+    tmp_dir = os.path.join(registry_dir, f"{base_version}.tmp-{uuid.uuid4().hex}")
+    os.makedirs(tmp_dir)
+    for info in files.values():
+        shutil.copy2(os.path.join(source_dir, info['file']), os.path.join(tmp_dir, info['file']))
+    version = _rename_to_free_version(tmp_dir, registry_dir, base_version)
+
+    entry = {
+        'version': version,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'files': files
+    }
+    metrics_path = os.path.join(source_dir, METRICS_FILE)
+    if os.path.exists(metrics_path):
+        # Imported here so the API can read manifests without loading pandas
+        import pandas as pd
+        entry['metrics'] = pd.read_csv(metrics_path).iloc[0].to_dict()
+    if note:
+        entry['note'] = note
+
+    manifest = read_manifest(registry_dir) or {'active': None, 'versions': []}
+    manifest['versions'].append(entry)
+    if activate:
+        manifest['active'] = version
+    write_manifest(manifest, registry_dir)
+    print(f"Published model version {version}{' (active)' if activate else ''}")
+    return version
+
+
+def _rename_to_free_version(tmp_dir, registry_dir, base_version):
+    """
+    Rename a finished version directory to the first unused version name
+
+    Publishing the same artifacts twice within a second gives the same base
+    name. The rename itself claims a name (it fails if another publish got
+    there first), and names still listed in the manifest are skipped even if
+    their directory was removed.
+    """
+    published = {v['version'] for v in (read_manifest(registry_dir) or {}).get('versions', [])}
+    for attempt in itertools.count(1):
+        version = base_version if attempt == 1 else f"{base_version}-{attempt}"
+        if version in published:
+            continue
+        try:
+            os.rename(tmp_dir, os.path.join(registry_dir, version))
+            return version
+        except OSError as e:
+            if e.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+                raise
+
+
+def activate_version(version, registry_dir=REGISTRY_DIR):
+    """Point the manifest at an already published version"""
+    manifest = read_manifest(registry_dir)
+    if manifest is None or not any(v['version'] == version for v in manifest['versions']):
+        raise ValueError(f"Unknown model version: {version}")
+    manifest['active'] = version
+    write_manifest(manifest, registry_dir)
+    print(f"Activated model version {version}")
+
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Publish and activate versions of the served models')
+    parser.add_argument('--registry', default=REGISTRY_DIR, help='Registry directory')
+    commands = parser.add_subparsers(dest='command', required=True)
+    publish = commands.add_parser('publish', help='Copy the current models/ artifacts into a new version')
+    publish.add_argument('--source', default='models', help='Directory with the trained artifacts')
+    publish.add_argument('--no-activate', action='store_true', help="Publish without serving it yet")
+    publish.add_argument('--note', help='Free-text description stored in the manifest')
+    activate = commands.add_parser('activate', help='Serve a published version')
+    activate.add_argument('version')
+    commands.add_parser('list', help='List published versions')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'publish':
+        publish_version(args.source, args.registry, activate=not args.no_activate, note=args.note)
+    elif args.command == 'activate':
+        activate_version(args.version, args.registry)
+    else:
+        manifest = read_manifest(args.registry)
+        if manifest is None:
+            print("No model versions published")
+            return
+        for entry in manifest['versions']:
+            marker = '*' if entry['version'] == manifest['active'] else ' '
+            accuracy = entry.get('metrics', {}).get('accuracy')
+            details = f"accuracy {accuracy:.4f}" if accuracy is not None else ''
+            print(f"{marker} {entry['version']}  {entry['created_at']}  {details}  {entry.get('note', '')}".rstrip())
+
+
+if __name__ == '__main__':
+    main()
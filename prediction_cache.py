@@ -0,0 +1,248 @@
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Odd 64-bit multiplier used to combine the per-column hashes of a row
+HASH_MULTIPLIER = np.uint64(0x100000001B3)
+# Keys per sqlite query (stays under SQLite's bound parameter limit)
+DISK_QUERY_BATCH = 500
+# A full store frees this fraction (1/EVICT_DIVISOR) of its rows at once
+EVICT_DIVISOR = 10
+
+
+def feature_row_hashes(features):
+    """
+    Vectorized 64-bit hash of each row of a feature matrix
+
+    Each column is hashed with pandas' hash_array and the columns are folded
+    together, so the cost is a few passes over the matrix with no Python loop
+    over rows. Hash the matrix exactly as the model sees it (float32 for the
+    trees), so equal keys mean identical predictions.
+    """
+    features = np.asarray(features)
+    hashes = np.zeros(features.shape[0], dtype=np.uint64)
+    for j in range(features.shape[1]):
+        hashes = (hashes ^ pd.util.hash_array(np.ascontiguousarray(features[:, j]))) * HASH_MULTIPLIER
+    return hashes
+
+
+class RowStore:
+    """
+    Class probabilities of up to max_entries rows of one model, evicted least recently used first.
+
+    A dict maps each row hash to a slot of preallocated arrays, so looking up or
+    inserting a batch costs time in proportion to the batch, not to the store.
+    Once the store is full, the least recently used tenth of it is freed in one
+    pass, which keeps eviction cheap when spread over the inserts in between.
+    """
+
+    def __init__(self, max_entries, n_classes):
+        self.max_entries = max_entries
+        self.n_classes = n_classes
+        self.index = {}
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.proba = np.empty((0, n_classes), dtype=np.float64)
+        # -1 marks a freed slot
+        self.last_used = np.empty(0, dtype=np.int64)
+        self.n_slots = 0
+        self.free = np.empty(0, dtype=np.intp)
+
+    def __len__(self):
+        return len(self.index)
+
+    def lookup(self, keys, tick):
+        """Return a hit mask and the probabilities of the hits, in key order"""
+        index = self.index
+        slots = np.fromiter((index.get(key, -1) for key in keys.tolist()), dtype=np.intp, count=len(keys))
+        hit = slots >= 0
+        slots = slots[hit]
+        self.last_used[slots] = tick
+        return hit, self.proba[slots]
+
+    def store(self, keys, proba, tick):
+        """Add the rows whose keys aren't stored yet"""
+        index = self.index
+        keys, first = np.unique(keys, return_index=True)
+        new = np.fromiter((key not in index for key in keys.tolist()), dtype=bool, count=len(keys))
+        keys = keys[new][:self.max_entries]
+        proba = np.asarray(proba, dtype=np.float64)[first[new][:self.max_entries]]
+        if len(keys) == 0:
+            return
+        slots = self._allocate(len(keys))
+        self.keys[slots] = keys
+        self.proba[slots] = proba
+        self.last_used[slots] = tick
+        index.update(zip(keys.tolist(), slots.tolist()))
+
+    def _allocate(self, count):
+        available = len(self.free) + self.max_entries - self.n_slots
+        if available < count:
+            self._evict(max(count - available, self.max_entries // EVICT_DIVISOR))
+        reused, self.free = self.free[:count], self.free[count:]
+        fresh = np.arange(self.n_slots, self.n_slots + count - len(reused), dtype=np.intp)
+        self.n_slots += len(fresh)
+        if self.n_slots > len(self.keys):
+            # Grow geometrically up to the bound, so appends are amortized O(1)
+            capacity = min(self.max_entries, max(self.n_slots, 2 * len(self.keys)))
+            grow = capacity - len(self.keys)
+            self.keys = np.concatenate([self.keys, np.zeros(grow, dtype=np.uint64)])
+            self.proba = np.concatenate([self.proba, np.zeros((grow, self.n_classes))])
+            self.last_used = np.concatenate([self.last_used, np.full(grow, -1, dtype=np.int64)])
+        return np.concatenate([reused, fresh])
+
+    def _evict(self, count):
+        used = np.flatnonzero(self.last_used[:self.n_slots] >= 0)
+        count = min(count, len(used))
+        if count == 0:
+            return
+        victims = used[np.argpartition(self.last_used[used], count - 1)[:count]]
+        for key in self.keys[victims].tolist():
+            del self.index[key]
+        self.last_used[victims] = -1
+        self.free = np.concatenate([self.free, victims])
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of class probabilities keyed by model, feature-row hash and model version.
+
+    Each model has its own RowStore of up to ``max_entries`` rows, and the
+    stores are dropped whenever another model version is looked up. Recency is
+    tracked per lookup batch. Every thread of a worker shares one instance;
+    with ``disk_path`` misses also go to an sqlite store that all workers on
+    the host share.
+    """
+
+    def __init__(self, max_entries, disk_path=None, disk_max_entries=None):
+        self.max_entries = max_entries
+        self.disk_path = disk_path
+        self.disk_max_entries = disk_max_entries
+        self.lock = threading.Lock()
+        self.counts = {'hits': 0, 'disk_hits': 0, 'misses': 0}
+        self._local = threading.local()
+        self.version = None
+        self.stores = {}
+        self.tick = 0
+
+    def _store_for(self, version, model, n_classes):
+        # Entries of a previous model version can never be hit again
+        if version != self.version:
+            self.version = version
+            self.stores = {}
+        store = self.stores.get(model)
+        if store is None or store.n_classes != n_classes:
+            store = self.stores[model] = RowStore(self.max_entries, n_classes)
+        return store
+
+    @staticmethod
+    def _disk_namespace(version, model):
+        return f"{version}/{model}"
+
+    def lookup(self, version, model, keys, n_classes):
+        """
+        Look up a batch of row hashes scored by one model
+
+        Returns a hit mask and a probability matrix whose rows are only
+        meaningful where the mask is set.
+        """
+        proba = np.empty((len(keys), n_classes), dtype=np.float64)
+        with self.lock:
+            store = self._store_for(version, model, n_classes)
+            self.tick += 1
+            hit, cached = store.lookup(keys, self.tick)
+            proba[hit] = cached
+            self.counts['hits'] += int(hit.sum())
+
+        if self.disk_path and not hit.all():
+            missing = np.flatnonzero(~hit)
+            disk_hit, disk_proba = self._disk_lookup(self._disk_namespace(version, model), keys[missing], n_classes)
+            if disk_hit.any():
+                found = missing[disk_hit]
+                hit[found] = True
+                proba[found] = disk_proba
+                self._store_memory(version, model, keys[found], disk_proba)
+                with self.lock:
+                    self.counts['disk_hits'] += int(disk_hit.sum())
+
+        with self.lock:
+            self.counts['misses'] += int((~hit).sum())
+        return hit, proba
+
+    def store(self, version, model, keys, proba):
+        """Add freshly computed probabilities of one model for a batch of row hashes"""
+        self._store_memory(version, model, keys, proba)
+        if self.disk_path:
+            self._disk_store(self._disk_namespace(version, model), keys, proba)
+
+    def _store_memory(self, version, model, keys, proba):
+        with self.lock:
+            if self.version is not None and version != self.version:
+                # A newer version was swapped in while these were computed
+                return
+            self._store_for(version, model, proba.shape[1]).store(keys, proba, self.tick)
+
+    def _connection(self):
+        """sqlite connection of the current thread (reopened after a fork); rows are keyed by '<version>/<model>'"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.disk_path, timeout=30)
+            # WAL lets workers read while another one writes
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS predictions '
+                '(version TEXT NOT NULL, key INTEGER NOT NULL, proba BLOB NOT NULL, UNIQUE (version, key))'
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _disk_lookup(self, namespace, keys, n_classes):
+        # sqlite integers are signed, so keys are stored as their int64 view
+        signed_keys = keys.view(np.int64)
+        found = {}
+        connection = self._connection()
+        for start in range(0, len(signed_keys), DISK_QUERY_BATCH):
+            batch = signed_keys[start:start + DISK_QUERY_BATCH].tolist()
+            placeholders = ','.join('?' * len(batch))
+            rows = connection.execute(
+                f'SELECT key, proba FROM predictions WHERE version = ? AND key IN ({placeholders})',
+                [namespace] + batch
+            ).fetchall()
+            found.update(rows)
+
+        hit = np.fromiter((key in found for key in signed_keys.tolist()), dtype=bool, count=len(signed_keys))
+        proba = np.frombuffer(
+            b''.join(found[key] for key in signed_keys[hit].tolist()), dtype=np.float64
+        ).reshape(-1, n_classes)
+        return hit, proba
+
+    def _disk_store(self, namespace, keys, proba):
+        proba = np.ascontiguousarray(proba, dtype=np.float64)
+        rows = [(namespace, key, row.tobytes()) for key, row in zip(keys.view(np.int64).tolist(), proba)]
+        connection = self._connection()
+        with connection:
+            connection.executemany('INSERT OR IGNORE INTO predictions (version, key, proba) VALUES (?, ?, ?)', rows)
+            if self.disk_max_entries:
+                # Oldest rows go first once the store is full
+                connection.execute(
+                    'DELETE FROM predictions WHERE rowid <= (SELECT MAX(rowid) FROM predictions) - ?',
+                    (self.disk_max_entries,)
+                )
+
+    def stats(self):
+        """Entry count and hit/miss counters"""
+        with self.lock:
+            counts = dict(self.counts)
+            entries = {model: len(store) for model, store in self.stores.items()}
+        lookups = counts['hits'] + counts['disk_hits'] + counts['misses']
+        return {
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'disk_store': self.disk_path,
+            **counts,
+            'hit_rate': round((counts['hits'] + counts['disk_hits']) / lookups, 4) if lookups else None
+        }
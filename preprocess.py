@@ -1,15 +1,25 @@
+import argparse
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import LabelEncoder, StandardScaler
-import matplotlib.pyplot as plt
-import seaborn as sns
+import joblib
 import os
+from data_store import ChunkedTableWriter, load_table, save_table
+import report
+
+RAW_DATA_PATH = 'data/WA_Fn-UseC_-HR-Employee-Attrition.csv'
+PREPROCESSED_PATH = 'data/preprocessed_hr_data.csv'
+PIPELINE_PATH = 'models/preprocessing_pipeline.pkl'
+# Rows per scaler update; both paths fit the scaler in blocks of this size so
+# streaming and in-memory runs accumulate the statistics in the same order
+STATS_BLOCK_ROWS = 65536
 
 def load_data(file_path):
     """
     Load the HR Analytics dataset
     """
-    df = pd.read_csv(file_path)
+    # Smallest exact dtypes: the scaler and encoders see the same values as with int64/float64
+    df = load_table(file_path, dtypes='lossless')
     print(f"Dataset loaded with shape: {df.shape}")
     return df
 
@@ -18,9 +28,35 @@ def check_missing_values(df):
     Check for missing values in the dataset
     """
     missing_values = df.isnull().sum()
+    print_missing_values(missing_values)
+    return missing_values
+
+def print_missing_values(missing_values):
+    """
+    Print the columns that have missing values
+    """
     print("\nMissing Values:")
     print(missing_values[missing_values > 0] if len(missing_values[missing_values > 0]) > 0 else "No missing values found")
-    return missing_values
+
+def partial_fit_scaler(scaler, df):
+    """
+    Update a StandardScaler with a block of rows
+
+    The block is passed as a column-major float64 array, so every column's
+    statistics are summed the same way no matter which other columns are in it.
+    """
+    scaler.partial_fit(np.asfortranarray(df.to_numpy(dtype=np.float64)))
+    return scaler
+
+def fit_scaler(df):
+    """
+    Fit a StandardScaler on the columns of df, STATS_BLOCK_ROWS rows at a time
+    """
+    scaler = StandardScaler()
+    for start in range(0, len(df), STATS_BLOCK_ROWS):
+        partial_fit_scaler(scaler, df.iloc[start:start + STATS_BLOCK_ROWS])
+    scaler.feature_names_in_ = np.asarray(df.columns, dtype=object)
+    return scaler
 
 def preprocess_data(df):
     """
@@ -43,7 +79,7 @@ def preprocess_data(df):
         print(f"Dropped constant columns: {constant_cols}")
     
     # Encode categorical variables
-    categorical_cols = processed_df.select_dtypes(include=['object']).columns
+    categorical_cols = processed_df.select_dtypes(include=['object', 'category']).columns
     
     # Create a dictionary to store the label encoders
     label_encoders = {}
@@ -58,113 +94,193 @@ def preprocess_data(df):
     if 'left' in processed_df.columns:
         processed_df['left'] = processed_df['left'].map({1: 1, 0: 0})  # Already binary
     
-    # Scale numerical features
-    numerical_cols = processed_df.select_dtypes(include=['int64', 'float64']).columns
-    scaler = StandardScaler()
+    # Scale numerical features (label-encoded columns and the target keep their raw values)
+    numerical_cols = [
+        col for col in processed_df.select_dtypes(include=['number']).columns
+        if col != 'left' and col not in label_encoders
+    ]
+    scaler = fit_scaler(processed_df[numerical_cols])
     
     # We'll create a new dataframe for the scaled features to avoid scaling binary variables
     scaled_features = pd.DataFrame(
-        scaler.fit_transform(processed_df[numerical_cols]),
+        scaler.transform(processed_df[numerical_cols]),
         columns=numerical_cols,
         index=processed_df.index
     )
     
     # Replace the original numerical columns with the scaled ones
     for col in numerical_cols:
-        if col != 'left':  # Don't scale the target variable
-            processed_df[col] = scaled_features[col]
+        processed_df[col] = scaled_features[col]
     
-    return processed_df, label_encoders
+    return processed_df, label_encoders, scaler
 
-def create_plots_directory():
+def column_kind(series):
     """
-    Create directory for saving plots
+    How a raw column is handled: 'category' columns are label-encoded, 'number' columns scaled
     """
-    if not os.path.exists('images'):
-        os.makedirs('images')
-        print("Created 'images' directory for saving visualizations")
+    if pd.api.types.is_bool_dtype(series.dtype):
+        raise ValueError(f"Column '{series.name}' is boolean; only numeric and text columns can be streamed")
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        return 'number'
+    if pd.api.types.is_object_dtype(series.dtype) or isinstance(series.dtype, pd.CategoricalDtype):
+        return 'category'
+    raise ValueError(f"Column '{series.name}' has unsupported dtype {series.dtype} for streaming")
 
-def plot_attrition_distribution(df):
+def scan_csv(input_path, target_col='left'):
     """
-    Plot the distribution of left (pie chart and bar plot)
+    First streaming pass: everything preprocess_data learns from the whole dataset
+
+    Reads the CSV STATS_BLOCK_ROWS rows at a time and keeps only running
+    aggregates: column kinds, up to two distinct values per column (enough to
+    spot constant columns), category vocabularies, missing-value counts, scaler
+    statistics for every numeric column and the raw-data EDA counts. The EDA
+    counts need the target and satisfaction_level columns; a file without them
+    raises a ValueError.
     """
-    create_plots_directory()
-    
-    # Count the values for left
-    left_counts = df['left'].value_counts()
-    labels = ['No', 'Yes']
-    
-    # Pie Chart
-    plt.figure(figsize=(10, 6))
-    plt.pie(left_counts, labels=labels, autopct='%1.1f%%', startangle=90, colors=['#66b3ff','#ff9999'])
-    plt.title('Employee Turnover Distribution')
-    plt.axis('equal')
-    plt.tight_layout()
-    plt.savefig('images/attrition_distribution_pie.png')
-    plt.close()
-    
-    # Bar Plot
-    plt.figure(figsize=(10, 6))
-    sns.countplot(x='left', data=df)
-    plt.title('Employee Turnover Distribution')
-    plt.xlabel('Left Company')
-    plt.ylabel('Count')
-    plt.tight_layout()
-    plt.savefig('images/attrition_distribution_bar.png')
-    plt.close()
-    
-    print("Employee turnover distribution plots saved to 'images' directory")
+    scan = {'n_rows': 0, 'target_dtypes': [], 'target_counts': 0, 'satisfaction_counts': 0}
+    scaler = StandardScaler()
+    for chunk in pd.read_csv(input_path, chunksize=STATS_BLOCK_ROWS):
+        kinds = {col: column_kind(chunk[col]) for col in chunk.columns}
+        if scan['n_rows'] == 0:
+            missing = [col for col in (target_col, 'satisfaction_level') if col not in chunk.columns]
+            if missing:
+                raise ValueError(f"{input_path} has no {missing} column(s), which the EDA counts need")
+            scan['kinds'] = kinds
+            scan['distinct'] = {col: set() for col in chunk.columns}
+            scan['vocabularies'] = {col: set() for col, kind in kinds.items() if kind == 'category'}
+            scan['missing'] = 0
+            # Every numeric column might be scaled; the ones dropped later are left out of the final scaler
+            scan['numeric_columns'] = [
+                col for col, kind in kinds.items() if kind == 'number' and col not in (target_col, 'EmployeeNumber')
+            ]
+        elif kinds != scan['kinds']:
+            # Per-chunk type inference disagreed (e.g. a text value in a numeric column)
+            changed = [col for col in kinds if kinds[col] != scan['kinds'].get(col)]
+            raise ValueError(f"Column types change partway through {input_path}: {changed}")
 
-def plot_correlation_heatmap(df):
+        scan['n_rows'] += len(chunk)
+        scan['missing'] = scan['missing'] + chunk.isnull().sum()
+        for col, values in scan['distinct'].items():
+            if len(values) < 2:
+                values.update(chunk[col].dropna().unique()[:2])
+        for col, vocabulary in scan['vocabularies'].items():
+            vocabulary.update(chunk[col].unique())
+        scan['target_dtypes'].append(chunk[target_col].map({1: 1, 0: 0}).dtype)
+        partial_fit_scaler(scaler, chunk[scan['numeric_columns']])
+
+        target = chunk[target_col].to_numpy()
+        scan['target_counts'] = scan['target_counts'] + report.class_counts(target)
+        scan['satisfaction_counts'] = scan['satisfaction_counts'] + report.binned_class_counts(
+            chunk['satisfaction_level'].to_numpy(), target, report.SATISFACTION_EDGES
+        )
+
+    if scan['n_rows'] == 0:
+        raise ValueError(f"No rows in {input_path}")
+    scan['scaler'] = scaler
+    return scan
+
+def subset_scaler(scaler, columns, subset):
     """
-    Plot correlation heatmap for numerical features
+    StandardScaler for some of the columns of a fitted one (the statistics are per column)
     """
-    create_plots_directory()
-    
-    # Select numerical columns
-    numerical_df = df.select_dtypes(include=['int64', 'float64'])
-    
-    # Calculate the correlation matrix
-    corr_matrix = numerical_df.corr()
-    
-    # Plot the heatmap
-    plt.figure(figsize=(16, 12))
-    mask = np.triu(np.ones_like(corr_matrix, dtype=bool))
-    sns.heatmap(corr_matrix, mask=mask, annot=True, cmap='coolwarm', fmt=".2f", linewidths=0.5)
-    plt.title('Correlation Heatmap')
-    plt.tight_layout()
-    plt.savefig('images/correlation_heatmap.png')
-    plt.close()
-    
-    print("Correlation heatmap saved to 'images' directory")
+    positions = [columns.index(col) for col in subset]
+    scaled = StandardScaler()
+    scaled.mean_ = scaler.mean_[positions]
+    scaled.var_ = scaler.var_[positions]
+    scaled.scale_ = scaler.scale_[positions]
+    n_samples_seen = scaler.n_samples_seen_
+    scaled.n_samples_seen_ = n_samples_seen[positions] if np.ndim(n_samples_seen) else n_samples_seen
+    scaled.n_features_in_ = len(subset)
+    scaled.feature_names_in_ = np.asarray(subset, dtype=object)
+    return scaled
 
-def plot_job_satisfaction_vs_attrition(df):
+def preprocess_csv_in_chunks(input_path, output_path, chunksize, target_col='left'):
     """
-    Plot JobSatisfaction vs left
+    Preprocess a CSV that doesn't fit in memory, in two streaming passes
+
+    The first pass (scan_csv) fits the encoders and scaler, the second encodes,
+    scales and writes one chunk of rows at a time. Memory use depends on the
+    chunk size and the number of distinct categories, not on the number of rows.
+    The CSV, its columnar cache and the fitted encoders and scaler are identical
+    to what preprocess_data and save_processed_data produce for the same file.
     """
-    create_plots_directory()
-    
-    # Check if we need to create a copy with label-mapped values for plotting
-    plot_df = df.copy()
-    
-    # If left is numeric, create a mapped version for better visualization
-    if 'left' in plot_df.columns and plot_df['left'].dtype != 'object':
-        plot_df['leftLabel'] = plot_df['left'].map({1: 'Yes', 0: 'No'})
-        left_col = 'leftLabel'
-    else:
-        left_col = 'left'
-    
-    # Plot JobSatisfaction vs left
-    plt.figure(figsize=(12, 6))
-    sns.countplot(x='satisfaction_level', hue=left_col, data=plot_df)
-    plt.title('Job Satisfaction vs Employee Turnover')
-    plt.xlabel('Job Satisfaction Level')
-    plt.ylabel('Count')
-    plt.tight_layout()
-    plt.savefig('images/job_satisfaction_vs_attrition.png')
-    plt.close()
-    
-    print("Job Satisfaction vs Employee Turnover plot saved to 'images' directory")
+    scan = scan_csv(input_path, target_col)
+    print(f"Dataset scanned with shape: ({scan['n_rows']}, {len(scan['kinds'])})")
+    print_missing_values(scan['missing'])
+
+    # Same column drops as preprocess_data
+    dropped = ['EmployeeNumber'] if 'EmployeeNumber' in scan['kinds'] else []
+    constant_cols = [
+        col for col, values in scan['distinct'].items() if col not in dropped and len(values) == 1
+    ]
+    if 'Over18' in constant_cols:
+        dropped.append('Over18')
+        constant_cols.remove('Over18')
+    if constant_cols:
+        dropped.extend(constant_cols)
+        print(f"Dropped constant columns: {constant_cols}")
+    columns = [col for col in scan['kinds'] if col not in dropped]
+
+    label_encoders = {}
+    for col in columns:
+        if scan['kinds'][col] == 'category' and col != target_col:
+            label_encoders[col] = LabelEncoder().fit(np.array(list(scan['vocabularies'][col]), dtype=object))
+    numerical_cols = [col for col in columns if scan['kinds'][col] == 'number' and col != target_col]
+    scaler = subset_scaler(scan['scaler'], scan['numeric_columns'], numerical_cols)
+
+    # dtypes a full read of the finished CSV infers
+    dtypes = {}
+    for col in columns:
+        if col == target_col:
+            dtypes[col] = np.result_type(*scan['target_dtypes'])
+        else:
+            dtypes[col] = np.int64 if col in label_encoders else np.float64
+
+    writer = ChunkedTableWriter(output_path, scan['n_rows'], dtypes)
+    moments = None
+    for chunk in pd.read_csv(input_path, chunksize=chunksize):
+        processed_df = chunk.drop(columns=dropped)
+        for col, le in label_encoders.items():
+            processed_df[col] = le.transform(processed_df[col])
+        if target_col in processed_df.columns:
+            processed_df[target_col] = processed_df[target_col].map({1: 1, 0: 0})
+        processed_df[numerical_cols] = scaler.transform(processed_df[numerical_cols])
+        processed_df = processed_df.astype(dtypes)
+        writer.write(processed_df)
+
+        numerical_df = processed_df.select_dtypes(include=['number'])
+        statistics = report.moment_statistics(numerical_df.to_numpy(dtype=np.float64))
+        moments = statistics if moments is None else report.merge_moment_statistics(moments, statistics)
+    writer.close()
+    print(f"Preprocessed data saved to {output_path}")
+
+    aggregates = {
+        'target_counts': scan['target_counts'],
+        'satisfaction_counts': scan['satisfaction_counts'],
+        'correlation': report.correlation_from_moments(moments),
+        'correlation_labels': numerical_df.columns.tolist()
+    }
+    return columns, label_encoders, scaler, aggregates
+
+def build_preprocessing_pipeline(processed_df, label_encoders, scaler, target_col='left'):
+    """
+    Collect the fitted encoders and scaler into a plain, version-independent artifact
+    """
+    return {
+        'feature_columns': [col for col in processed_df.columns if col != target_col],
+        'categorical_columns': {col: le.classes_.tolist() for col, le in label_encoders.items()},
+        'scaled_columns': scaler.feature_names_in_.tolist(),
+        'mean': scaler.mean_.copy(),
+        'scale': scaler.scale_.copy()
+    }
+
+def save_preprocessing_pipeline(pipeline, output_path=PIPELINE_PATH):
+    """
+    Save the fitted preprocessing pipeline next to the trained models
+    """
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    joblib.dump(pipeline, output_path)
+    print(f"Preprocessing pipeline saved to {output_path}")
 
 def save_processed_data(df, output_path):
     """
@@ -173,31 +289,53 @@ def save_processed_data(df, output_path):
     # Create data directory if it doesn't exist
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
     
-    # Save to CSV
-    df.to_csv(output_path, index=False)
+    # Save to CSV along with its columnar cache
+    save_table(df, output_path)
     print(f"Preprocessed data saved to {output_path}")
 
-def main():
+def parse_args(argv=None):
+    """
+    Parse command line options
+    """
+    parser = argparse.ArgumentParser(description='Preprocess the HR Analytics dataset')
+    parser.add_argument('--input', default=RAW_DATA_PATH, help='Raw CSV export')
+    parser.add_argument('--output', default=PREPROCESSED_PATH, help='Where to write the preprocessed CSV')
+    parser.add_argument('--chunksize', type=int,
+                        help='Stream the input in chunks of this many rows instead of loading it whole')
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """
     Main function to execute the preprocessing pipeline
     """
+    args = parse_args(argv)
+    
+    if args.chunksize:
+        # Two passes over the file; the output is the same as the in-memory path's
+        print(f"Streaming {args.input} in chunks of {args.chunksize} rows")
+        columns, label_encoders, scaler, aggregates = preprocess_csv_in_chunks(args.input, args.output, args.chunksize)
+        report.render_figures(report.eda_figures_from_aggregates(aggregates))
+        save_preprocessing_pipeline(build_preprocessing_pipeline(pd.DataFrame(columns=columns), label_encoders, scaler))
+        print("Preprocessing completed successfully!")
+        return
+    
     # Load data
-    data_path = 'data/WA_Fn-UseC_-HR-Employee-Attrition.csv'
-    df = load_data(data_path)
+    df = load_data(args.input)
     
     # Check for missing values
     check_missing_values(df)
     
     # Preprocess data
-    processed_df, label_encoders = preprocess_data(df)
+    processed_df, label_encoders, scaler = preprocess_data(df)
     
-    # Generate and save EDA plots
-    plot_attrition_distribution(df)  # Using original data for better labels
-    plot_correlation_heatmap(processed_df)
-    plot_job_satisfaction_vs_attrition(df)  # Using original data for better labels
+    # Generate and save EDA plots (turnover and satisfaction use the original data for better labels)
+    report.render_figures(report.eda_figures(df, processed_df))
     
     # Save preprocessed data
-    save_processed_data(processed_df, 'data/preprocessed_hr_data.csv')
+    save_processed_data(processed_df, args.output)
+    
+    # Save the fitted transform so raw exports can be scored directly
+    save_preprocessing_pipeline(build_preprocessing_pipeline(processed_df, label_encoders, scaler))
     
     print("Preprocessing completed successfully!")
 
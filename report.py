@@ -0,0 +1,502 @@
+"""
+Figure generation for images/.
+
+The pipeline scripts reduce their data to small plot inputs (class counts,
+binned histograms, correlation and confusion matrices) with vectorized NumPy,
+and render_figures() draws the figures in a process pool with the
+non-interactive Agg backend. A digest of every figure's inputs is kept in
+images/.figures.json, so figures whose inputs haven't changed are skipped.
+
+Regenerate every figure that can be rebuilt from the saved data and models:
+
+    python report.py            # only figures whose inputs changed
+    python report.py --force    # all of them
+"""
+import argparse
+import hashlib
+import inspect
+import json
+import multiprocessing
+import os
+import pickle
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import seaborn as sns
+
+IMAGES_DIR = 'images'
+MANIFEST_FILE = '.figures.json'
+# satisfaction_level bins, 0.1 wide (the raw values have two decimals)
+SATISFACTION_EDGES = np.round(np.arange(0.0, 1.05, 0.1), 2)
+# The decision tree plot is 25x15 inches; 300 dpi made it the slowest figure to render and serve
+DECISION_TREE_DPI = 150
+TOP_FEATURES = 15
+# Node fields the tree plot shows (sklearn's node records also carry padding and
+# fields that are left uninitialized on leaves, which would change every refit)
+TREE_PLOT_FIELDS = ('children_left', 'children_right', 'feature', 'threshold', 'impurity', 'n_node_samples')
+
+# One figure: the file it is saved to, the function that draws it and that function's inputs.
+# ``key`` replaces the inputs in the digest when they don't pickle reproducibly (fitted models).
+Figure = namedtuple('Figure', ['filename', 'renderer', 'data', 'key'], defaults=(None,))
+
+
+# Aggregates
+
+def class_counts(labels, n_classes=2):
+    """Number of rows per class label"""
+    return np.bincount(np.asarray(labels, dtype=np.int64), minlength=n_classes)
+
+
+def binned_class_counts(values, labels, edges, n_classes=2):
+    """Counts per (bin, class) of a continuous feature, as a bins x classes matrix"""
+    n_bins = len(edges) - 1
+    bins = np.clip(np.searchsorted(edges, values, side='right') - 1, 0, n_bins - 1)
+    codes = bins * n_classes + np.asarray(labels, dtype=np.int64)
+    return np.bincount(codes, minlength=n_bins * n_classes).reshape(n_bins, n_classes)
+
+
+def correlation_matrix(values):
+    """Pearson correlations between the columns of a 2D array"""
+    return np.corrcoef(np.asarray(values, dtype=np.float64), rowvar=False)
+
+
+def moment_statistics(values):
+    """Row count, column means and co-moment matrix of a 2D array (mergeable across chunks)"""
+    values = np.asarray(values, dtype=np.float64)
+    mean = values.mean(axis=0) if len(values) else np.zeros(values.shape[1])
+    centered = values - mean
+    return {'count': len(values), 'mean': mean, 'comoment': centered.T @ centered}
+
+
+def merge_moment_statistics(a, b):
+    """Combine the moment statistics of two row sets (Chan et al.'s pairwise update)"""
+    count = a['count'] + b['count']
+    if count == 0:
+        return a
+    delta = b['mean'] - a['mean']
+    return {
+        'count': count,
+        'mean': a['mean'] + delta * (b['count'] / count),
+        'comoment': a['comoment'] + b['comoment'] + np.outer(delta, delta) * (a['count'] * b['count'] / count)
+    }
+
+
+def correlation_from_moments(statistics):
+    """Pearson correlations from merged moment statistics"""
+    comoment = statistics['comoment']
+    std = np.sqrt(np.diag(comoment))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return comoment / np.outer(std, std)
+
+
+def confusion_counts(y_true, y_pred, n_classes=2):
+    """Confusion matrix (actual x predicted) from one bincount"""
+    codes = np.asarray(y_true, dtype=np.int64) * n_classes + np.asarray(y_pred, dtype=np.int64)
+    return np.bincount(codes, minlength=n_classes * n_classes).reshape(n_classes, n_classes)
+
+
+# Renderers (module-level so the pool can pickle them; each gets the output path and its inputs)
+
+def render_pie(path, counts, labels, title):
+    plt.figure(figsize=(10, 6))
+    plt.pie(counts, labels=labels, autopct='%1.1f%%', startangle=90, colors=['#66b3ff', '#ff9999'])
+    plt.title(title)
+    plt.axis('equal')
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+
+def render_count_bar(path, categories, counts, title, xlabel):
+    plt.figure(figsize=(10, 6))
+    sns.barplot(x=categories, y=counts)
+    plt.title(title)
+    plt.xlabel(xlabel)
+    plt.ylabel('Count')
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+
+def render_heatmap(path, matrix, labels, title):
+    plt.figure(figsize=(16, 12))
+    mask = np.triu(np.ones_like(matrix, dtype=bool))
+    sns.heatmap(matrix, mask=mask, annot=True, cmap='coolwarm', fmt=".2f", linewidths=0.5,
+                xticklabels=labels, yticklabels=labels)
+    plt.title(title)
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+
+def render_grouped_bars(path, bin_labels, counts, group_labels, title, xlabel):
+    plt.figure(figsize=(12, 6))
+    x = np.arange(len(bin_labels))
+    width = 0.8 / len(group_labels)
+    colors = sns.color_palette(n_colors=len(group_labels))
+    for i, group in enumerate(group_labels):
+        plt.bar(x + (i - (len(group_labels) - 1) / 2) * width, counts[:, i], width, label=group, color=colors[i])
+    plt.xticks(x, bin_labels)
+    plt.title(title)
+    plt.xlabel(xlabel)
+    plt.ylabel('Count')
+    plt.legend(title='left')
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+
+def render_decision_tree(path, model, feature_names):
+    from sklearn.tree import plot_tree
+    plt.figure(figsize=(25, 15))
+    plot_tree(model, feature_names=feature_names,
+              class_names=['Stayed', 'Left'],
+              filled=True, rounded=True, fontsize=10)
+    plt.title('Decision Tree Visualization')
+    plt.tight_layout()
+    plt.savefig(path, dpi=DECISION_TREE_DPI, bbox_inches='tight')
+    plt.close()
+
+
+def render_feature_importance(path, names, importances):
+    plt.figure(figsize=(12, 8))
+    plt.barh(range(len(names)), importances, align='center')
+    plt.yticks(range(len(names)), names)
+    plt.xlabel('Relative Importance')
+    plt.title('Feature Importance')
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+
+def render_confusion_matrix(path, matrix):
+    plt.figure(figsize=(10, 8))
+    sns.heatmap(matrix, annot=True, fmt='d', cmap='Blues')
+    plt.title('Confusion Matrix')
+    plt.ylabel('Actual')
+    plt.xlabel('Predicted')
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+
+def render_roc_curve(path, fpr, tpr, auc):
+    plt.figure(figsize=(10, 8))
+    plt.plot(fpr, tpr, color='blue', lw=2, label=f'ROC curve (AUC = {auc:.4f})')
+    plt.plot([0, 1], [0, 1], color='gray', lw=2, linestyle='--')
+    plt.xlim([0.0, 1.0])
+    plt.ylim([0.0, 1.05])
+    plt.xlabel('False Positive Rate')
+    plt.ylabel('True Positive Rate')
+    plt.title('Receiver Operating Characteristic (ROC) Curve')
+    plt.legend(loc='lower right')
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+
+def render_elbow(path, k_range, inertia, errors):
+    plt.figure(figsize=(12, 8))
+    plt.plot(k_range, inertia, marker='o', linestyle='-')
+    if errors is not None:
+        plt.fill_between(k_range, inertia - errors, inertia + errors, alpha=0.2, label='95% confidence interval')
+        plt.legend()
+    plt.xlabel('Number of Clusters')
+    plt.ylabel('Inertia')
+    plt.title('Elbow Method for Optimal k')
+    plt.xticks(k_range)
+    plt.grid(True)
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+
+def render_cluster_scatter(path, coordinates, clusters, centers, n_clusters):
+    plt.figure(figsize=(12, 8))
+    for cluster_id in range(n_clusters):
+        members = clusters == cluster_id
+        plt.scatter(coordinates[members, 0], coordinates[members, 1], s=50, alpha=0.7, label=f'Cluster {cluster_id}')
+    plt.scatter(centers[:, 0], centers[:, 1], s=200, marker='X', c='red', label='Cluster Centers')
+    plt.title('K-Means Clusters Visualization (PCA)')
+    plt.xlabel('Principal Component 1')
+    plt.ylabel('Principal Component 2')
+    plt.legend()
+    plt.grid(True, alpha=0.3)
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+
+def render_cluster_features(path, cluster_ids, features):
+    fig, axes = plt.subplots(len(features), 1, figsize=(12, len(features) * 4))
+    axes = np.atleast_1d(axes)
+    for ax, (name, values) in zip(axes, features.items()):
+        ax.bar(cluster_ids, values)
+        ax.set_title(f'Average {name} by Cluster')
+        ax.set_xlabel('Cluster')
+        ax.set_ylabel(name)
+        ax.set_xticks(cluster_ids)
+        ax.grid(True, alpha=0.3)
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+
+def render_cluster_bars(path, cluster_ids, values, title, ylabel):
+    plt.figure(figsize=(10, 6))
+    plt.bar(cluster_ids, values)
+    plt.title(title)
+    plt.xlabel('Cluster')
+    plt.ylabel(ylabel)
+    plt.xticks(cluster_ids)
+    plt.grid(True, alpha=0.3)
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+
+# Figure sets
+
+def eda_aggregates(raw_df, processed_df, target_col='left'):
+    """Turnover counts, binned satisfaction counts and the correlation matrix of the processed features"""
+    numerical_df = processed_df.select_dtypes(include=['number'])
+    target = raw_df[target_col].to_numpy()
+    return {
+        'target_counts': class_counts(target),
+        # satisfaction_level is continuous, so it is binned instead of counted per distinct value
+        'satisfaction_counts': binned_class_counts(raw_df['satisfaction_level'].to_numpy(), target, SATISFACTION_EDGES),
+        'correlation': correlation_matrix(numerical_df.to_numpy(dtype=np.float64)),
+        'correlation_labels': numerical_df.columns.tolist()
+    }
+
+
+def eda_figures(raw_df, processed_df, target_col='left'):
+    """Turnover distribution, correlation heatmap and satisfaction-vs-turnover figures"""
+    return eda_figures_from_aggregates(eda_aggregates(raw_df, processed_df, target_col))
+
+
+def eda_figures_from_aggregates(aggregates):
+    """EDA figures from precomputed aggregates (e.g. accumulated chunk by chunk)"""
+    counts = aggregates['target_counts']
+    edges = SATISFACTION_EDGES
+    return [
+        Figure('attrition_distribution_pie.png', render_pie,
+               {'counts': counts, 'labels': ['No', 'Yes'], 'title': 'Employee Turnover Distribution'}),
+        Figure('attrition_distribution_bar.png', render_count_bar,
+               {'categories': [0, 1], 'counts': counts, 'title': 'Employee Turnover Distribution',
+                'xlabel': 'Left Company'}),
+        Figure('correlation_heatmap.png', render_heatmap, {
+            # Rounded so the streamed and in-memory paths (which sum in a different order) share a digest
+            'matrix': np.round(aggregates['correlation'], 10),
+            'labels': aggregates['correlation_labels'],
+            'title': 'Correlation Heatmap'
+        }),
+        Figure('job_satisfaction_vs_attrition.png', render_grouped_bars, {
+            'bin_labels': [f'{low:.1f}-{high:.1f}' for low, high in zip(edges[:-1], edges[1:])],
+            'counts': aggregates['satisfaction_counts'],
+            'group_labels': ['No', 'Yes'],
+            'title': 'Job Satisfaction vs Employee Turnover',
+            'xlabel': 'Job Satisfaction Level'
+        })
+    ]
+
+
+def model_figures(model, X_test, y_test, feature_names):
+    """Decision tree, feature importance, confusion matrix and ROC figures"""
+    from sklearn.metrics import roc_auc_score, roc_curve
+    y_test = np.asarray(y_test).ravel()
+    y_pred = model.predict(X_test)
+    proba = model.predict_proba(X_test)[:, 1]
+    fpr, tpr, _ = roc_curve(y_test, proba)
+
+    importances = model.feature_importances_
+    top = np.argsort(importances)[::-1][:TOP_FEATURES]
+    return [
+        Figure('decision_tree_plot.png', render_decision_tree, {'model': model, 'feature_names': list(feature_names)},
+               key=tree_key(model, feature_names)),
+        Figure('feature_importance.png', render_feature_importance,
+               {'names': [feature_names[i] for i in top], 'importances': importances[top]}),
+        Figure('confusion_matrix.png', render_confusion_matrix, {'matrix': confusion_counts(y_test, y_pred)}),
+        Figure('roc_curve.png', render_roc_curve, {'fpr': fpr, 'tpr': tpr, 'auc': roc_auc_score(y_test, proba)})
+    ]
+
+
+def tree_key(model, feature_names):
+    """What the decision tree plot depends on"""
+    tree = model.tree_
+    return {
+        'feature_names': list(feature_names),
+        'nodes': {name: np.ascontiguousarray(getattr(tree, name)) for name in TREE_PLOT_FIELDS},
+        'values': tree.value
+    }
+
+
+def elbow_figure(k_range, inertia, errors=None):
+    """Elbow curve, with a confidence band when the inertia is estimated"""
+    return Figure('kmeans_elbow.png', render_elbow, {
+        'k_range': list(k_range),
+        'inertia': np.asarray(inertia, dtype=np.float64),
+        'errors': None if errors is None else np.asarray(errors, dtype=np.float64)
+    })
+
+
+def cluster_scatter_figure(coordinates, clusters, centers):
+    """Clusters in the plane of the first two principal components"""
+    # float32 is far finer than a pixel, and absorbs the last-bit noise of refitting the PCA;
+    # contiguous copies keep the digest independent of the source's memory layout
+    centers = np.ascontiguousarray(centers, dtype=np.float32)
+    return Figure('kmeans_clusters.png', render_cluster_scatter, {
+        'coordinates': np.ascontiguousarray(coordinates, dtype=np.float32),
+        'clusters': np.asarray(clusters, dtype=np.int64),
+        'centers': centers,
+        'n_clusters': len(centers)
+    })
+
+
+def cluster_profile_figures(profiles_df, key_features):
+    """Per-cluster feature means, sizes and turnover rates"""
+    cluster_ids = profiles_df['Cluster'].tolist()
+    features = {feature: profiles_df[f'Mean_{feature}'].to_numpy()
+                for feature in key_features if f'Mean_{feature}' in profiles_df.columns}
+    figures = []
+    if features:
+        figures.append(Figure('cluster_profiles.png', render_cluster_features,
+                              {'cluster_ids': cluster_ids, 'features': features}))
+    else:
+        print("No key features found for plotting cluster profiles")
+    figures.append(Figure('cluster_sizes.png', render_cluster_bars, {
+        'cluster_ids': cluster_ids, 'values': profiles_df['Size'].to_numpy(),
+        'title': 'Cluster Sizes', 'ylabel': 'Number of Employees'
+    }))
+    if 'Turnover_Rate' in profiles_df.columns:
+        figures.append(Figure('cluster_turnover_rates.png', render_cluster_bars, {
+            'cluster_ids': cluster_ids, 'values': profiles_df['Turnover_Rate'].to_numpy(),
+            'title': 'Turnover Rate by Cluster', 'ylabel': 'Turnover Rate (%)'
+        }))
+    return figures
+
+
+# Rendering
+
+def figure_digest(figure):
+    """Hash of a figure's inputs and of the code that draws it"""
+    digest = hashlib.sha256(inspect.getsource(figure.renderer).encode())
+    digest.update(pickle.dumps(figure.data if figure.key is None else figure.key, protocol=4))
+    return digest.hexdigest()
+
+
+def read_figure_manifest(output_dir=IMAGES_DIR):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _render(figure, path):
+    figure.renderer(path, **figure.data)
+    return figure.filename
+
+
+def render_figures(figures, output_dir=IMAGES_DIR, workers=None, force=False):
+    """
+    Render the figures whose inputs changed since they were last written
+
+    Figures are drawn by up to ``workers`` processes (default: one per CPU).
+    Returns the file names that were rendered.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = read_figure_manifest(output_dir)
+    digests = {figure.filename: figure_digest(figure) for figure in figures}
+    pending = [
+        figure for figure in figures
+        if force or manifest.get(figure.filename) != digests[figure.filename]
+        or not os.path.exists(os.path.join(output_dir, figure.filename))
+    ]
+    skipped = len(figures) - len(pending)
+
+    start = time.perf_counter()
+    workers = min(workers or os.cpu_count() or 1, len(pending))
+    paths = [os.path.join(output_dir, figure.filename) for figure in pending]
+    if workers > 1:
+        # Forked renderers inherit the imported plotting modules instead of importing them again
+        start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(start_method)) as pool:
+            rendered = list(pool.map(_render, pending, paths))
+    else:
+        rendered = [_render(figure, path) for figure, path in zip(pending, paths)]
+
+    # Re-read so figures written by another script in the meantime are kept
+    manifest = read_figure_manifest(output_dir)
+    manifest.update({name: digests[name] for name in rendered})
+    tmp_path = os.path.join(output_dir, f"{MANIFEST_FILE}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(output_dir, MANIFEST_FILE))
+
+    if pending or skipped:
+        print(f"Rendered {len(rendered)} figure(s) to '{output_dir}' in {time.perf_counter() - start:.2f}s "
+              f"({skipped} unchanged)")
+    return rendered
+
+
+def add_figures(figures, new_figures):
+    """Queue figures on a list to render together later, or render them right away without one"""
+    if figures is None:
+        render_figures(new_figures)
+    else:
+        figures.extend(new_figures)
+
+
+def report_figures():
+    """Every figure that can be rebuilt from the saved datasets and models"""
+    import joblib
+    import pandas as pd
+    import preprocess
+    from data_store import load_table
+
+    # Inputs are rebuilt exactly as the pipeline scripts had them (the preprocessing
+    # is redone in memory and floats are parsed round-trip), so their digests match
+    raw_df = load_table('data/WA_Fn-UseC_-HR-Employee-Attrition.csv', dtypes='lossless')
+    figures = eda_figures(raw_df, preprocess.preprocess_data(raw_df)[0])
+
+    model = joblib.load('models/decision_tree_model.pkl')
+    X_test = pd.read_csv('data/X_test.csv', float_precision='round_trip')
+    y_test = pd.read_csv('data/y_test.csv')
+    figures += model_figures(model, X_test, y_test, X_test.columns.tolist())
+
+    pca_df = pd.read_csv('data/pca_hr_results.csv', float_precision='round_trip')
+    kmeans = joblib.load('models/kmeans_model.pkl')
+    pca = joblib.load('models/pca_model.pkl')
+    figures.append(cluster_scatter_figure(
+        pca_df[['PC1', 'PC2']].to_numpy(), pca_df['Cluster'].to_numpy(), pca.transform(kmeans.cluster_centers_)
+    ))
+    profiles_df = pd.read_csv('data/cluster_profiles.csv', float_precision='round_trip')
+    key_features = [col[len('Mean_'):] for col in profiles_df.columns if col.startswith('Mean_')]
+    figures += cluster_profile_figures(profiles_df, key_features)
+    # The elbow curve needs the per-k fits, so only cluster-analysis.py draws it
+    return figures
+
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Regenerate the figures in images/ from the saved data and models')
+    parser.add_argument('--force', action='store_true', help='Render every figure, even if its inputs are unchanged')
+    parser.add_argument('--workers', type=int, default=None, help='Rendering processes (default: one per CPU)')
+    parser.add_argument('--output-dir', default=IMAGES_DIR, help='Directory the figures are written to')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    render_figures(report_figures(), args.output_dir, workers=args.workers, force=args.force)
+    print("Report generation completed successfully!")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Input validation and feature preparation shared by the API and batch-score.py.
+
+Uploads are either already preprocessed (checked against the schema of the
+training data) or raw HR exports (encoded and scaled with the pipeline saved by
+preprocess.py); both end up as the feature matrix the compiled tree scores.
+"""
+import numpy as np
+import pandas as pd
+
+
+def compile_input_schema(training_data, target_col='left'):
+    """Precompute the feature order, dtypes and column positions of the training data"""
+    columns = [col for col in training_data.columns if col != target_col]
+    return {
+        'columns': columns,
+        'dtypes': {col: training_data[col].dtype for col in columns},
+        'index': {col: position for position, col in enumerate(columns)}
+    }
+
+
+def preprocess_user_data(df, schema):
+    """Validate user uploaded data against the training schema and return its float32 feature matrix"""
+    # Ensure uploaded data has the same columns as trained data
+    missing_cols = set(schema['columns']) - set(df.columns)
+    if missing_cols:
+        raise ValueError(f"Missing columns in uploaded data: {missing_cols}")
+
+    # Extra columns are never copied: each feature is cast straight into its slot.
+    # Fortran order keeps every feature contiguous, the layout CompiledTree walks.
+    features = np.empty((len(df), len(schema['columns'])), dtype=np.float32, order='F')
+    for col, position in schema['index'].items():
+        values = df[col]
+        if not (pd.api.types.is_numeric_dtype(values.dtype) or pd.api.types.is_bool_dtype(values.dtype)):
+            raise ValueError(
+                f"Column '{col}' must be numeric like the training data ({schema['dtypes'][col]}), got {values.dtype}"
+            )
+        features[:, position] = values.to_numpy()
+
+    return features
+
+
+def compile_preprocessing_pipeline(pipeline):
+    """Precompute the column positions, scaler arrays and category lookups of a fitted pipeline"""
+    feature_columns = list(pipeline['feature_columns'])
+    scaled_columns = list(pipeline['scaled_columns'])
+    return {
+        'feature_columns': feature_columns,
+        'scaled_columns': scaled_columns,
+        'scaled_index': np.array([feature_columns.index(col) for col in scaled_columns], dtype=np.intp),
+        'mean': np.asarray(pipeline['mean'], dtype=np.float64),
+        'scale': np.asarray(pipeline['scale'], dtype=np.float64),
+        # Position of each category in the sorted LabelEncoder classes is its integer code
+        'categories': {
+            col: (feature_columns.index(col), pd.Index(classes))
+            for col, classes in pipeline['categorical_columns'].items()
+        }
+    }
+
+
+def transform_raw_data(df, pipeline):
+    """Encode and scale raw HR rows with the persisted preprocessing pipeline"""
+    feature_columns = pipeline['feature_columns']
+    missing_cols = set(feature_columns) - set(df.columns)
+    if missing_cols:
+        raise ValueError(f"Missing columns in uploaded data: {missing_cols}")
+
+    features = np.empty((len(df), len(feature_columns)), dtype=np.float64)
+
+    # Scale every numerical column in one vectorized operation
+    scaled = df[pipeline['scaled_columns']].to_numpy(dtype=np.float64)
+    features[:, pipeline['scaled_index']] = (scaled - pipeline['mean']) / pipeline['scale']
+
+    # Map categories to their label-encoded integers
+    for col, (position, categories) in pipeline['categories'].items():
+        codes = categories.get_indexer(df[col])
+        if (codes < 0).any():
+            unknown = set(df[col][codes < 0].astype(str))
+            raise ValueError(f"Unknown values in column '{col}': {unknown}")
+        features[:, position] = codes
+
+    return pd.DataFrame(features, columns=feature_columns, index=df.index)
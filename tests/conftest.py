@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The modules live at the repository root, next to the scripts that import them
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
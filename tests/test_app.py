@@ -0,0 +1,80 @@
+import importlib
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='module')
+def app_dir(tmp_path_factory):
+    # The app reads data/ and models/ relative to the working directory, so it
+    # runs on a copy that the tests can change
+    directory = tmp_path_factory.mktemp('app')
+    for name in ['data', 'models']:
+        shutil.copytree(os.path.join(REPO_DIR, name), directory / name, ignore=shutil.ignore_patterns('*.cols*'))
+    return directory
+
+
+@pytest.fixture(scope='module')
+def client(app_dir):
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(app_dir)
+        patch.setenv('METRICS_DIR', '')
+        patch.setenv('FAST_START', 'false')
+        app = importlib.import_module('app')
+        app.app.config['TESTING'] = True
+        yield app.app.test_client()
+
+
+def touch_later(path):
+    """Move a file's modification time forward so the change is seen even on coarse clocks"""
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2_000_000_000))
+
+
+def test_unchanged_payload_revalidates_with_304(client):
+    response = client.get('/api/cluster-profiles')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'no-cache'
+    etag = response.headers['ETag']
+
+    revalidated = client.get('/api/cluster-profiles', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+    since = client.get('/api/cluster-profiles', headers={'If-Modified-Since': response.headers['Last-Modified']})
+    assert since.status_code == 304
+
+
+def test_changed_file_invalidates_the_etag(client, app_dir):
+    response = client.get('/api/cluster-profiles')
+    etag = response.headers['ETag']
+
+    path = app_dir / 'data' / 'cluster_profiles.csv'
+    profiles = pd.read_csv(path)
+    profiles.loc[0, 'Size'] += 1
+    profiles.to_csv(path, index=False)
+    touch_later(path)
+
+    changed = client.get('/api/cluster-profiles', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert changed.get_json()[0]['Size'] == profiles.loc[0, 'Size']
+    assert client.get('/api/cluster-profiles', headers={'If-None-Match': changed.headers['ETag']}).status_code == 304
+
+
+def test_payload_depends_on_every_source_file(client, app_dir):
+    etag = client.get('/api/model-metrics').headers['ETag']
+    # Rewriting a source with the same content only changes its mtime, which
+    # rebuilds the payload but keeps the ETag of the identical body
+    touch_later(app_dir / 'models' / 'classification_report.csv')
+    assert client.get('/api/model-metrics', headers={'If-None-Match': etag}).status_code == 304
+
+    path = app_dir / 'models' / 'classification_report.csv'
+    report = pd.read_csv(path)
+    report.iloc[0, -1] = report.iloc[0, -1] + 1
+    report.to_csv(path, index=False)
+    touch_later(path)
+    assert client.get('/api/model-metrics', headers={'If-None-Match': etag}).status_code == 200
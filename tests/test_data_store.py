@@ -0,0 +1,122 @@
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_store
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    rng = np.random.default_rng(0)
+    n_rows = 500
+    df = pd.DataFrame({
+        'flag': rng.integers(0, 2, n_rows),
+        'hours': rng.integers(90, 310, n_rows),
+        'level': rng.integers(0, 10, n_rows) / 8,
+        'score': rng.random(n_rows),
+        'salary': rng.choice(['low', 'medium', 'high'], n_rows),
+    })
+    path = str(tmp_path / 'table.csv')
+    df.to_csv(path, index=False)
+    return path
+
+
+def test_stored_dtypes_round_trip_exactly(csv_path):
+    expected = pd.read_csv(csv_path)
+    df = data_store.load_table(csv_path)
+    assert os.path.isdir(data_store.cache_dir_for(csv_path))
+    # Columns are read-only views of the mapped files
+    assert not df['flag'].to_numpy().flags.writeable
+    pd.testing.assert_frame_equal(df.astype({'salary': object}), expected)
+
+
+def test_lossless_and_compact_dtypes(csv_path):
+    expected = pd.read_csv(csv_path)
+    lossless = data_store.load_table(csv_path, dtypes='lossless')
+    compact = data_store.load_table(csv_path, dtypes='compact')
+
+    assert lossless.dtypes.astype(str).to_dict() == {
+        'flag': 'int8', 'hours': 'int16', 'level': 'float32', 'score': 'float64', 'salary': 'category'
+    }
+    assert compact['score'].dtype == np.float32
+    for name in ['flag', 'hours', 'level', 'score']:
+        assert np.array_equal(lossless[name].to_numpy().astype(np.float64), expected[name].to_numpy())
+    np.testing.assert_allclose(compact['score'], expected['score'], rtol=1e-7)
+    # Parsing the CSV directly gives the same dtypes as the cache
+    assert data_store.compact_frame(expected, 'lossless').dtypes.equals(lossless.dtypes)
+
+
+def test_chunked_writer_matches_write_columnar(tmp_path):
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({'a': rng.integers(-5, 300, 1000), 'b': rng.random(1000), 'c': rng.integers(0, 2, 1000)})
+    saved_path = str(tmp_path / 'saved.csv')
+    chunked_path = str(tmp_path / 'chunked.csv')
+    data_store.save_table(df, saved_path)
+
+    writer = data_store.ChunkedTableWriter(chunked_path, len(df), df.dtypes.to_dict())
+    for start in range(0, len(df), 300):
+        writer.write(df.iloc[start:start + 300])
+    writer.close()
+
+    with open(saved_path, 'rb') as saved, open(chunked_path, 'rb') as chunked:
+        assert saved.read() == chunked.read()
+    for dtypes in data_store.DTYPE_MODES:
+        pd.testing.assert_frame_equal(
+            data_store.load_table(saved_path, dtypes=dtypes), data_store.load_table(chunked_path, dtypes=dtypes)
+        )
+
+
+def test_rebuild_swaps_the_version_and_removes_the_old_one(csv_path):
+    data_store.load_table(csv_path)
+    cache_dir = data_store.cache_dir_for(csv_path)
+    first = os.path.realpath(cache_dir)
+
+    data_store.build_cache(csv_path)
+    assert os.path.realpath(cache_dir) != first
+    assert not os.path.exists(first)
+    assert data_store.is_cache_fresh(csv_path)
+
+
+def test_concurrent_rebuilds_leave_one_complete_cache(csv_path):
+    expected = pd.read_csv(csv_path)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(lambda _: data_store.build_cache(csv_path), range(8)))
+
+    cache_dir = data_store.cache_dir_for(csv_path)
+    pd.testing.assert_frame_equal(data_store.read_columnar(cache_dir).astype({'salary': object}), expected)
+    siblings = [name for name in os.listdir(os.path.dirname(csv_path)) if name.startswith('table.cols.')]
+    assert siblings == [os.path.basename(os.path.realpath(cache_dir))]
+
+
+def test_plain_directory_cache_is_replaced(csv_path):
+    # Caches written before versioning were plain directories
+    cache_dir = data_store.cache_dir_for(csv_path)
+    data_store.build_cache(csv_path)
+    version_dir = os.path.realpath(cache_dir)
+    os.remove(cache_dir)
+    os.rename(version_dir, cache_dir)
+
+    data_store.build_cache(csv_path)
+    assert os.path.islink(cache_dir)
+    assert data_store.is_cache_fresh(csv_path)
+
+
+def test_falls_back_to_the_csv_when_the_cache_disappears(csv_path, monkeypatch):
+    expected = pd.read_csv(csv_path)
+    data_store.load_table(csv_path)
+    read_columnar = data_store.read_columnar
+
+    def replaced_while_reading(cache_dir, **kwargs):
+        # Another writer swaps in a new version and deletes this one mid-read
+        shutil.rmtree(os.path.realpath(cache_dir))
+        return read_columnar(cache_dir, **kwargs)
+
+    monkeypatch.setattr(data_store, 'read_columnar', replaced_while_reading)
+    pd.testing.assert_frame_equal(data_store.load_table(csv_path), expected)
+    pd.testing.assert_frame_equal(
+        data_store.load_table(csv_path, dtypes='compact'), data_store.compact_frame(expected, 'compact')
+    )
@@ -0,0 +1,104 @@
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.tree import DecisionTreeClassifier
+
+from inference import CompiledClusterModel, CompiledTree, ModelEnsemble
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='module')
+def trained_tree():
+    model = joblib.load(os.path.join(REPO_DIR, 'models', 'decision_tree_model.pkl'))
+    X = pd.read_csv(os.path.join(REPO_DIR, 'data', 'X_test.csv'))[list(model.feature_names_in_)]
+    return model, X
+
+
+def test_matches_sklearn_exactly(trained_tree):
+    model, X = trained_tree
+    compiled = CompiledTree(model)
+    labels, proba = compiled.predict_with_proba(X.to_numpy())
+
+    assert np.array_equal(compiled.apply(X.to_numpy()), model.apply(X))
+    assert np.array_equal(labels, model.predict(X))
+    assert np.array_equal(proba, model.predict_proba(X))
+
+
+def test_matches_sklearn_with_missing_values():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(2000, 4))
+    y = (X[:, 0] + X[:, 1] > 0).astype(int)
+    X[rng.random(X.shape) < 0.1] = np.nan
+    model = DecisionTreeClassifier(max_depth=6, random_state=0).fit(X, y)
+
+    compiled = CompiledTree(model)
+    assert np.array_equal(compiled.predict(X), model.predict(X))
+    assert np.array_equal(compiled.predict_proba(X), model.predict_proba(X))
+
+
+def test_contributions_sum_to_the_probability(trained_tree):
+    model, X = trained_tree
+    compiled = CompiledTree(model)
+    labels, proba, contributions, paths = compiled.explain(X.to_numpy())
+
+    assert contributions.shape == (len(X), compiled.n_features, len(compiled.classes))
+    np.testing.assert_allclose(compiled.bias + contributions.sum(axis=1), proba, atol=1e-12)
+    # Features the tree never splits on get no credit
+    unused = np.setdiff1d(np.arange(compiled.n_features), model.tree_.feature[model.tree_.feature >= 0])
+    assert not contributions[:, unused].any()
+    # One condition per split on the way to the leaf
+    depths = np.asarray(model.decision_path(X).sum(axis=1)).ravel() - 1
+    assert [path.count(' AND ') + 1 for path in paths] == depths.tolist()
+
+
+def test_paths_use_original_units(trained_tree):
+    model, X = trained_tree
+    preprocessing = joblib.load(os.path.join(REPO_DIR, 'models', 'preprocessing_pipeline.pkl'))
+    paths = CompiledTree(model, preprocessing).explain(X.to_numpy()[:200])[3]
+    conditions = [condition for path in paths for condition in path.split(' AND ')]
+
+    for condition in conditions:
+        name = condition.split(' ')[0]
+        if name in preprocessing['categorical_columns']:
+            assert ' in {' in condition
+        elif name == 'average_montly_hours':
+            # Scaled thresholds would be within a few standard deviations of zero
+            assert float(condition.split(' ')[-1]) > 50
+
+
+def test_rejects_wrong_shapes(trained_tree):
+    compiled = CompiledTree(trained_tree[0])
+    with pytest.raises(ValueError, match='Expected'):
+        compiled.predict(np.zeros((3, compiled.n_features + 1)))
+    with pytest.raises(ValueError, match='infinity'):
+        compiled.predict(np.full((1, compiled.n_features), np.inf))
+
+
+def test_cluster_model_matches_sklearn():
+    kmeans = joblib.load(os.path.join(REPO_DIR, 'models', 'kmeans_model.pkl'))
+    pca = joblib.load(os.path.join(REPO_DIR, 'models', 'pca_model.pkl'))
+    rng = np.random.default_rng(1)
+    X = pd.DataFrame(rng.normal(size=(500, kmeans.n_features_in_)), columns=kmeans.feature_names_in_)
+
+    compiled = CompiledClusterModel(kmeans, pca)
+    labels, distances = compiled.assign(X.to_numpy())
+    assert np.array_equal(labels, kmeans.predict(X))
+    np.testing.assert_allclose(distances, kmeans.transform(X).min(axis=1), rtol=1e-9)
+    np.testing.assert_allclose(compiled.project(X.to_numpy()), pca.transform(X), atol=1e-9)
+
+
+def test_ensemble_rejects_mismatched_models(trained_tree):
+    model, X = trained_tree
+    names = list(model.feature_names_in_)
+    ensemble = ModelEnsemble({'decision_tree': CompiledTree(model)}, names)
+    probabilities, seconds = ensemble.score(X.to_numpy())
+    assert np.array_equal(probabilities['decision_tree'], model.predict_proba(X))
+
+    with pytest.raises(ValueError, match='expects features'):
+        ModelEnsemble({'decision_tree': CompiledTree(model)}, names[::-1])
+    with pytest.raises(ValueError, match='Unknown models'):
+        ensemble.score(X.to_numpy(), names=['random_forest'])
@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+import model_registry
+
+
+@pytest.fixture
+def source_dir(tmp_path):
+    source = tmp_path / 'models'
+    source.mkdir()
+    for name in ['decision_tree', 'kmeans', 'pca']:
+        (source / model_registry.MODEL_FILES[name]).write_bytes(f'{name} v1'.encode())
+    return str(source)
+
+
+@pytest.fixture
+def registry_dir(tmp_path):
+    return str(tmp_path / 'registry')
+
+
+def read_artifact(paths, name):
+    with open(paths[name], 'rb') as f:
+        return f.read()
+
+
+def retrain(source_dir, content):
+    with open(os.path.join(source_dir, model_registry.MODEL_FILES['decision_tree']), 'wb') as f:
+        f.write(content)
+
+
+def test_publish_and_roll_back(source_dir, registry_dir):
+    first = model_registry.publish_version(source_dir, registry_dir)
+    retrain(source_dir, b'decision_tree v2')
+    second = model_registry.publish_version(source_dir, registry_dir)
+
+    version, paths = model_registry.resolve_artifacts(registry_dir)
+    assert version == second
+    assert read_artifact(paths, 'decision_tree') == b'decision_tree v2'
+    # Optional artifacts that weren't published resolve to missing files
+    assert not os.path.exists(paths['random_forest'])
+
+    model_registry.activate_version(first, registry_dir)
+    version, paths = model_registry.resolve_artifacts(registry_dir)
+    assert version == first
+    assert read_artifact(paths, 'decision_tree') == b'decision_tree v1'
+
+    with pytest.raises(ValueError, match='Unknown model version'):
+        model_registry.activate_version('20000101-000000-00000000', registry_dir)
+
+
+def test_publish_without_activating(source_dir, registry_dir):
+    first = model_registry.publish_version(source_dir, registry_dir)
+    retrain(source_dir, b'decision_tree v2')
+    model_registry.publish_version(source_dir, registry_dir, activate=False)
+    assert model_registry.active_version(registry_dir) == first
+
+
+def test_modified_artifact_is_rejected(source_dir, registry_dir):
+    version = model_registry.publish_version(source_dir, registry_dir)
+    path = os.path.join(registry_dir, version, model_registry.MODEL_FILES['kmeans'])
+    with open(path, 'ab') as f:
+        f.write(b' overwritten')
+
+    with pytest.raises(ValueError, match='Checksum mismatch'):
+        model_registry.resolve_artifacts(registry_dir)
+    assert model_registry.resolve_artifacts(registry_dir, verify=False)[0] == version
+
+
+def test_publishes_in_the_same_second_get_distinct_versions(source_dir, registry_dir, monkeypatch):
+    monkeypatch.setattr(model_registry.time, 'strftime', lambda fmt: '20240101-120000')
+    versions = [model_registry.publish_version(source_dir, registry_dir) for _ in range(3)]
+
+    assert versions[1:] == [f'{versions[0]}-2', f'{versions[0]}-3']
+    manifest = model_registry.read_manifest(registry_dir)
+    assert [v['version'] for v in manifest['versions']] == versions
+    for version in versions:
+        model_registry.activate_version(version, registry_dir)
+        assert model_registry.resolve_artifacts(registry_dir)[0] == version
+    assert sorted(os.listdir(registry_dir)) == sorted(versions + [model_registry.MANIFEST_FILE])
+
+
+def test_unversioned_artifacts_are_named_by_content(source_dir, registry_dir):
+    version, paths = model_registry.resolve_artifacts(registry_dir, fallback_dir=source_dir)
+    assert version.startswith('unversioned-')
+    assert paths['decision_tree'] == os.path.join(source_dir, model_registry.MODEL_FILES['decision_tree'])
+
+    retrain(source_dir, b'decision_tree v2')
+    assert model_registry.resolve_artifacts(registry_dir, fallback_dir=source_dir)[0] != version
@@ -0,0 +1,91 @@
+import numpy as np
+
+from prediction_cache import PredictionCache, feature_row_hashes
+
+
+def random_batch(rng, n_rows, n_classes=2):
+    keys = rng.integers(0, 2**63, n_rows, dtype=np.uint64)
+    proba = rng.random((n_rows, n_classes))
+    return keys, proba / proba.sum(axis=1, keepdims=True)
+
+
+def test_row_hashes_depend_on_every_value():
+    features = np.arange(12, dtype=np.float32).reshape(4, 3)
+    changed = features.copy()
+    changed[2, 1] += 1
+    hashes = feature_row_hashes(features)
+    assert len(set(hashes.tolist())) == 4
+    assert np.array_equal(feature_row_hashes(features.copy()), hashes)
+    assert (feature_row_hashes(changed) != hashes).tolist() == [False, False, True, False]
+
+
+def test_lookup_returns_stored_probabilities_exactly():
+    rng = np.random.default_rng(0)
+    cache = PredictionCache(1000)
+    keys, proba = random_batch(rng, 100)
+    cache.store('v1', 'random_forest', keys[:60], proba[:60])
+
+    hit, cached = cache.lookup('v1', 'random_forest', keys, 2)
+    assert hit.tolist() == [True] * 60 + [False] * 40
+    assert np.array_equal(cached[hit], proba[:60])
+
+
+def test_models_and_versions_are_kept_apart():
+    rng = np.random.default_rng(1)
+    cache = PredictionCache(1000)
+    keys, proba = random_batch(rng, 10)
+    cache.store('v1', 'random_forest', keys, proba)
+
+    assert not cache.lookup('v1', 'gradient_boosting', keys, 2)[0].any()
+    assert not cache.lookup('v2', 'random_forest', keys, 2)[0].any()
+    # Looking up a new version dropped the old one's entries
+    assert not cache.lookup('v1', 'random_forest', keys, 2)[0].any()
+
+
+def test_store_is_bounded_and_evicts_least_recently_used():
+    rng = np.random.default_rng(2)
+    cache = PredictionCache(100)
+    old_keys, old_proba = random_batch(rng, 50)
+    recent_keys, recent_proba = random_batch(rng, 50)
+    cache.store('v1', 'random_forest', old_keys, old_proba)
+    cache.store('v1', 'random_forest', recent_keys, recent_proba)
+    # Touch the recent rows so the old ones are the least recently used
+    cache.lookup('v1', 'random_forest', recent_keys, 2)
+
+    new_keys, new_proba = random_batch(rng, 30)
+    cache.store('v1', 'random_forest', new_keys, new_proba)
+    assert cache.stats()['entries'] == {'random_forest': 100}
+    assert cache.lookup('v1', 'random_forest', recent_keys, 2)[0].all()
+    assert cache.lookup('v1', 'random_forest', new_keys, 2)[0].all()
+    assert cache.lookup('v1', 'random_forest', old_keys, 2)[0].sum() == 20
+
+    # Freed slots are reused without mixing up rows
+    for _ in range(20):
+        keys, proba = random_batch(rng, 37)
+        cache.store('v1', 'random_forest', keys, proba)
+        hit, cached = cache.lookup('v1', 'random_forest', keys, 2)
+        assert hit.all() and np.array_equal(cached, proba)
+    assert cache.stats()['entries'] == {'random_forest': 100}
+
+
+def test_duplicate_keys_in_a_batch_are_stored_once():
+    cache = PredictionCache(10)
+    keys = np.array([5, 7, 5], dtype=np.uint64)
+    proba = np.array([[0.1, 0.9], [0.4, 0.6], [0.1, 0.9]])
+    cache.store('v1', 'random_forest', keys, proba)
+    hit, cached = cache.lookup('v1', 'random_forest', keys, 2)
+    assert hit.all() and np.array_equal(cached, proba)
+    assert cache.stats()['entries'] == {'random_forest': 2}
+
+
+def test_disk_store_is_shared_between_instances(tmp_path):
+    rng = np.random.default_rng(3)
+    path = str(tmp_path / 'cache.sqlite')
+    keys, proba = random_batch(rng, 700)
+    PredictionCache(1000, disk_path=path).store('v1', 'random_forest', keys, proba)
+
+    other = PredictionCache(1000, disk_path=path)
+    hit, cached = other.lookup('v1', 'random_forest', keys, 2)
+    assert hit.all() and np.array_equal(cached, proba)
+    assert other.stats()['disk_hits'] == 700
+    assert not other.lookup('v1', 'gradient_boosting', keys, 2)[0].any()
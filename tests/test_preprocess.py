@@ -0,0 +1,55 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import preprocess
+import report
+from data_store import load_table
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RAW_DATA_PATH = os.path.join(REPO_DIR, preprocess.RAW_DATA_PATH)
+
+
+@pytest.fixture
+def raw_csv(tmp_path):
+    path = str(tmp_path / 'raw.csv')
+    pd.read_csv(RAW_DATA_PATH, nrows=3000).to_csv(path, index=False)
+    return path
+
+
+def test_chunked_preprocessing_matches_in_memory(raw_csv, tmp_path):
+    memory_path = str(tmp_path / 'memory' / 'preprocessed.csv')
+    chunked_path = str(tmp_path / 'chunked' / 'preprocessed.csv')
+
+    raw_df = preprocess.load_data(raw_csv)
+    processed_df, encoders, scaler = preprocess.preprocess_data(raw_df)
+    preprocess.save_processed_data(processed_df, memory_path)
+    columns, chunked_encoders, chunked_scaler, aggregates = preprocess.preprocess_csv_in_chunks(
+        raw_csv, chunked_path, chunksize=700
+    )
+
+    with open(memory_path, 'rb') as memory, open(chunked_path, 'rb') as chunked:
+        assert memory.read() == chunked.read()
+    pd.testing.assert_frame_equal(load_table(memory_path), load_table(chunked_path))
+
+    assert columns == processed_df.columns.tolist()
+    assert encoders.keys() == chunked_encoders.keys()
+    for col in encoders:
+        assert encoders[col].classes_.tolist() == chunked_encoders[col].classes_.tolist()
+    assert np.array_equal(scaler.mean_, chunked_scaler.mean_)
+    assert np.array_equal(scaler.scale_, chunked_scaler.scale_)
+
+    expected = report.eda_aggregates(raw_df, processed_df)
+    assert np.array_equal(aggregates['target_counts'], expected['target_counts'])
+    assert np.array_equal(aggregates['satisfaction_counts'], expected['satisfaction_counts'])
+    np.testing.assert_allclose(aggregates['correlation'], expected['correlation'], atol=1e-12)
+
+
+@pytest.mark.parametrize('column', ['left', 'satisfaction_level'])
+def test_scan_requires_the_eda_columns(raw_csv, tmp_path, column):
+    path = str(tmp_path / 'partial.csv')
+    pd.read_csv(raw_csv).drop(columns=[column]).to_csv(path, index=False)
+    with pytest.raises(ValueError, match=column):
+        preprocess.scan_csv(path)
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+import report
+
+
+def merged_statistics(values, sizes):
+    statistics = report.moment_statistics(values[:0])
+    start = 0
+    for size in sizes:
+        statistics = report.merge_moment_statistics(statistics, report.moment_statistics(values[start:start + size]))
+        start += size
+    assert start == len(values)
+    return statistics
+
+
+@pytest.mark.parametrize('sizes', [[1000], [1, 999], [300, 0, 450, 1, 249], [1] * 1000])
+def test_merged_moments_match_a_single_pass(sizes):
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(1000, 4)) * [1, 10, 0.1, 3] + [0, 5, -2, 100]
+    expected = report.moment_statistics(values)
+    merged = merged_statistics(values, sizes)
+
+    assert merged['count'] == expected['count']
+    np.testing.assert_allclose(merged['mean'], expected['mean'], rtol=1e-12)
+    np.testing.assert_allclose(merged['comoment'], expected['comoment'], rtol=1e-10)
+    np.testing.assert_allclose(report.correlation_from_moments(merged), np.corrcoef(values, rowvar=False), atol=1e-12)
+
+
+def test_merge_is_stable_far_from_zero():
+    # Summing raw squares would lose every digit of the variance at this offset
+    rng = np.random.default_rng(1)
+    values = 1e9 + rng.normal(size=(2000, 2))
+    merged = merged_statistics(values, [500] * 4)
+    np.testing.assert_allclose(merged['comoment'] / len(values), np.cov(values, rowvar=False, bias=True), rtol=1e-6)
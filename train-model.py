@@ -1,17 +1,31 @@
+import argparse
+import time
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 import joblib
-from sklearn.model_selection import train_test_split, GridSearchCV
-from sklearn.tree import DecisionTreeClassifier, plot_tree
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, confusion_matrix
-from sklearn.metrics import roc_curve, roc_auc_score
-import seaborn as sns
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401 (enables HalvingGridSearchCV)
+from sklearn.model_selection import train_test_split, GridSearchCV, HalvingGridSearchCV, StratifiedKFold
+from sklearn.base import clone
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, roc_auc_score
 import os
+from data_store import load_table, save_table
+import report
+
+# Challenger models trained next to the tuned decision tree, with fixed
+# hyperparameters. The API can score them side by side with the tree or
+# shadow-score one of them.
+CHALLENGERS = {
+    'random_forest': lambda n_jobs: RandomForestClassifier(
+        n_estimators=100, min_samples_leaf=2, n_jobs=n_jobs, random_state=42
+    ),
+    'gradient_boosting': lambda n_jobs: HistGradientBoostingClassifier(random_state=42)
+}
 
 def load_preprocessed_data(filepath='data/preprocessed_hr_data.csv'):
-    """Load preprocessed data from CSV file"""
-    return pd.read_csv(filepath)
+    """Load preprocessed data from CSV file (through its columnar cache, in the smallest exact dtypes)"""
+    return load_table(filepath, dtypes='lossless')
 
 def split_data(df, target_col='left', test_size=0.2, random_state=42):
     """Split data into train and test sets"""
@@ -25,8 +39,15 @@ def split_data(df, target_col='left', test_size=0.2, random_state=42):
     print(f"Training set shape: {X_train.shape}, Test set shape: {X_test.shape}")
     return X_train, X_test, y_train, y_test
 
-def train_decision_tree(X_train, y_train):
-    """Train a Decision Tree classifier with hyperparameter tuning"""
+def train_decision_tree(X_train, y_train, search='grid', n_jobs=-1, cv=5):
+    """
+    Train a Decision Tree classifier with hyperparameter tuning
+
+    search='grid' evaluates every combination; search='halving' runs successive
+    halving, scoring all candidates on a small sample and only promoting the best
+    third to each larger budget. Candidates are evaluated in parallel worker
+    processes (n_jobs=-1 uses every core).
+    """
     param_grid = {
         'max_depth': [3, 5, 7, 10, None],
         'min_samples_split': [2, 5, 10],
@@ -37,66 +58,61 @@ def train_decision_tree(X_train, y_train):
     # Base model
     dt = DecisionTreeClassifier(random_state=42)
     
-    # Grid search
-    grid_search = GridSearchCV(
+    # Convert once to the contiguous float32 layout trees are fitted on, and
+    # compute the fold splits once, so no candidate repeats either step
+    X_search = np.ascontiguousarray(X_train, dtype=np.float32)
+    y_search = np.asarray(y_train)
+    folds = list(StratifiedKFold(n_splits=cv).split(X_search, y_search))
+    
+    search_options = dict(
         estimator=dt,
         param_grid=param_grid,
-        cv=5,
+        cv=folds,
         scoring='f1',
+        n_jobs=n_jobs,
+        refit=False,
         verbose=1
     )
+    if search == 'halving':
+        searcher = HalvingGridSearchCV(factor=3, resource='n_samples', random_state=42, **search_options)
+    else:
+        searcher = GridSearchCV(**search_options)
+    
+    # Fit the search
+    start = time.perf_counter()
+    searcher.fit(X_search, y_search)
+    search_time = time.perf_counter() - start
     
-    # Fit grid search
-    grid_search.fit(X_train, y_train)
+    best_params = searcher.best_params_
+    report_search_results(searcher, len(folds), search_time)
     
-    # Get best model
-    best_model = grid_search.best_estimator_
-    best_params = grid_search.best_params_
+    # Refit the best candidate on the DataFrame so the model keeps its feature names
+    best_model = DecisionTreeClassifier(random_state=42, **best_params)
+    best_model.fit(X_train, y_train)
     
     print(f"Best Parameters: {best_params}")
     return best_model
 
-def plot_decision_tree_visualization(model, X_train, feature_names=None):
-    """Plot and save the decision tree"""
-    plt.figure(figsize=(25, 15))
-    plot_tree(model, feature_names=feature_names, 
-              class_names=['Stayed', 'Left'],
-              filled=True, rounded=True, fontsize=10)
-    plt.title('Decision Tree Visualization')
-    plt.tight_layout()
-    plt.savefig('images/decision_tree_plot.png', dpi=300, bbox_inches='tight')
-    plt.close()
-    
-def plot_feature_importance(model, feature_names):
-    """Plot the feature importance"""
-    # Get feature importances
-    importances = model.feature_importances_
-    
-    # Sort feature importances in descending order
-    indices = np.argsort(importances)[::-1]
-    
-    # Rearrange feature names so they match the sorted feature importances
-    names = [feature_names[i] for i in indices]
-    
-    # Get top 15 features
-    indices = indices[:15]
-    names = names[:15]
-    
-    # Create plot
-    plt.figure(figsize=(12, 8))
-    plt.barh(range(len(indices)), importances[indices], align='center')
-    plt.yticks(range(len(indices)), names)
-    plt.xlabel('Relative Importance')
-    plt.title('Feature Importance')
-    plt.tight_layout()
-    plt.savefig('images/feature_importance.png')
-    plt.close()
+def report_search_results(searcher, n_folds, search_time, output_path='models/search_results.csv'):
+    """Print and save the score and wall time of every evaluated candidate"""
+    results = pd.DataFrame(searcher.cv_results_)
+    columns = ['params', 'mean_test_score', 'rank_test_score', 'mean_fit_time', 'mean_score_time']
+    if 'iter' in results.columns:
+        # Successive halving reports one row per candidate per budget
+        columns = ['iter', 'n_resources'] + columns
+    
+    results = results[columns].copy()
+    results['wall_time'] = (results['mean_fit_time'] + results['mean_score_time']) * n_folds
+    results.to_csv(output_path, index=False)
+    
+    print(f"Evaluated {len(results)} candidates in {search_time:.2f}s "
+          f"(mean {results['wall_time'].mean():.3f}s, max {results['wall_time'].max():.3f}s per candidate)")
+    print(f"Search results saved to {output_path}")
 
 def evaluate_model(model, X_test, y_test):
     """Evaluate the model and save metrics"""
     # Predictions
     y_pred = model.predict(X_test)
-    y_pred_proba = model.predict_proba(X_test)[:, 1]
     
     # Metrics
     accuracy = accuracy_score(y_test, y_pred)
@@ -119,50 +135,82 @@ def evaluate_model(model, X_test, y_test):
     
     # Create a dataframe and save to CSV
     metrics_df = pd.DataFrame([metrics])
-    metrics_df.to_csv('models/model_metrics.csv', index=False)
-    
-    # Plot and save confusion matrix
-    cm = confusion_matrix(y_test, y_pred)
-    plt.figure(figsize=(10, 8))
-    sns.heatmap(cm, annot=True, fmt='d', cmap='Blues')
-    plt.title('Confusion Matrix')
-    plt.ylabel('Actual')
-    plt.xlabel('Predicted')
-    plt.tight_layout()
-    plt.savefig('images/confusion_matrix.png')
-    plt.close()
-    
-    # Plot and save ROC curve
-    fpr, tpr, _ = roc_curve(y_test, y_pred_proba)
-    auc = roc_auc_score(y_test, y_pred_proba)
-    
-    plt.figure(figsize=(10, 8))
-    plt.plot(fpr, tpr, color='blue', lw=2, label=f'ROC curve (AUC = {auc:.4f})')
-    plt.plot([0, 1], [0, 1], color='gray', lw=2, linestyle='--')
-    plt.xlim([0.0, 1.0])
-    plt.ylim([0.0, 1.05])
-    plt.xlabel('False Positive Rate')
-    plt.ylabel('True Positive Rate')
-    plt.title('Receiver Operating Characteristic (ROC) Curve')
-    plt.legend(loc='lower right')
-    plt.tight_layout()
-    plt.savefig('images/roc_curve.png')
-    plt.close()
+    save_table(metrics_df, 'models/model_metrics.csv')
     
     # Save detailed classification report
     from sklearn.metrics import classification_report
-    report = classification_report(y_test, y_pred, output_dict=True)
-    report_df = pd.DataFrame(report).transpose()
-    report_df.to_csv('models/classification_report.csv')
+    classification = classification_report(y_test, y_pred, output_dict=True)
+    report_df = pd.DataFrame(classification).transpose()
+    save_table(report_df, 'models/classification_report.csv', index=True)
     
     return metrics
 
+def train_challengers(X_train, y_train, names, n_jobs=-1):
+    """Fit the named challenger models and return them with their fit times"""
+    challengers = {}
+    for name in names:
+        model = CHALLENGERS[name](n_jobs)
+        start = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_seconds = time.perf_counter() - start
+        if 'n_jobs' in model.get_params():
+            # The API scores from many request threads, so each prediction stays single-threaded
+            model.set_params(n_jobs=None)
+        challengers[name] = (model, fit_seconds)
+        print(f"Trained {name} in {fit_seconds:.2f}s")
+    return challengers
+
+def compare_models(trained, X_test, y_test, output_path='models/model_comparison.csv'):
+    """Test-set metrics, fit time and batch scoring time of every trained model"""
+    X_batch = pd.DataFrame(np.asarray(X_test, dtype=np.float32), columns=X_test.columns)
+    rows = []
+    for name, (model, fit_seconds) in trained.items():
+        # Same float32 matrix the API passes every model
+        model.predict_proba(X_batch[:8])
+        start = time.perf_counter()
+        probabilities = model.predict_proba(X_batch)
+        predict_seconds = time.perf_counter() - start
+        y_pred = model.classes_.take(np.argmax(probabilities, axis=1))
+        rows.append({
+            'model': name,
+            'accuracy': accuracy_score(y_test, y_pred),
+            'precision': precision_score(y_test, y_pred),
+            'recall': recall_score(y_test, y_pred),
+            'f1_score': f1_score(y_test, y_pred),
+            'roc_auc': roc_auc_score(y_test, probabilities[:, 1]),
+            'fit_seconds': fit_seconds,
+            'predict_ms_per_1k_rows': predict_seconds * 1000 / len(X_batch) * 1000
+        })
+    
+    comparison = pd.DataFrame(rows)
+    save_table(comparison, output_path)
+    print(comparison.to_string(index=False, float_format=lambda value: f"{value:.4f}"))
+    print(f"Model comparison saved to {output_path}")
+    return comparison
+
 def save_model(model, filepath='models/decision_tree_model.pkl'):
     """Save the trained model to a file"""
     joblib.dump(model, filepath)
     print(f"Model saved to {filepath}")
 
-def main():
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Train and evaluate the turnover decision tree')
+    parser.add_argument('--search', choices=['grid', 'halving'], default='grid',
+                        help='Hyperparameter search strategy (default: grid)')
+    parser.add_argument('--n-jobs', type=int, default=-1,
+                        help='Worker processes used by the search (default: all cores)')
+    parser.add_argument('--cv', type=int, default=5, help='Number of cross-validation folds')
+    parser.add_argument('--challengers', nargs='*', choices=list(CHALLENGERS),
+                        help='Also train these challenger models and compare them with the tree (all with no values)')
+    args = parser.parse_args(argv)
+    if args.challengers == []:
+        args.challengers = list(CHALLENGERS)
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    
     # Ensure directories exist
     os.makedirs('models', exist_ok=True)
     os.makedirs('images', exist_ok=True)
@@ -174,21 +222,30 @@ def main():
     X_train, X_test, y_train, y_test = split_data(df)
     
     # Train model
-    model = train_decision_tree(X_train, y_train)
-    
-    # Plot decision tree
-    feature_names = X_train.columns.tolist()
-    plot_decision_tree_visualization(model, X_train, feature_names)
-    
-    # Plot feature importance
-    plot_feature_importance(model, feature_names)
+    model = train_decision_tree(X_train, y_train, search=args.search, n_jobs=args.n_jobs, cv=args.cv)
+    # The comparison reports single fits, so the chosen tree is timed on a refit
+    # rather than over the whole search
+    start = time.perf_counter()
+    clone(model).fit(X_train, y_train)
+    trained = {'decision_tree': (model, time.perf_counter() - start)}
     
     # Evaluate model
-    metrics = evaluate_model(model, X_test, y_test)
+    evaluate_model(model, X_test, y_test)
+    
+    # Plot the tree, feature importance, confusion matrix and ROC curve
+    report.render_figures(report.model_figures(model, X_test, y_test, X_train.columns.tolist()))
     
     # Save model
     save_model(model)
     
+    # Train the requested challengers and compare every model on the same test set
+    if args.challengers:
+        challengers = train_challengers(X_train, y_train, args.challengers, n_jobs=args.n_jobs)
+        for name, (challenger, _) in challengers.items():
+            save_model(challenger, f'models/{name}_model.pkl')
+        trained.update(challengers)
+        compare_models(trained, X_test, y_test)
+    
     # Save test data for later use
     X_test.to_csv('data/X_test.csv', index=False)
     y_test.to_csv('data/y_test.csv', index=False)